@@ -0,0 +1,95 @@
+"""
+Runs the benchmarks without a display
+
+    python -m benchmarks -o results.json
+    python -m benchmarks --baseline results.json
+
+With a baseline, every case that got slower by more than the threshold
+is reported as a regression and the exit code is 1
+"""
+
+import sys
+import fnmatch
+import argparse
+
+from benchmarks.suite import CASES, DEFAULT_SIZES
+from benchmarks.harness import DEFAULT_REPEAT, DEFAULT_THRESHOLD, Result
+from benchmarks.harness import DEFAULT_NOISE
+from benchmarks.harness import run_suite, save_results, load_results
+from benchmarks.harness import compare, get_regressions
+
+
+def parse_sizes(text: str) -> list[float]:
+    try:
+        sizes = [float(size) for size in text.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid sizes: {text}")
+
+    if any(size <= 0 for size in sizes):
+        raise argparse.ArgumentTypeError(f"Invalid sizes: {text}")
+
+    return sizes
+
+
+def parse_arguments(arguments: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Times the image operations, the compositing and the undo history") # noqa
+    parser.add_argument("-s", "--sizes", type=parse_sizes,
+                        default=list(DEFAULT_SIZES), metavar="MP,...",
+                        help="the sizes of the images in megapixels")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="the timed runs of every case")
+    parser.add_argument("-k", "--cases", default="*", metavar="PATTERN",
+                        help="only run the cases matching the pattern")
+    parser.add_argument("-o", "--output", default=None,
+                        help="the JSON file the results are written to")
+    parser.add_argument("-b", "--baseline", default=None,
+                        help="the JSON results to compare with")
+    parser.add_argument("-t", "--threshold", type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help="the slowdown that counts as a regression, 0.1 is 10%%") # noqa
+    parser.add_argument("-n", "--noise", type=float, default=DEFAULT_NOISE,
+                        help="slowdowns of fewer seconds are never regressions") # noqa
+    return parser.parse_args(arguments)
+
+
+def print_result(result: Result) -> None:
+    print(f"{result.name:>24} {result.megapixels:>6g} MP "
+          f"{result.fastest * 1000:>10.2f} ms "
+          f"(median {result.median * 1000:.2f} ms)")
+
+
+def main(arguments: list[str] | None = None) -> int:
+    args = parse_arguments(arguments)
+    cases = [case for case in CASES if fnmatch.fnmatch(case.name, args.cases)]
+
+    if len(cases) == 0:
+        print(f"No cases match {args.cases}", file=sys.stderr)
+        return 2
+
+    baseline = load_results(args.baseline) if args.baseline else None
+    results = run_suite(cases, args.sizes, max(1, args.repeat), print_result)
+
+    if args.output is not None:
+        save_results(args.output, results)
+
+    if baseline is None:
+        return 0
+
+    comparisons = compare(results, baseline)
+    regressions = get_regressions(comparisons, args.threshold,
+                                  args.noise)
+
+    for comparison in regressions:
+        print(f"Regression: {comparison.name} at {comparison.megapixels:g} MP "
+              f"went from {comparison.baseline * 1000:.2f} ms to "
+              f"{comparison.current * 1000:.2f} ms "
+              f"({comparison.get_change():+.0%})")
+
+    print(f"{len(regressions)} of {len(comparisons)} cases regressed")
+    return 1 if len(regressions) != 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Times the cases of the suite and compares the results with a baseline.
+Every case is prepared anew before each of its timed runs, and both the
+fastest and the median run are kept. Regressions are judged on the
+fastest run, which is the least disturbed by the rest of the machine
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+from dataclasses import dataclass, asdict
+
+from PIL import Image as PILImage  # type: ignore
+from PIL import __version__ as PILLOW_VERSION  # type: ignore
+
+from benchmarks.suite import Case, create_image
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.10
+
+# Slowdowns below this many seconds are within the noise of the timer and
+# the scheduler, whatever fraction of the baseline they are
+DEFAULT_NOISE = 0.001
+
+
+@dataclass
+class Result:
+    name: str
+    megapixels: float
+    fastest: float
+    median: float
+    repeat: int
+
+    def get_key(self) -> tuple[str, float]:
+        return (self.name, self.megapixels)
+
+
+@dataclass
+class Comparison:
+    name: str
+    megapixels: float
+    baseline: float
+    current: float
+
+    def get_change(self) -> float:
+        """
+        How much slower the current run is, as a fraction of the baseline
+        """
+        if self.baseline == 0:
+            return 0.0
+
+        return self.current / self.baseline - 1
+
+
+def time_case(case: Case, source: PILImage.Image,
+              repeat: int = DEFAULT_REPEAT) -> tuple[float, float]:
+    timings = []
+
+    for _ in range(repeat):
+        state = case.setup(source)
+        start = time.perf_counter()
+        case.run(state)
+        timings.append(time.perf_counter() - start)
+
+    return (min(timings), statistics.median(timings))
+
+
+def run_suite(cases: list[Case], sizes: list[float],
+              repeat: int = DEFAULT_REPEAT,
+              on_result=None) -> list[Result]:
+    results = []
+
+    for megapixels in sizes:
+        source = create_image(megapixels)
+
+        for case in cases:
+            fastest, median = time_case(case, source, repeat)
+            result = Result(case.name, megapixels, fastest, median, repeat)
+            results.append(result)
+
+            if on_result is not None:
+                on_result(result)
+
+    return results
+
+
+def get_environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pillow": PILLOW_VERSION,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "executable": sys.executable,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_results(path: str, results: list[Result]) -> None:
+    data = {"environment": get_environment(),
+            "results": [asdict(result) for result in results]}
+
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
+
+
+def load_results(path: str) -> list[Result]:
+    with open(path) as file:
+        data = json.load(file)
+
+    return [Result(**result) for result in data["results"]]
+
+
+def compare(results: list[Result],
+            baseline: list[Result]) -> list[Comparison]:
+    """
+    Pairs the results with the baseline. Cases that only one of them has
+    are left out
+    """
+    previous = {result.get_key(): result for result in baseline}
+    comparisons = []
+
+    for result in results:
+        if result.get_key() not in previous:
+            continue
+
+        comparisons.append(Comparison(result.name, result.megapixels,
+                                      previous[result.get_key()].fastest,
+                                      result.fastest))
+
+    return comparisons
+
+
+def get_regressions(comparisons: list[Comparison],
+                    threshold: float = DEFAULT_THRESHOLD,
+                    noise: float = DEFAULT_NOISE) -> list[Comparison]:
+    return [comparison for comparison in comparisons
+            if comparison.get_change() > threshold and
+            comparison.current - comparison.baseline > noise]
@@ -0,0 +1,167 @@
+"""
+The benchmarked operations. Every case prepares its own state from a
+synthetic image, so the timings do not depend on any file and every run
+sees exactly the same pixels
+"""
+
+import typing
+from dataclasses import dataclass
+
+from PIL import Image as PILImage  # type: ignore
+
+from core.graphics.image import Image
+from core.graphics.compositor import Compositor
+from core.graphics.checkered_background import create_checkered_region
+from core.workflow.undo_redo_stack import UndoRedoStack
+
+DEFAULT_SIZES = (0.25, 2.0, 12.0, 50.0)
+
+# Layers of the compositing cases, each one a quarter of the canvas
+LAYER_COUNT = 8
+
+Setup = typing.Callable[[PILImage.Image], typing.Any]
+Run = typing.Callable[[typing.Any], typing.Any]
+
+
+@dataclass
+class Case:
+    """
+    `setup` is not timed. Its result is passed to `run`, which is
+    """
+    name: str
+    setup: Setup
+    run: Run
+
+
+def get_size(megapixels: float) -> tuple[int, int]:
+    """
+    A 4:3 size with about as many pixels
+    """
+    height = max(1, round((megapixels * 1e6 * 3 / 4) ** 0.5))
+    return (max(1, round(height * 4 / 3)), height)
+
+
+def create_image(megapixels: float) -> PILImage.Image:
+    """
+    A deterministic RGBA image with gradients in every channel
+    """
+    size = get_size(megapixels)
+    resample = PILImage.Resampling.BILINEAR
+
+    red = PILImage.linear_gradient("L").resize(size, resample)
+    green = PILImage.radial_gradient("L").resize(size, resample)
+    blue = red.transpose(PILImage.Transpose.ROTATE_180)
+    alpha = green.point(lambda x: 255 - x // 4)
+
+    return PILImage.merge("RGBA", (red, green, blue, alpha))
+
+
+def _image(source: PILImage.Image) -> Image:
+    return Image(image=source)
+
+
+def _operation(apply: typing.Callable[[Image], typing.Any]) -> Run:
+    def run(image: Image) -> None:
+        apply(image)
+
+        # Images only render once their pixels are asked for
+        image.get_base_image()
+
+    return run
+
+
+def _pair(source: PILImage.Image) -> tuple[Image, Image]:
+    first = Image(image=source)
+    first.apply_contrast(1.2)
+    second = first.copy()
+    return (first, second)
+
+
+def _layers(source: PILImage.Image) -> list[tuple[str, Image]]:
+    width, height = source.size
+    layers = []
+
+    for index in range(LAYER_COUNT):
+        layer = Image(image=source.resize((width // 2, height // 2)))
+        layer.set_offset(((index % 4) * width // 8,
+                          (index // 4) * height // 4))
+        layer.get_base_image()
+        layers.append((f"Layer {index}", layer))
+
+    return layers
+
+
+def _paste_layers(layers: list[tuple[str, Image]]) -> Image:
+    size = layers[0][1].get_size()
+    canvas = Image(image=PILImage.new("RGBA", (size[0] * 2, size[1] * 2)))
+
+    for (_, image) in reversed(layers):
+        canvas.cropped_paste(image, image.get_properties().offset)
+
+    return canvas
+
+
+def _composite(layers: list[tuple[str, Image]]) -> PILImage.Image:
+    width, height = layers[0][1].get_size()
+    size = (width * 2, height * 2)
+
+    # The compositor only composites the tiles that are asked for
+    compositor = Compositor(size, create_checkered_region)
+    compositor.render(layers)
+    return compositor.get_region((0, 0, *size))
+
+
+def _history(source: PILImage.Image) -> tuple[UndoRedoStack, Image]:
+    stack = UndoRedoStack()
+    image = Image(image=source)
+    stack.add_undo_action(("Layer", image))
+
+    image = image.copy()
+    image.apply_brightness(1.3)
+    image.get_base_image()
+    return (stack, image)
+
+
+def _undo_redo(state: tuple[UndoRedoStack, Image]) -> Image:
+    stack, image = state
+
+    _, previous = typing.cast(tuple[str, Image], stack.undo())
+    stack.add_redo_action(("Layer", image))
+    _, image = typing.cast(tuple[str, Image], stack.redo())
+    stack.add_undo_action(("Layer", previous))
+
+    return image
+
+
+CASES = [
+    Case("rotate", _image, _operation(lambda image: image.rotate(17.0))),
+    Case("resize", _image, _operation(
+        lambda image: image.resize((image.get_size()[0] // 2,
+                                    image.get_size()[1] // 2)))),
+    Case("crop", _image, _operation(
+        lambda image: image.crop((10, 10, 10, 10)))),
+    Case("flip_horizontal", _image, _operation(Image.flip_horizontal)),
+    Case("flip_vertical", _image, _operation(Image.flip_vertical)),
+    Case("apply_brightness", _image, _operation(
+        lambda image: image.apply_brightness(1.3))),
+    Case("apply_contrast", _image, _operation(
+        lambda image: image.apply_contrast(1.3))),
+    Case("apply_sharpness", _image, _operation(
+        lambda image: image.apply_sharpness(2.0))),
+    Case("apply_saturation", _image, _operation(
+        lambda image: image.apply_saturation(1.5))),
+    Case("apply_negative", _image, _operation(Image.apply_negative)),
+    Case("apply_red_monochrome", _image,
+         _operation(Image.apply_red_monochrome)),
+    Case("apply_green_monochrome", _image,
+         _operation(Image.apply_green_monochrome)),
+    Case("apply_blue_monochrome", _image,
+         _operation(Image.apply_blue_monochrome)),
+    Case("convert_to_grayscale", _image,
+         _operation(Image.convert_to_grayscale)),
+    Case("copy", _image, Image.copy),
+    Case("eq", _pair, lambda pair: pair[0] == pair[1]),
+    Case("cropped_paste_layers", _layers, _paste_layers),
+    Case("compositor_render", _layers, _composite),
+    Case("undo_redo", _history, _undo_redo),
+]
@@ -0,0 +1,139 @@
+"""
+Applies a recipe to a batch of images without a user interface
+
+    python -m core.batch recipe.json "photos/*.jpg" -o edited
+
+With --stream the images are decoded, edited, encoded and written by
+separate stages connected by bounded queues, which keeps the memory flat
+for any number of images and reports how busy every stage was
+"""
+
+import os
+import sys
+import glob
+import argparse
+
+from core.batch.recipe import Recipe, RecipeError
+from core.batch.runner import BatchReport, FileResult, run_batch
+from core.batch.runner import get_input_root
+from core.batch.stream import BATCH_STAGES, DEFAULT_CAPACITY, stream_batch
+from core.workflow.render_worker import create_executor
+
+
+def parse_arguments(arguments: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.batch",
+        description="Applies a recipe of edits to a batch of images")
+    parser.add_argument("recipe", help="the JSON recipe to apply")
+    parser.add_argument("inputs", nargs="+",
+                        help="the images to edit, glob patterns are expanded")
+    parser.add_argument("-o", "--output", required=True,
+                        help="the directory the edited images are written to")
+    parser.add_argument("-f", "--format", default=None,
+                        help="the format to write, by default the format of every input") # noqa
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="the number of workers, one per core by default") # noqa
+    parser.add_argument("--threads", action="store_true",
+                        help="use threads instead of processes as workers")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the images through bounded queues")
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="the size of every queue of the stream")
+    parser.add_argument("--stage-workers", type=parse_stage_workers,
+                        default={}, metavar="STAGE=N,...",
+                        help="the workers of single stages of the stream, for example decode=2,write=1") # noqa
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only report the totals")
+    return parser.parse_args(arguments)
+
+
+def parse_stage_workers(text: str) -> dict[str, int]:
+    workers: dict[str, int] = {}
+
+    for assignment in text.split(","):
+        name, _, count = assignment.partition("=")
+
+        if name.strip() not in BATCH_STAGES:
+            raise argparse.ArgumentTypeError(f"Unknown stage: {name}")
+
+        if not count.isdigit() or int(count) == 0:
+            raise argparse.ArgumentTypeError(f"Invalid workers: {assignment}")
+
+        workers[name.strip()] = int(count)
+
+    return workers
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    inputs: list[str] = []
+    seen: set[str] = set()
+
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern, recursive=True))
+        paths = paths if glob.has_magic(pattern) else [pattern]
+
+        for path in paths:
+            if path not in seen:
+                seen.add(path)
+                inputs.append(path)
+
+    return inputs
+
+
+def print_stages(batch: BatchReport) -> None:
+    for stage in batch.stages:
+        utilization = stage.get_utilization(batch.seconds) * 100
+        print(f"{stage.name:>10}: {stage.workers} workers, "
+              f"{stage.get_rate():.2f} images/s per worker, "
+              f"{utilization:.0f}% busy, queue {stage.get_mean_depth():.1f} "
+              f"on average and {stage.max_depth} at most")
+
+
+def main(arguments: list[str] | None = None) -> int:
+    args = parse_arguments(arguments)
+
+    try:
+        recipe = Recipe.load(args.recipe)
+    except (OSError, RecipeError) as e:
+        print(f"Could not read the recipe: {e}", file=sys.stderr)
+        return 2
+
+    inputs = expand_inputs(args.inputs)
+    if len(inputs) == 0:
+        print("No images matched the inputs", file=sys.stderr)
+        return 2
+
+    def report(result: FileResult) -> None:
+        if result.error is not None:
+            print(f"{result.input_path}: {result.error}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"{result.input_path} -> {result.output_path}")
+
+    # The inputs keep their paths below the directory they share, so
+    # inputs of the same name in different directories do not collide
+    root = get_input_root(inputs)
+    jobs = max(1, args.jobs)
+
+    if args.stream:
+        workers = {"decode": jobs, "transform": jobs, "encode": jobs,
+                   "write": 1, **args.stage_workers}
+        batch = stream_batch(recipe, inputs, args.output, args.format,
+                             workers, max(1, args.capacity), report, root)
+    else:
+        kind = "threads" if args.threads else "processes"
+
+        with create_executor(kind, jobs) as executor:
+            batch = run_batch(recipe, inputs, args.output, executor,
+                              args.format, report, root)
+
+    failed = len(batch.get_failed())
+    print(f"{len(inputs) - failed} of {len(inputs)} images in "
+          f"{batch.seconds:.2f} s, {batch.get_files_per_second():.2f} "
+          f"images/s, {batch.get_megapixels_per_second():.2f} MP/s")
+    print_stages(batch)
+
+    return 1 if failed != 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
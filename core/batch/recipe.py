@@ -0,0 +1,114 @@
+"""
+A recipe is the set of edits that is applied to every image of a batch.
+It holds the destructive filters, which are applied first and in order,
+and the properties of the image, which are rendered once afterwards.
+
+Recipes are stored as JSON. Only the properties that differ from their
+defaults are written. An image that is not resized keeps its size, and a
+resize taken from an image is stored as a scale of its size, so inputs of
+every size are scaled alike
+"""
+
+import json
+import typing
+from dataclasses import dataclass, field, fields
+
+from core.graphics.image import Image, _Properties, _diff_properties
+
+FILTERS: dict[str, typing.Callable[[Image], None]] = {
+    "negative": Image.apply_negative,
+    "grayscale": Image.convert_to_grayscale,
+    "red_monochrome": Image.apply_red_monochrome,
+    "green_monochrome": Image.apply_green_monochrome,
+    "blue_monochrome": Image.apply_blue_monochrome,
+}
+
+# Where a layer lies on the canvas means nothing for a single file
+_IGNORED_PROPERTIES = ("offset",)
+
+# The horizontal and vertical factors the size of an image is resized by,
+# which a recipe can hold instead of a resize
+SCALE = "scale"
+
+
+class RecipeError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+
+
+@dataclass
+class Recipe:
+    properties: dict[str, typing.Any] = field(default_factory=dict)
+    filters: list[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        names = {prop.name for prop in fields(_Properties)} | {SCALE}
+
+        for name in self.properties:
+            if name not in names or name in _IGNORED_PROPERTIES:
+                raise RecipeError(f"Unknown property: {name}")
+
+        if SCALE in self.properties and "resize" in self.properties:
+            raise RecipeError("A recipe can not both resize and scale")
+
+        for name in self.filters:
+            if name not in FILTERS:
+                raise RecipeError(f"Unknown filter: {name}")
+
+        # JSON has no tuples, but the properties are compared as tuples
+        self.properties = {name: tuple(value) if isinstance(value, list)
+                           else value
+                           for (name, value) in self.properties.items()}
+
+    @staticmethod
+    def from_image(image: Image, filters: list[str] | None = None) -> "Recipe":
+        delta = _diff_properties(image.get_properties())
+        properties = {name: value for (name, value) in delta
+                      if name not in _IGNORED_PROPERTIES}
+
+        # The size of the image is left out unless it was resized, and
+        # then it is kept relative to the size of the reference
+        resize = properties.pop("resize", None)
+        ref_width, ref_height = image.get_reference_size()
+
+        if resize is not None and resize != (ref_width, ref_height):
+            width, height = resize
+            properties[SCALE] = (width / ref_width, height / ref_height)
+
+        return Recipe(properties, list(filters or []))
+
+    @staticmethod
+    def load(path: str) -> "Recipe":
+        with open(path) as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as e:
+                raise RecipeError(f"Invalid recipe: {e}")
+
+        if not isinstance(data, dict):
+            raise RecipeError("A recipe must be a JSON object")
+
+        return Recipe(data.get("properties", {}), data.get("filters", []))
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump({"properties": self.properties,
+                       "filters": self.filters}, file, indent=4)
+
+    def apply(self, image: Image) -> None:
+        for name in self.filters:
+            FILTERS[name](image)
+
+        properties = dict(self.properties)
+        scale = properties.pop(SCALE, None)
+
+        props = _Properties(**properties)
+        if "resize" not in properties:
+            props.resize = image.get_properties().resize
+
+        if scale is not None:
+            width, height = props.resize
+            props.resize = (max(1, round(width * scale[0])),
+                            max(1, round(height * scale[1])))
+
+        image.set_properties(props)
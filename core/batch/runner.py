@@ -0,0 +1,207 @@
+"""
+Applies a recipe to many files on a pool of workers. Every worker reads,
+edits and writes its own files, so the results are written as soon as
+they are ready and only the paths travel between the workers
+"""
+
+import os
+import time
+import typing
+from concurrent.futures import Executor, as_completed
+from dataclasses import dataclass, field
+
+from PIL import Image as PILImage  # type: ignore
+
+from core.batch.recipe import Recipe
+from core.graphics.image import Image
+
+if typing.TYPE_CHECKING:
+    from core.batch.stream import StageMetrics
+
+# Formats that cannot store transparency are written without it
+_OPAQUE_FORMATS = ("JPEG", "BMP", "PPM")
+
+
+@dataclass
+class FileResult:
+    input_path: str
+    output_path: str
+    pixels: int = 0
+    error: str | None = None
+
+
+@dataclass
+class BatchReport:
+    results: list[FileResult] = field(default_factory=list)
+    seconds: float = 0.0
+    stages: list["StageMetrics"] = field(default_factory=list)
+
+    def get_failed(self) -> list[FileResult]:
+        return [result for result in self.results if result.error is not None]
+
+    def get_files_per_second(self) -> float:
+        done = len(self.results) - len(self.get_failed())
+        return done / self.seconds if self.seconds > 0 else 0.0
+
+    def get_megapixels_per_second(self) -> float:
+        pixels = sum(result.pixels for result in self.results)
+        return pixels / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+
+def resolve_format(format: str) -> tuple[str, str]:
+    """
+    Accepts both the name of a format and one of its extensions, and
+    returns the name together with the extension it is written with
+    """
+    extensions = PILImage.registered_extensions()
+    extension = "." + format.lower()
+
+    if extension in extensions:
+        return (extensions[extension], extension)
+
+    for (candidate, name) in extensions.items():
+        if name == format.upper():
+            return (name, candidate)
+
+    raise ValueError(f"Unknown format: {format}")
+
+
+def get_input_root(inputs: list[str]) -> str | None:
+    """
+    The deepest directory that holds every input, or None when they have
+    none in common
+    """
+    if len(inputs) == 0:
+        return None
+
+    try:
+        return os.path.commonpath([os.path.dirname(os.path.abspath(path))
+                                   for path in inputs])
+    except ValueError:
+        return None
+
+
+def get_output_path(input_path: str, output_dir: str,
+                    format: str | None = None,
+                    root: str | None = None) -> str:
+    """
+    With a root, the output keeps the path of the input relative to it,
+    otherwise only its file name
+    """
+    relative = os.path.basename(input_path)
+
+    if root is not None:
+        path = os.path.relpath(os.path.abspath(input_path), root)
+        if not path.startswith(os.pardir):
+            relative = path
+
+    name, extension = os.path.splitext(relative)
+
+    if format is not None:
+        _, extension = resolve_format(format)
+
+    return os.path.join(output_dir, name + extension)
+
+
+class OutputPaths():
+    """
+    Gives every input its output path. An input whose output path was
+    already given to another input fails instead of overwriting it
+    """
+    def __init__(self, output_dir: str, format: str | None = None,
+                 root: str | None = None) -> None:
+        self.__output_dir = output_dir
+        self.__format = format
+        self.__root = root
+        self.__inputs: dict[str, str] = {}
+
+    def get_result(self, input_path: str) -> FileResult:
+        output_path = get_output_path(input_path, self.__output_dir,
+                                      self.__format, self.__root)
+        key = os.path.normcase(os.path.abspath(output_path))
+        first = self.__inputs.setdefault(key, input_path)
+
+        if first != input_path:
+            error = f"{first} is written to the same output"
+            return FileResult(input_path, output_path, error=error)
+
+        return FileResult(input_path, output_path)
+
+
+def prepare_output(image: Image, output_path: str,
+                   format: str | None = None) -> tuple[PILImage.Image, str]:
+    """
+    Returns the rendered image as it is written, together with the format
+    it is written in, which defaults to the one of the output extension
+    """
+    rendered = image.get_base_image()
+    extension = os.path.splitext(output_path)[1].lower()
+    output_format = format or PILImage.registered_extensions().get(extension)
+
+    if output_format is None:
+        raise ValueError(f"Unknown format of the output: {output_path}")
+
+    if output_format.upper() in _OPAQUE_FORMATS:
+        rendered = rendered.convert("RGB")
+
+    return (rendered, output_format)
+
+
+def process_file(recipe: Recipe, input_path: str, output_path: str,
+                 format: str | None = None) -> FileResult:
+    """
+    Edits a single file. Errors are reported in the result instead of
+    being raised, so one bad file does not stop the batch
+    """
+    try:
+        image = Image(input_path)
+        recipe.apply(image)
+
+        rendered, output_format = prepare_output(image, output_path, format)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        rendered.save(output_path, output_format)
+    except Exception as e:
+        return FileResult(input_path, output_path, error=str(e))
+
+    width, height = rendered.size
+    return FileResult(input_path, output_path, width * height)
+
+
+def run_batch(recipe: Recipe, inputs: list[str], output_dir: str,
+              executor: Executor, format: str | None = None,
+              on_result: typing.Callable[[FileResult], None] | None = None,
+              root: str | None = None) -> BatchReport:
+    """
+    Processes the inputs on the executor. The results are passed to
+    `on_result` in the order they finish. The outputs keep their paths
+    relative to the root, see `get_output_path`
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = resolve_format(format)[0] if format is not None else None
+    output_paths = OutputPaths(output_dir, format, root)
+
+    report = BatchReport()
+    start = time.perf_counter()
+
+    def finish(result: FileResult) -> None:
+        report.results.append(result)
+
+        if on_result is not None:
+            on_result(result)
+
+    futures = []
+
+    for path in inputs:
+        result = output_paths.get_result(path)
+
+        if result.error is not None:
+            finish(result)
+        else:
+            futures.append(executor.submit(process_file, recipe, path,
+                                           result.output_path, name))
+
+    for future in as_completed(futures):
+        finish(future.result())
+
+    report.seconds = time.perf_counter() - start
+    return report
@@ -0,0 +1,363 @@
+"""
+Streams a batch through a chain of stages, each one on its own workers.
+The stages are connected by bounded queues, so a stage that falls behind
+makes the stages before it wait, and only a fixed number of items are in
+flight, no matter how many are streamed.
+
+Every stage records how many items it processed, how long its workers
+were busy and how full the queue in front of it was, which shows where
+the workers are best spent
+"""
+
+import io
+import os
+import time
+import queue
+import typing
+import threading
+from dataclasses import dataclass
+
+from core.batch.recipe import Recipe
+from core.batch.runner import BatchReport, FileResult
+from core.batch.runner import OutputPaths, prepare_output, resolve_format
+from core.graphics.image import Image
+
+Step = typing.Callable[[typing.Any], typing.Any]
+
+DEFAULT_CAPACITY = 4
+
+BATCH_STAGES = ("decode", "transform", "encode", "write")
+
+# How often the blocked workers check whether the stream was stopped
+_POLL_SECONDS = 0.05
+
+_DONE = object()
+
+
+@dataclass
+class StreamStage:
+    name: str
+    step: Step
+    workers: int = 1
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    workers: int
+    processed: int = 0
+    busy_seconds: float = 0.0
+    max_depth: int = 0
+    depth_sum: int = 0
+    depth_samples: int = 0
+
+    def get_mean_depth(self) -> float:
+        if self.depth_samples == 0:
+            return 0.0
+
+        return self.depth_sum / self.depth_samples
+
+    def get_rate(self) -> float:
+        """
+        The items a single worker of the stage processes in a second
+        """
+        if self.busy_seconds == 0:
+            return 0.0
+
+        return self.processed / self.busy_seconds
+
+    def get_utilization(self, seconds: float) -> float:
+        """
+        The part of the time the workers of the stage were busy
+        """
+        if seconds == 0:
+            return 0.0
+
+        return self.busy_seconds / (seconds * self.workers)
+
+
+class StreamPipeline():
+    def __init__(self, stages: list[StreamStage],
+                 capacity: int = DEFAULT_CAPACITY) -> None:
+        self.__stages = stages
+        self.__capacity = capacity
+        self.__lock = threading.Lock()
+        self.__metrics: list[StageMetrics] = []
+        self.__error: BaseException | None = None
+
+    def get_metrics(self) -> list[StageMetrics]:
+        return self.__metrics
+
+    def get_in_flight_limit(self) -> int:
+        """
+        The most items that are ever between being taken from the input
+        and being done with by the consumer of the stream. Besides the
+        queues, every worker, the feeder and the consumer hold one item
+        """
+        workers = sum(stage.workers for stage in self.__stages)
+        return (len(self.__stages) + 1) * self.__capacity + workers + 2
+
+    def run(self, items: typing.Iterable) -> typing.Iterator:
+        """
+        Streams the items through the stages and yields the results in
+        the order they finish. An error of a stage stops the stream and
+        is raised here
+        """
+        self.__metrics = [StageMetrics(stage.name, stage.workers)
+                          for stage in self.__stages]
+        self.__error = None
+
+        queues = [queue.Queue(self.__capacity)
+                  for _ in range(len(self.__stages) + 1)]
+        remaining = [stage.workers for stage in self.__stages]
+        stop = threading.Event()
+
+        threads = [threading.Thread(target=self.__feed,
+                                    args=(items, queues, stop), daemon=True)]
+
+        for index, stage in enumerate(self.__stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self.__work,
+                                          args=(index, queues, remaining,
+                                                stop),
+                                          daemon=True)
+                threads.append(thread)
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                result = self.__get(queues[-1], stop)
+
+                if result is _DONE or result is None:
+                    break
+
+                yield result[0]
+        finally:
+            stop.set()
+
+            for thread in threads:
+                thread.join()
+
+        if self.__error is not None:
+            raise self.__error
+
+    def __feed(self, items: typing.Iterable, queues: list[queue.Queue],
+               stop: threading.Event) -> None:
+        try:
+            for item in items:
+                if not self.__put(queues, 0, (item,), stop):
+                    return
+        except BaseException as e:
+            self.__fail(e, stop)
+            return
+
+        for _ in range(self.__stages[0].workers):
+            self.__put(queues, 0, _DONE, stop)
+
+    def __work(self, index: int, queues: list[queue.Queue],
+               remaining: list[int], stop: threading.Event) -> None:
+        stage = self.__stages[index]
+        metrics = self.__metrics[index]
+
+        while True:
+            item = self.__get(queues[index], stop)
+
+            if item is None:
+                return
+
+            if item is _DONE:
+                break
+
+            start = time.perf_counter()
+
+            try:
+                result = stage.step(item[0])
+            except BaseException as e:
+                self.__fail(e, stop)
+                return
+
+            with self.__lock:
+                metrics.processed += 1
+                metrics.busy_seconds += time.perf_counter() - start
+
+            if not self.__put(queues, index + 1, (result,), stop):
+                return
+
+        # The last worker of a stage tells the next stage it is done
+        with self.__lock:
+            remaining[index] -= 1
+            is_last = remaining[index] == 0
+
+        if is_last:
+            is_output = index + 1 == len(self.__stages)
+            workers = 1 if is_output else self.__stages[index + 1].workers
+
+            for _ in range(workers):
+                self.__put(queues, index + 1, _DONE, stop)
+
+    def __put(self, queues: list[queue.Queue], index: int,
+              item: typing.Any, stop: threading.Event) -> bool:
+        """
+        Waits for room in a queue. Returns False when the stream stopped
+        """
+        while not stop.is_set():
+            try:
+                queues[index].put(item, timeout=_POLL_SECONDS)
+            except queue.Full:
+                continue
+
+            if index < len(self.__metrics):
+                depth = queues[index].qsize()
+                metrics = self.__metrics[index]
+
+                with self.__lock:
+                    metrics.max_depth = max(metrics.max_depth, depth)
+                    metrics.depth_sum += depth
+                    metrics.depth_samples += 1
+
+            return True
+
+        return False
+
+    def __get(self, source: queue.Queue,
+              stop: threading.Event) -> typing.Any:
+        """
+        Waits for an item. Returns None when the stream stopped
+        """
+        while not stop.is_set():
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+        return None
+
+    def __fail(self, error: BaseException, stop: threading.Event) -> None:
+        with self.__lock:
+            if self.__error is None:
+                self.__error = error
+
+        stop.set()
+
+
+#    Batches    #
+@dataclass
+class _Item:
+    result: FileResult
+    format: str | None = None
+    image: Image | None = None
+    data: bytes | None = None
+
+
+def _guard(step: typing.Callable[[_Item], None]) -> Step:
+    """
+    Records the error of a file in its result, so one bad file does not
+    stop the stream. Files that failed skip the following stages
+    """
+    def guarded(item: _Item) -> _Item:
+        if item.result.error is None:
+            try:
+                step(item)
+            except Exception as e:
+                item.result.error = str(e)
+                item.image = None
+                item.data = None
+
+        return item
+
+    return guarded
+
+
+def _decode(item: _Item) -> None:
+    item.image = Image(item.result.input_path)
+
+
+def _transform(recipe: Recipe) -> typing.Callable[[_Item], None]:
+    def transform(item: _Item) -> None:
+        image = typing.cast(Image, item.image)
+        recipe.apply(image)
+
+        # Images render when their pixels are first asked for, which has to
+        # happen in this stage rather than in the encoder
+        image.get_base_image()
+
+    return transform
+
+
+def _encode(item: _Item) -> None:
+    image = typing.cast(Image, item.image)
+    rendered, format = prepare_output(image, item.result.output_path,
+                                      item.format)
+
+    buffer = io.BytesIO()
+    rendered.save(buffer, format)
+
+    width, height = rendered.size
+    item.result.pixels = width * height
+    item.image = None
+    item.data = buffer.getvalue()
+
+
+def _write(item: _Item) -> None:
+    os.makedirs(os.path.dirname(item.result.output_path), exist_ok=True)
+
+    with open(item.result.output_path, "wb") as file:
+        file.write(typing.cast(bytes, item.data))
+
+    item.data = None
+
+
+def create_batch_stages(recipe: Recipe,
+                        workers: dict[str, int] | None = None
+                        ) -> list[StreamStage]:
+    """
+    The stages of a batch. Every stage has a single worker unless the
+    workers say otherwise
+    """
+    workers = workers or {}
+    steps = [("decode", _decode), ("transform", _transform(recipe)),
+             ("encode", _encode), ("write", _write)]
+
+    for name in workers:
+        if name not in BATCH_STAGES:
+            raise ValueError(f"Unknown stage: {name}")
+
+    return [StreamStage(name, _guard(step), workers.get(name, 1))
+            for (name, step) in steps]
+
+
+def stream_batch(recipe: Recipe, inputs: typing.Iterable[str],
+                 output_dir: str, format: str | None = None,
+                 workers: dict[str, int] | None = None,
+                 capacity: int = DEFAULT_CAPACITY,
+                 on_result: typing.Callable[[FileResult], None] | None = None,
+                 root: str | None = None) -> BatchReport:
+    """
+    Processes the inputs in a stream, which keeps the memory bounded for
+    any number of inputs. The inputs are only read as there is room for
+    them, so they may be a generator. The outputs keep their paths
+    relative to the root, see `get_output_path`
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = resolve_format(format)[0] if format is not None else None
+    output_paths = OutputPaths(output_dir, format, root)
+
+    def create_items() -> typing.Iterator[_Item]:
+        for path in inputs:
+            yield _Item(output_paths.get_result(path), name)
+
+    pipeline = StreamPipeline(create_batch_stages(recipe, workers), capacity)
+    report = BatchReport()
+    start = time.perf_counter()
+
+    for item in pipeline.run(create_items()):
+        report.results.append(item.result)
+
+        if on_result is not None:
+            on_result(item.result)
+
+    report.seconds = time.perf_counter() - start
+    report.stages = pipeline.get_metrics()
+    return report
@@ -3,30 +3,71 @@ Used to construct checkered patterns. Mainly used for
 the construction of a pattern similar to the one shown
 on the alpha channel of transperent images
 """
-from PIL import ImageDraw           # type: ignore
+import functools
+
+from PIL import ImageColor          # type: ignore
 from PIL import Image as PILImage   # type: ignore
 
 from core.graphics.image import Image
 
+TILE_SIZE = 10
+
+
+@functools.lru_cache(maxsize=16)
+def _create_pattern(size: tuple[int, int], main_color: str,
+                    secondary_color: str,
+                    tile_size: int) -> PILImage.Image:
+    """
+    Creates the pattern in a few whole image operations. An image with one
+    pixel per tile is scaled up, so the tiles never have to be drawn one by
+    one. The patterns are cached, so they must never be changed in place
+    """
+    columns = -(-size[0] // tile_size)
+    rows = -(-size[1] // tile_size)
+
+    # The first tile of every even row is of the secondary colour
+    even_row = (b"\x01\x00" * (columns // 2 + 1))[:columns]
+    odd_row = (b"\x00\x01" * (columns // 2 + 1))[:columns]
+    data = ((even_row + odd_row) * (rows // 2 + 1))[:columns * rows]
+
+    tiles = PILImage.frombytes("P", (columns, rows), data)
+    tiles.putpalette(ImageColor.getrgb(main_color) +
+                     ImageColor.getrgb(secondary_color))
+
+    pattern = tiles.convert("RGB").resize(
+        (columns * tile_size, rows * tile_size), PILImage.Resampling.NEAREST)
+    return pattern.crop((0, 0, *size))
+
+
+def create_checkered_region(box: tuple[int, int, int, int],
+                            main_color: str = "white",
+                            secondary_color: str = "grey",
+                            tile_size: int = TILE_SIZE) -> PILImage.Image:
+    """
+    Creates the part of an endless pattern that lies in the box. The pattern
+    repeats every two tiles, so regions of the same size share a pattern
+    """
+    period = 2 * tile_size
+    x, y = box[0] % period, box[1] % period
+    width, height = box[2] - box[0], box[3] - box[1]
+
+    pattern_size = (-(-(x + width) // period) * period,
+                    -(-(y + height) // period) * period)
+    pattern = _create_pattern(pattern_size, main_color, secondary_color,
+                              tile_size)
+
+    return pattern.crop((x, y, x + width, y + height))
+
 
 class CheckeredBackground(Image):
     def __init__(self, size: tuple[int, int],
                  main_color: str = "white",
-                 secondary_color: str = "grey") -> None:
+                 secondary_color: str = "grey",
+                 tile_size: int = TILE_SIZE) -> None:
         self.__size = size
         self.__main_color = main_color
         self.__secondary_color = secondary_color
 
-        image = PILImage.new("RGB", size, main_color)
-        draw = ImageDraw.Draw(image)
-
-        TILE_SIZE = 10
-
-        for i in range(0, size[1], TILE_SIZE):
-            for j in range(0, size[0], TILE_SIZE):
-                if (i // TILE_SIZE) % 2 == (j // TILE_SIZE) % 2:
-                    width = j + TILE_SIZE
-                    height = i + TILE_SIZE
-                    draw.rectangle([i, j, height, width], fill=secondary_color)
+        image = _create_pattern(size, main_color, secondary_color, tile_size)
 
         super().__init__(image=image, mode="RGB")
@@ -0,0 +1,284 @@
+"""
+Composites the layers onto the canvas. It remembers where every layer was
+drawn and in which revision, so after a change only the damaged parts of
+the canvas are composited again, and only from the layers that overlap them.
+
+While a layer is being edited, the layers below and above it are kept
+flattened into two cached buffers, so a change of that layer composites
+three buffers no matter how deep the stack is.
+
+The canvas and the cached buffers are tiled surfaces, so only the tiles
+that are looked at are allocated. Damaged tiles outside of the visible
+area are dropped and composited again once they are looked at.
+
+Every mipmap level of the canvas is composited separately from the same
+level of the layers, so a zoomed out view never touches full resolution
+pixels
+"""
+
+from PIL import Image as PILImage  # type: ignore
+
+from core.graphics.image import Image
+from core.graphics.mipmap import get_level_size
+from core.graphics.tiled_surface import TiledSurface, Fill, intersect_boxes
+
+Box = tuple[int, int, int, int]
+Layers = list[tuple[str, Image]]
+StackKey = tuple[tuple[str, int], ...]
+
+
+def _union(first: Box, second: Box) -> Box:
+    return (min(first[0], second[0]), min(first[1], second[1]),
+            max(first[2], second[2]), max(first[3], second[3]))
+
+
+def _merge_boxes(boxes: list[Box]) -> list[Box]:
+    """
+    Merges overlapping boxes, so no part of the canvas is composited twice
+    """
+    merged: list[Box] = []
+
+    for box in boxes:
+        overlapping = [other for other in merged
+                       if intersect_boxes(box, other)]
+
+        while len(overlapping) != 0:
+            for other in overlapping:
+                merged.remove(other)
+                box = _union(box, other)
+
+            overlapping = [other for other in merged
+                           if intersect_boxes(box, other)]
+
+        merged.append(box)
+
+    return merged
+
+
+def _get_layer_box(image: Image, level: int) -> Box:
+    """
+    Where the layer lies on a level of the canvas
+    """
+    x, y, _, _ = image.get_paste_box(image.get_properties().offset)
+    width, height = image.get_level_size(level)
+    x, y = x >> level, y >> level
+    return (x, y, x + width, y + height)
+
+
+class Compositor():
+    def __init__(self, size: tuple[int, int], background: Fill) -> None:
+        """
+        The background returns a new image with its pixels in a box. Every
+        level is drawn on the background at its own resolution
+        """
+        self.__size = size
+        self.__background = background
+        self.__levels: dict[int, _Level] = {}
+
+    def get_size(self, level: int = 0) -> tuple[int, int]:
+        return get_level_size(self.__size, level)
+
+    def get_region(self, box: Box, level: int = 0) -> PILImage.Image:
+        return self.__get_level(level).get_region(box)
+
+    def get_allocated_count(self) -> int:
+        return sum(level.get_allocated_count()
+                   for level in self.__levels.values())
+
+    def invalidate(self) -> None:
+        self.__levels.clear()
+
+    def render(self, layers: Layers, active: str | None = None,
+               visible: Box | None = None, level: int = 0) -> list[Box]:
+        """
+        Brings a level of the canvas up to date with the layers, which are
+        ordered from the top one to the bottom one, and returns the damaged
+        boxes within the visible part of that level. The layers around the
+        active one are composited from the cache
+        """
+        return self.__get_level(level).render(layers, active, visible)
+
+    def __get_level(self, level: int) -> "_Level":
+        if level not in self.__levels:
+            size = get_level_size(self.__size, level)
+            self.__levels[level] = _Level(size, self.__background, level)
+
+        return self.__levels[level]
+
+
+class _Level():
+    def __init__(self, size: tuple[int, int], background: Fill,
+                 level: int) -> None:
+        self.__size = size
+        self.__background = background
+        self.__level = level
+        self.__bounds: Box = (0, 0, *size)
+        self.__surface = TiledSurface(size, "RGB", self.__composite)
+
+        self.__layers: Layers = []
+        self.__active: str | None = None
+
+        self.__drawn: dict[str, tuple[int, Box]] = {}
+        self.__order: list[str] = []
+        self.__is_valid = False
+
+        self.__below: tuple[StackKey, TiledSurface] | None = None
+        self.__above: tuple[StackKey, TiledSurface] | None = None
+
+    def get_region(self, box: Box) -> PILImage.Image:
+        return self.__surface.crop(box)
+
+    def get_allocated_count(self) -> int:
+        return self.__surface.get_allocated_count()
+
+    def render(self, layers: Layers, active: str | None,
+               visible: Box | None) -> list[Box]:
+        visible = visible if visible is not None else self.__bounds
+        names = [name for (name, _) in layers]
+
+        damaged = self.__get_damage(layers)
+
+        self.__layers = layers
+        self.__active = active if active in names else None
+
+        if not self.__is_valid:
+            self.__surface.clear()
+        else:
+            self.__update(damaged, visible)
+
+        self.__drawn = {}
+        for (name, image) in layers:
+            self.__drawn[name] = (image.get_revision(),
+                                  _get_layer_box(image, self.__level))
+
+        self.__order = names
+        self.__is_valid = True
+
+        visible_damage = [intersect_boxes(box, visible) for box in damaged]
+        return [box for box in visible_damage if box is not None]
+
+    def __update(self, damaged: list[Box], visible: Box) -> None:
+        for box in damaged:
+            for index, tile_box, area in self.__surface.get_tiles(box):
+                if not self.__surface.is_allocated(index):
+                    continue
+
+                if intersect_boxes(tile_box, visible) is None:
+                    self.__surface.discard(index)
+                else:
+                    self.__surface.update(area, self.__composite(area))
+
+    def __get_damage(self, layers: Layers) -> list[Box]:
+        if not self.__is_valid:
+            return [self.__bounds]
+
+        damaged: list[Box] = []
+        names = [name for (name, _) in layers]
+
+        # Only a change in the relative order of the layers that were
+        # already drawn moves them, adding or removing a layer does not
+        kept = [name for name in names if name in self.__drawn]
+        drawn_kept = [name for name in self.__order if name in names]
+        moved = {new for (new, old) in zip(kept, drawn_kept) if new != old}
+
+        for (name, image) in layers:
+            box = _get_layer_box(image, self.__level)
+
+            if name not in self.__drawn:
+                damaged.append(box)
+                continue
+
+            revision, drawn_box = self.__drawn[name]
+            is_moved = name in moved
+
+            if revision != image.get_revision() or is_moved:
+                damaged.append(drawn_box)
+                damaged.append(box)
+
+        for name, (_, drawn_box) in self.__drawn.items():
+            if name not in names:
+                damaged.append(drawn_box)
+
+        clipped = [intersect_boxes(box, self.__bounds) for box in damaged]
+        return _merge_boxes([box for box in clipped if box is not None])
+
+    def __composite(self, box: Box) -> PILImage.Image:
+        layers = self.__layers
+        names = [name for (name, _) in layers]
+
+        if self.__active is None:
+            image = self.__background(box)
+            self.__paste_layers(image, layers, box)
+            return image
+
+        index = names.index(self.__active)
+        image = self.__get_below(layers[index + 1:]).crop(box)
+        self.__paste_layers(image, [layers[index]], box)
+
+        if index != 0:
+            cover = self.__get_above(layers[:index]).crop(box)
+            image.paste(cover, (0, 0), cover)
+
+        return image
+
+    def __get_below(self, layers: Layers) -> TiledSurface:
+        key = _Level.__get_stack_key(layers)
+
+        def flatten(box: Box) -> PILImage.Image:
+            image = self.__background(box)
+            self.__paste_layers(image, layers, box)
+            return image
+
+        if self.__below is None or self.__below[0] != key:
+            surface = TiledSurface(self.__size, "RGB", flatten)
+            self.__below = (key, surface)
+
+        return self.__below[1]
+
+    def __get_above(self, layers: Layers) -> TiledSurface:
+        key = _Level.__get_stack_key(layers)
+
+        def flatten(box: Box) -> PILImage.Image:
+            size = (box[2] - box[0], box[3] - box[1])
+            image = PILImage.new("RGBA", size, (0, 0, 0, 0))
+
+            for (source, area) in self.__clip_layers(layers, box):
+                image.alpha_composite(source, (area[0] - box[0],
+                                               area[1] - box[1]))
+
+            return image
+
+        if self.__above is None or self.__above[0] != key:
+            surface = TiledSurface(self.__size, "RGBA", flatten)
+            self.__above = (key, surface)
+
+        return self.__above[1]
+
+    def __paste_layers(self, target: PILImage.Image, layers: Layers,
+                       box: Box) -> None:
+        """
+        Pastes the layers onto the target, which holds the pixels of the box
+        """
+        for (source, area) in self.__clip_layers(layers, box):
+            target.paste(source, (area[0] - box[0], area[1] - box[1]),
+                         source)
+
+    def __clip_layers(self, layers: Layers, box: Box):
+        """
+        Yields the parts of the layers that lie in the box, from the bottom
+        layer to the top one, together with where they lie on the canvas
+        """
+        for (_, image) in reversed(layers):
+            layer_box = _get_layer_box(image, self.__level)
+            area = intersect_boxes(layer_box, box)
+
+            if area is None:
+                continue
+
+            x, y = layer_box[:2]
+            source_box = (area[0] - x, area[1] - y, area[2] - x, area[3] - y)
+            yield (image.get_region(source_box, self.__level), area)
+
+    @staticmethod
+    def __get_stack_key(layers: Layers) -> StackKey:
+        return tuple((name, image.get_revision()) for (name, image) in layers)
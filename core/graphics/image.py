@@ -5,13 +5,26 @@ for e distructionless editing of the pictures
 """
 
 import copy
-from dataclasses import dataclass
+import math
+import typing
+import itertools
+from dataclasses import dataclass, field, fields, replace
 
 from PIL import ImageOps                # type: ignore
 from PIL import Image as PILImage       # type: ignore
-from PIL import ImageTk, ImageEnhance   # type: ignore
 from PIL import UnidentifiedImageError  # type: ignore
 
+from core.graphics.pipeline import Pipeline
+from core.graphics.pipeline import get_output_size, scale_properties
+from core.graphics.parallel import map_bands
+from core.graphics.mipmap import MAX_LEVEL, reduce_image, get_level_size
+from core.graphics.lazy_reference import LazyReference, decode_image
+
+# ImageTk imports tkinter, which is only imported once the image is shown,
+# so the images can be edited on machines without Tk
+if typing.TYPE_CHECKING:
+    from PIL import ImageTk  # type: ignore
+
 
 @dataclass
 class _Properties:
@@ -27,12 +40,178 @@ class _Properties:
     flip_horizontal: bool = False
 
 
-@dataclass
-class _Enchancers:
-    brightness: ImageEnhance._Enhance
-    contrast: ImageEnhance._Enhance
-    sharpness: ImageEnhance._Enhance
-    saturation: ImageEnhance._Enhance
+PropertiesDelta = tuple[tuple[str, typing.Any], ...]
+
+# The colour mode, the changed properties and the key of the reference
+# buffer. Together they determine what an image renders to
+Fingerprint = tuple[str, PropertiesDelta, int]
+
+
+def _diff_properties(props: _Properties) -> PropertiesDelta:
+    """
+    Only the properties that differ from their defaults are recorded
+    """
+    defaults = _Properties()
+    delta = []
+
+    for field in fields(_Properties):
+        value = getattr(props, field.name)
+
+        if value != getattr(defaults, field.name):
+            delta.append((field.name, value))
+
+    return tuple(delta)
+
+
+@dataclass(frozen=True, eq=False)
+class ImageSnapshot:
+    """
+    The state of an image at some point in time. The pixel buffers are
+    shared with the image rather than copied. They are never modified in
+    place, since destructive filters always produce a new reference, so
+    a snapshot only costs pixel memory once the image it was taken from
+    replaces its reference. The reference of an image whose file was not
+    decoded yet is kept as a lazy reference instead.
+
+    The rendered pixels are kept, so restoring the image does not render
+    it. They are only a cache though, the history drops them before it
+    drops anything else, see `without_rendered`
+    """
+    mode: str
+    properties: PropertiesDelta
+    reference: PILImage.Image | None
+    reference_key: int
+    rendered: PILImage.Image | None
+    preview_size: tuple[int, int] | None
+    proxy: PILImage.Image | None
+    proxy_key: int
+    lazy_reference: LazyReference | None = None
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ImageSnapshot):
+            return False
+
+        return self.get_fingerprint() == other.get_fingerprint()
+
+    def get_fingerprint(self) -> Fingerprint:
+        return (self.mode, self.properties, self.reference_key)
+
+    def get_rendered(self) -> PILImage.Image | None:
+        return self.rendered
+
+    def without_rendered(self) -> "ImageSnapshot":
+        return replace(self, rendered=None)
+
+
+@dataclass(frozen=True, eq=False)
+class RenderJob:
+    """
+    Everything an image needs to be rendered, so that the rendering can be
+    done away from the image, on another thread. Taking a job does no pixel
+    work, the reference is decoded and the proxy is built once it runs
+    """
+    fingerprint: Fingerprint
+    reference: PILImage.Image | None
+    lazy_reference: LazyReference | None
+    reference_key: int
+    properties: _Properties
+    pipeline: Pipeline
+    is_draft: bool = False
+    full_size: tuple[int, int] | None = None
+    proxy_size: tuple[int, int] | None = None
+    proxy: PILImage.Image | None = None
+    proxy_key: int = 0
+
+    # The proxy built by the job, the image keeps it once it is installed
+    built: list[PILImage.Image] = field(default_factory=list)
+
+    def get_source(self) -> tuple[PILImage.Image, int]:
+        if self.proxy_size is None:
+            if self.reference is not None:
+                return (self.reference, self.reference_key)
+
+            lazy_reference = typing.cast(LazyReference, self.lazy_reference)
+            return (lazy_reference.load(), self.reference_key)
+
+        if self.proxy is not None:
+            return (self.proxy, self.proxy_key)
+
+        if len(self.built) == 0:
+            self.built.append(_build_proxy(self.reference,
+                                           self.lazy_reference,
+                                           self.proxy_size))
+
+        return (self.built[0], self.proxy_key)
+
+    def get_built_proxy(self) -> PILImage.Image | None:
+        return self.built[0] if len(self.built) != 0 else None
+
+    def run(self) -> PILImage.Image:
+        source, source_key = self.get_source()
+        return self.pipeline.render(source, source_key, self.properties,
+                                    self.is_draft)
+
+
+def _build_proxy(reference: PILImage.Image | None,
+                 lazy_reference: LazyReference | None,
+                 size: tuple[int, int]) -> PILImage.Image:
+    if reference is None:
+        lazy_reference = typing.cast(LazyReference, lazy_reference)
+        reference = lazy_reference.decode_reduced(size)
+
+    resample = PILImage.Resampling.BICUBIC
+    return reference.resize(size, resample, reducing_gap=3.0)
+
+
+def render_detached(source: PILImage.Image, source_key: int,
+                    properties: _Properties,
+                    is_draft: bool = False) -> PILImage.Image:
+    """
+    Renders a job without its pipeline, which cannot leave the process it
+    was made in, so it can be sent to a process pool
+    """
+    return Pipeline().render(source, source_key, properties, is_draft)
+
+
+#    Destructive filters    #
+# They are pointwise, so large references are filtered in bands
+def _invert(image: PILImage.Image) -> PILImage.Image:
+    return ImageOps.invert(image.convert("RGB")).convert("RGBA")
+
+
+def _convert(mode: str) -> typing.Callable[[PILImage.Image], PILImage.Image]:
+    def convert(image: PILImage.Image) -> PILImage.Image:
+        return image.convert(mode).convert("RGBA")
+
+    return convert
+
+
+def _monochrome(channel: int) -> typing.Callable[[PILImage.Image],
+                                                 PILImage.Image]:
+    """
+    Keeps a single colour channel and clears the other two
+    """
+    def monochrome(image: PILImage.Image) -> PILImage.Image:
+        source = image.split()
+
+        for band in range(3):
+            if band != channel:
+                source[band].paste(source[band].point(lambda x: x * 0.0))
+
+        return PILImage.merge(image.mode, source)
+
+    return monochrome
+
+
+# Revisions are drawn from one shared counter, so a revision number
+# identifies both the image and the state it was in
+_revisions = itertools.count(1)
+
+# A draft of an image that is not previewed renders from its reference
+# scaled down by this factor, unless the reference is smaller than
+# DRAFT_MIN_PIXELS, which renders quickly enough as it is
+DRAFT_REDUCTION = 2
+DRAFT_MIN_PIXELS = 256 * 256
 
 
 class ImageNotRecognizedError(Exception):
@@ -43,61 +222,418 @@ class ImageNotRecognizedError(Exception):
 class Image:
     def __init__(self, path: str | None = None,
                  image: PILImage.Image | None = None,
-                 mode: str | None = None) -> None:
+                 mode: str | None = None,
+                 preview_size: tuple[int, int] | None = None) -> None:
+        """
+        A file opened with a preview size is previewed. Only as much of it
+        is decoded as the preview needs once its pixels are first needed,
+        the full resolution is decoded once it is needed, see
+        `get_full_resolution`
+        """
         self.__image = PILImage.new("RGBA", (1, 1), "Black")
         self.__mode = mode if mode is not None else "RGBA"
+        lazy_reference: LazyReference | None = None
 
         if path is None and image is None:
             self.__image = PILImage.new(self.__mode, (1, 1), "Black")
         elif path is not None:
             try:
-                self.__image = PILImage.open(path).convert("RGBA")
-                self.__image.load()
+                if preview_size is None:
+                    self.__image = decode_image(path)
+                else:
+                    lazy_reference = LazyReference(path)
             except UnidentifiedImageError as e:
                 raise ImageNotRecognizedError(*e.args)
         elif image is not None and path is None:
             self.__image = image.copy()
 
-        self.__reference = self.__image.copy()
+        # Until it is drawn on, the rendered image is the reference itself
+        self.__reference: PILImage.Image | None = self.__image
+        self.__lazy_reference: LazyReference | None = None
+        self.__reference_key = next(_revisions)
+        self.__pipeline = Pipeline()
+        self.__owns_image = False
+        self.__mipmaps: list[PILImage.Image] = []
+        self.__mipmap_source: PILImage.Image | None = None
+
+        self.__is_deferred = False
+        self.__is_pending = False
+        self.__submitted: tuple[Fingerprint, bool] | None = None
+        self.__is_draft = False
+        self.__is_draft_rendered = False
+
+        self.__preview_size: tuple[int, int] | None = None
+        self.__proxy: PILImage.Image | None = None
+        self.__proxy_key = next(_revisions)
+
+        # The full resolution size the rendered pixels stand for, when they
+        # were rendered from a proxy
+        self.__full_size: tuple[int, int] | None = None
 
         self.__props = _Properties()
         self.__props.resize = self.get_size()
 
+        self.__revision = next(_revisions)
+        self.__fingerprint: Fingerprint | None = None
+        self.__fingerprint_revision = 0
+
+        if lazy_reference is not None:
+            self.__reference = None
+            self.__lazy_reference = lazy_reference
+            self.__preview_size = preview_size
+            self.__props.resize = lazy_reference.size
+
+            # Until it is rendered the image shows nothing, at its full size
+            self.__image = PILImage.new("RGBA", (1, 1), (0, 0, 0, 0))
+            self.__full_size = lazy_reference.size
+            self.__apply_all_properties()
+
     def __eq__(self, other: object) -> bool:
+        """
+        Images are equal when they render the same reference with the same
+        properties, which takes constant time instead of comparing pixels
+        """
         if not isinstance(other, Image):
             return False
 
-        return self.get_base_image() == other.get_base_image()
+        if self.__revision == other.__revision:
+            return True
+
+        return self.get_fingerprint() == other.get_fingerprint()
 
     def save(self, path: str, format: (str | None) = None) -> None:
+        self.__ensure_rendered()
         self.__image.save(path, format)
 
     def copy(self) -> "Image":
-        copy_image = Image(image=self.__reference.copy())
+        """
+        The copy shares the reference with the image. A reference is never
+        written to, the destructive filters give the image that applies
+        them a new one, so only the pixels that diverge cost memory
+        """
+        copy_image = Image()
+        copy_image.__reference = self.__reference
+        copy_image.__lazy_reference = self.__lazy_reference
+        copy_image.__reference_key = self.__reference_key
         copy_image.__mode = self.__mode
         copy_image.__props = copy.deepcopy(self.__props)
-        copy_image.__apply_all_properties()
+        copy_image.__preview_size = self.__preview_size
+        copy_image.__proxy = self.__proxy
+        copy_image.__proxy_key = self.__proxy_key
+
+        # A pending render is left pending in the copy as well, it is done
+        # once the copy is changed or taken a render job from
+        copy_image.__image = self.__image
+        copy_image.__full_size = self.__full_size
+        copy_image.__owns_image = False
+        copy_image.__is_pending = (self.__is_pending or
+                                   self.__is_draft_rendered)
+        self.__owns_image = False
+
         return copy_image
 
+    def get_snapshot(self) -> ImageSnapshot:
+        mode, props, reference_key = self.get_fingerprint()
+        is_final = not self.__is_pending and not self.__is_draft_rendered
+        rendered = self.__image if is_final else None
+
+        # Only the proxy of a preview is kept, the one of a draft is not
+        # worth holding on to
+        proxy = self.__proxy if self.__preview_size is not None else None
+
+        self.__owns_image = False
+        return ImageSnapshot(mode, props, self.__reference, reference_key,
+                             rendered, self.__preview_size,
+                             proxy, self.__proxy_key,
+                             self.__lazy_reference)
+
+    @staticmethod
+    def from_snapshot(snapshot: ImageSnapshot,
+                      placeholder: "Image | None" = None) -> "Image":
+        """
+        Restores an image. It is only re-rendered when the rendered pixels
+        of the snapshot are gone. The last pixels shown by the placeholder
+        are shown meanwhile, like a copy shows the pixels of its image.
+        Without a placeholder it is rendered right away
+        """
+        image = Image()
+        image.__mode = snapshot.mode
+        image.__props = _Properties(**dict(snapshot.properties))
+        image.__reference = snapshot.reference
+        image.__lazy_reference = snapshot.lazy_reference
+        image.__reference_key = snapshot.reference_key
+        image.__preview_size = snapshot.preview_size
+        image.__proxy = snapshot.proxy
+        image.__proxy_key = snapshot.proxy_key
+
+        rendered = snapshot.get_rendered()
+
+        if rendered is None and placeholder is not None:
+            image.__image = placeholder.__image
+            image.__full_size = placeholder.__full_size
+            image.__owns_image = False
+            placeholder.__owns_image = False
+            image.__apply_all_properties()
+        elif rendered is None:
+            image.__render()
+        else:
+            image.__image = rendered
+            image.__owns_image = False
+
+            if image.__preview_size is not None:
+                image.__full_size = get_output_size(image.__props)
+
+        return image
+
+    def set_deferred(self, is_deferred: bool) -> None:
+        """
+        A deferred image does not render itself when its pixels are asked
+        for. It keeps showing its last rendered pixels until a render of its
+        current state is installed, see `take_render_job` and
+        `install_render`
+        """
+        self.__is_deferred = is_deferred
+
+    def is_render_pending(self) -> bool:
+        return self.__is_pending
+
+    def set_draft(self, is_draft: bool) -> None:
+        """
+        A draft image renders with cheaper filters. Once it stops being a
+        draft, a draft render is replaced by a render of full quality
+        """
+        self.__is_draft = is_draft
+
+        if is_draft or not self.__is_draft_rendered:
+            return
+
+        self.__is_pending = True
+
+    def is_draft(self) -> bool:
+        return self.__is_draft
+
+    def take_render_job(self) -> RenderJob | None:
+        """
+        Returns a job that renders the current state of the image, or None
+        when there is nothing new to render
+        """
+        if not self.__is_pending:
+            return None
+
+        fingerprint = self.get_fingerprint()
+        if (fingerprint, self.__is_draft) == self.__submitted:
+            return None
+
+        self.__submitted = (fingerprint, self.__is_draft)
+        return self.__make_render_job(fingerprint)
+
+    def install_render(self, job: RenderJob,
+                       rendered: PILImage.Image | None) -> bool:
+        """
+        Shows the result of a job. It is only accepted when the image has not
+        changed since the job was taken. A job that failed to render is
+        rendered again here. A draft render stays pending until the full
+        quality render is installed, unless the image is still a draft
+        """
+        if not self.__is_pending or job.fingerprint != self.get_fingerprint():
+            return False
+
+        if rendered is None:
+            self.__render()
+            return True
+
+        self.__keep_sources(job)
+        self.__image = rendered
+        self.__full_size = job.full_size
+        self.__owns_image = False
+        self.__is_draft_rendered = job.is_draft
+        self.__is_pending = job.is_draft and not self.__is_draft
+
+        if not self.__is_pending:
+            self.__submitted = None
+
+        self.__touch()
+        return True
+
+    def get_full_resolution(self, is_rendered: bool = True) -> "Image":
+        """
+        Returns the image rendered from its full resolution reference,
+        regardless of whether it is being previewed. When it is not to be
+        rendered, the image that is returned is left pending instead
+        """
+        if is_rendered:
+            self.__ensure_rendered()
+
+        is_final = not self.__is_pending and not self.__is_draft_rendered
+        if self.__preview_size is None and is_final:
+            return self
+
+        full_resolution = self.copy()
+        full_resolution.__preview_size = None
+        full_resolution.__proxy = None
+
+        if is_rendered:
+            full_resolution.__render()
+        else:
+            full_resolution.__is_pending = True
+
+        return full_resolution
+
     #    Accessors    #
     def get_base_image(self) -> PILImage:
+        self.__ensure_rendered()
         return self.__image
 
+    def get_reference_size(self) -> tuple[int, int]:
+        """
+        The size of the pixels the properties are applied to, without
+        decoding them
+        """
+        return self.__get_reference_size()
+
     def get_size(self) -> tuple[int, int]:
+        """
+        The size of the image at full resolution, even when its pixels were
+        rendered from a smaller proxy
+        """
+        self.__ensure_rendered()
+
+        if self.__full_size is not None:
+            return self.__full_size
+
         return self.__image.size
 
-    def get_tkinter_data(self) -> ImageTk.PhotoImage:
+    def get_level_size(self, level: int) -> tuple[int, int]:
+        return get_level_size(self.get_size(), level)
+
+    def get_region(self, box: tuple[int, int, int, int],
+                   level: int = 0) -> PILImage.Image:
+        """
+        The pixels in a box of a mipmap level. Pixels rendered from a proxy
+        are only scaled up to a level with more pixels than they have in
+        the box, so a preview is never scaled to its full resolution
+        """
+        self.__ensure_rendered()
+
+        if level >= self.__get_base_level():
+            return self.get_mipmap(level).crop(box)
+
+        width, height = self.__full_size
+        scale_x = self.__image.width * (1 << level) / width
+        scale_y = self.__image.height * (1 << level) / height
+
+        # The levels are rounded up, so the box can reach just past the
+        # scaled pixels
+        left, top = box[0] * scale_x, box[1] * scale_y
+        right = min(box[2] * scale_x, self.__image.width)
+        bottom = min(box[3] * scale_y, self.__image.height)
+
+        # The pixels around the box that the bicubic filter reaches into
+        margin = math.ceil(2 * max(1.0, scale_x, scale_y)) + 1
+        area = (max(0, math.floor(left) - margin),
+                max(0, math.floor(top) - margin),
+                min(self.__image.width, math.ceil(right) + margin),
+                min(self.__image.height, math.ceil(bottom) + margin))
+
+        x, y = area[:2]
+        size = (box[2] - box[0], box[3] - box[1])
+        resample = PILImage.Resampling.BICUBIC
+        return self.__image.crop(area).resize(
+            size, resample, (left - x, top - y, right - x, bottom - y))
+
+    def get_mipmap(self, level: int) -> PILImage.Image:
+        """
+        The rendered image scaled down by a factor of 2 to the power of the
+        level. The levels are built when they are first asked for and are
+        kept until the rendered image changes. The levels of a preview
+        start at the first one its pixels are scaled down to
+        """
+        self.__ensure_rendered()
+        base_level = self.__get_base_level()
+
+        if level < base_level:
+            return self.get_region((0, 0, *self.get_level_size(level)),
+                                   level)
+
+        if len(self.__mipmaps) == 0 or self.__mipmap_source is not self.__image: # noqa
+            size = self.get_level_size(base_level)
+            first = self.__image
+            if first.size != size:
+                first = first.resize(size, PILImage.Resampling.BICUBIC)
+
+            self.__mipmaps = [first]
+            self.__mipmap_source = self.__image
+
+        while len(self.__mipmaps) <= level - base_level:
+            self.__mipmaps.append(reduce_image(self.__mipmaps[-1]))
+
+        return self.__mipmaps[level - base_level]
+
+    def get_tkinter_data(self) -> "ImageTk.PhotoImage":
+        from PIL import ImageTk  # type: ignore
+        self.__ensure_rendered()
         return ImageTk.PhotoImage(self.__image)
 
     def get_properties(self) -> _Properties:
         return self.__props
 
+    def get_revision(self) -> int:
+        return self.__revision
+
+    def get_fingerprint(self) -> Fingerprint:
+        if self.__fingerprint_revision != self.__revision:
+            props = _diff_properties(self.__props)
+            self.__fingerprint = (self.__mode, props, self.__reference_key)
+            self.__fingerprint_revision = self.__revision
+
+        return typing.cast(Fingerprint, self.__fingerprint)
+
+    def get_paste_box(self, offset: tuple[int, int] | None = None) -> tuple[int, int, int, int]: # noqa
+        """
+        The area `cropped_paste` covers with this image. The rendered image
+        stays centered on where the center of its reference would be
+        """
+        width, height = self.get_size()
+        ref_width, ref_height = self.__get_reference_size()
+
+        x = ref_width // 2 - width // 2
+        y = ref_height // 2 - height // 2
+
+        if offset is not None:
+            x, y = x + offset[0], y + offset[1]
+
+        return (x, y, x + width, y + height)
+
     def get_thumbnail(self, size: tuple[int, int]) -> "Image":
         resample = PILImage.Resampling.BICUBIC
+        self.__ensure_rendered()
         thumbnail_image = self.__image.copy()
         thumbnail_image.thumbnail(size, resample)
         return Image(image=thumbnail_image)
 
+    def is_previewed(self) -> bool:
+        return self.__preview_size is not None
+
+    def get_buffers(self) -> dict[str, list[PILImage.Image]]:
+        """
+        The pixel buffers held by the image, by what they are kept for. The
+        cache can be evicted, see `evict_cache`. Buffers may be shared with
+        copies and snapshots of the image
+        """
+        reference = [self.__reference, self.__proxy]
+        if self.__reference is None and self.__lazy_reference is not None:
+            if self.__lazy_reference.is_loaded():
+                reference[0] = self.__lazy_reference.load()
+
+        mipmaps = [mipmap for mipmap in self.__mipmaps
+                   if mipmap is not self.__image]
+
+        return {
+            "reference": [buffer for buffer in reference if buffer is not None], # noqa
+            "rendered": [self.__image],
+            "cache": self.__pipeline.get_buffers() + mipmaps,
+        }
+
     #    Converters    #
     def convert_to_rgb(self) -> None:
         self.__convert("RGB")
@@ -112,28 +648,61 @@ class Image:
             self.__convert("LA")
 
     #    Modifiers    #
+    def set_preview(self, size: tuple[int, int] | None) -> None:
+        """
+        While a preview size is set, the properties are rendered from a
+        proxy of the reference that fits in that size instead of from
+        the reference itself
+        """
+        if size == self.__preview_size:
+            return
+
+        self.__preview_size = size
+        self.__proxy = None
+        self.__apply_all_properties()
+
+    def evict_cache(self) -> bool:
+        """
+        Drops the stage cache and the mipmaps, which are rebuilt when they
+        are needed again. Returns False when a render is using the cache
+        """
+        self.__mipmaps = []
+
+        # The proxy of a draft is only kept around for the next draft
+        if self.__preview_size is None:
+            self.__proxy = None
+
+        return self.__pipeline.evict()
+
     def paste(self, image: "Image", box: tuple[int, int] | None = None) -> None: # noqa
-        mask = image.__image
-        self.__image.paste(image.__image, box, mask)
+        # The rendered image may be shared with the reference, the cache of
+        # the pipeline or a snapshot, so it is copied before it is drawn on
+        self.__ensure_rendered()
+        image.__ensure_rendered()
 
-    def cropped_paste(self, image: "Image", box: tuple[int, int] | None = None) -> None: # noqa
-        width, height = image.get_size()
-        ref_width, ref_height = image.__reference.size
+        if not self.__owns_image:
+            self.__image = self.__image.copy()
+            self.__owns_image = True
 
-        width_offset = ref_width // 2 - width // 2
-        height_offset = ref_height // 2 - height // 2
-        offset_box = (width_offset, height_offset)
+        # A previewed image is pasted at its full size
+        source = image.__image
+        if image.__full_size is not None:
+            source = image.get_region((0, 0, *image.__full_size))
 
-        if box is not None:
-            offset_box = (box[0] + offset_box[0], box[1] + offset_box[1])
+        self.__image.paste(source, box, source)
+        self.__mipmaps = []
+        self.__touch()
 
-        self.paste(image, offset_box)
+    def cropped_paste(self, image: "Image", box: tuple[int, int] | None = None) -> None: # noqa
+        x, y, _, _ = image.get_paste_box(box)
+        self.paste(image, (x, y))
 
     def shrink_to_fit(self, canvas_size: tuple[int, int]) -> None:
         resample = PILImage.Resampling.BICUBIC
-        self.__image.thumbnail(canvas_size, resample)
-        self.__reference.thumbnail(canvas_size, resample)
-        self.__props.resize = self.__reference.size
+        reference = self.__get_reduced_reference(canvas_size)
+        reference.thumbnail(canvas_size, resample)
+        self.__set_reference(reference)
+        self.__props.resize = reference.size
         self.__apply_all_properties()
 
     def center(self, canvas_size: tuple[int, int]) -> None:
@@ -147,24 +716,41 @@ class Image:
         y_offset = canvas_y - y
 
         self.__props.offset = (x_offset, y_offset)
+        self.__touch()
+
+    def set_properties(self, props: _Properties) -> None:
+        """
+        Replaces all of the properties at once, so they are rendered once
+        """
+        self.__props = copy.deepcopy(props)
+        self.__apply_all_properties()
 
     def replace(self, image: "Image"):
         self.paste(image)
         self.__props = copy.deepcopy(image.__props)
+        self.__touch()
 
     def clear(self) -> None:
         self.__image = PILImage.new(self.__mode, self.get_size())
-        self.__reference = self.__image.copy()
+        self.__full_size = None
+        self.__owns_image = True
+        self.__is_pending = False
+        self.__set_reference(self.__image.copy())
         self.__props = _Properties()
+        self.__touch()
 
     def reset(self) -> None:
-        self.__image = self.__reference.copy()
+        self.__image = self.__get_reference().copy()
+        self.__full_size = None
+        self.__owns_image = True
+        self.__is_pending = False
+        self.__touch()
 
     def clear_effects(self) -> None:
         old_offset = self.__props.offset
         self.__props = _Properties()
         self.__props.offset = old_offset
-        self.__props.resize = self.__reference.size
+        self.__props.resize = self.__get_reference_size()
         self.__apply_all_properties()
 
     def rotate(self, angle: float) -> None:
@@ -193,6 +779,7 @@ class Image:
         y_offset = y_offset or 0
 
         self.__props.offset = (x + x_offset, y + y_offset)
+        self.__touch()
 
     def scale(self, scale: tuple[float | None, float | None]) -> None:
         x, y = self.__props.resize
@@ -252,53 +839,23 @@ class Image:
 
     def apply_negative(self) -> None:
         self.__mode = "RGB"
-        self.__reference = self.__reference.convert("RGB")
-        self.__reference = ImageOps.invert(self.__reference).convert("RGBA")
+        self.__set_reference(map_bands(_invert, self.__get_reference()))
         self.__apply_all_properties()
 
     def apply_red_monochrome(self) -> None:
-        _, G, B = 0, 1, 2
-
-        source = self.__reference.split()
-
-        green = source[G].point(lambda x: x * 0.0)
-        blue = source[B].point(lambda x: x * 0.0)
-
-        source[G].paste(green)
-        source[B].paste(blue)
-
-        self.__reference = PILImage.merge(self.__reference.mode, source)
+        self.__set_reference(map_bands(_monochrome(0), self.__get_reference()))
         self.__apply_all_properties()
 
     def apply_green_monochrome(self) -> None:
-        R, _, B = 0, 1, 2
-
-        source = self.__reference.split()
-
-        red = source[R].point(lambda x: x * 0.0)
-        blue = source[B].point(lambda x: x * 0.0)
-
-        source[R].paste(red)
-        source[B].paste(blue)
-
-        self.__reference = PILImage.merge(self.__reference.mode, source)
+        self.__set_reference(map_bands(_monochrome(1), self.__get_reference()))
         self.__apply_all_properties()
 
     def apply_blue_monochrome(self) -> None:
-        R, G, _ = 0, 1, 2
-
-        source = self.__reference.split()
-
-        red = source[R].point(lambda x: x * 0.0)
-        green = source[G].point(lambda x: x * 0.0)
-
-        source[R].paste(red)
-        source[G].paste(green)
-
-        self.__reference = PILImage.merge(self.__reference.mode, source)
+        self.__set_reference(map_bands(_monochrome(2), self.__get_reference()))
         self.__apply_all_properties()
 
     def print_data(self) -> None:
+        self.__ensure_rendered()
         width = self.__image.width
         height = self.__image.height
         pixels = list(self.__image.getdata())
@@ -307,50 +864,166 @@ class Image:
         print(data)
 
     #    Private Methods    #
+    def __touch(self) -> None:
+        self.__revision = next(_revisions)
+
+    def __set_reference(self, reference: PILImage.Image) -> None:
+        self.__reference = reference
+        self.__lazy_reference = None
+        self.__reference_key = next(_revisions)
+        self.__proxy = None
+
+    def __get_reference(self) -> PILImage.Image:
+        """
+        The full resolution reference, which is decoded when it is first
+        needed if the image was opened for a preview
+        """
+        if self.__reference is None:
+            lazy_reference = typing.cast(LazyReference, self.__lazy_reference)
+            self.__reference = lazy_reference.load()
+
+        return self.__reference
+
+    def __get_reference_size(self) -> tuple[int, int]:
+        if self.__reference is None:
+            return typing.cast(LazyReference, self.__lazy_reference).size
+
+        return self.__reference.size
+
+    def __get_reduced_reference(self,
+                                size: tuple[int, int]) -> PILImage.Image:
+        """
+        A new image of the reference that is at least twice the size. It
+        is decoded at a lower resolution while the file is not decoded yet
+        """
+        if self.__reference is None:
+            lazy_reference = typing.cast(LazyReference, self.__lazy_reference)
+            return lazy_reference.decode_reduced(size)
+
+        return self.__reference.copy()
+
+    def __get_base_level(self) -> int:
+        """
+        The first mipmap level that has no more pixels than the rendered
+        image, which is only above 0 for pixels rendered from a proxy
+        """
+        if self.__full_size is None:
+            return 0
+
+        level = 0
+        width, height = self.__image.size
+
+        while level < MAX_LEVEL:
+            level_width, level_height = self.get_level_size(level)
+            if level_width <= width and level_height <= height:
+                break
+
+            level += 1
+
+        return level
+
+    def __get_proxy_size(self) -> tuple[int, int] | None:
+        """
+        The size of the proxy a render starts from, or None when it starts
+        from the reference. A preview starts from the proxy that fits the
+        preview size, doubled for as long as the output would still be
+        smaller than the preview size, e.g. after a crop. A draft that is
+        not previewed starts from a reduced reference
+        """
+        ref_width, ref_height = self.__get_reference_size()
+
+        if self.__preview_size is None:
+            if not self.__is_draft or ref_width * ref_height < DRAFT_MIN_PIXELS: # noqa
+                return None
+
+            return (-(-ref_width // DRAFT_REDUCTION),
+                    -(-ref_height // DRAFT_REDUCTION))
+        preview_width, preview_height = self.__preview_size
+        width, height = get_output_size(self.__props)
+
+        scale = min(preview_width / ref_width, preview_height / ref_height)
+        needed = min(preview_width / max(1, width),
+                     preview_height / max(1, height), 1.0)
+
+        while scale < needed:
+            scale *= 2
+
+        if scale >= 1.0:
+            return None
+
+        return (max(1, round(ref_width * scale)),
+                max(1, round(ref_height * scale)))
+
+    def __make_render_job(self, fingerprint: Fingerprint) -> RenderJob:
+        """
+        A job that renders from the proxy of the image, or from a new one
+        when it does not have a proxy of the size that is needed. Its
+        properties are scaled to the proxy, and its full size is the size
+        the render stands for, which is None when it renders the reference
+        """
+        size = self.__get_proxy_size()
+
+        if size is None:
+            return RenderJob(fingerprint, self.__reference,
+                             self.__lazy_reference, self.__reference_key,
+                             copy.deepcopy(self.__props), self.__pipeline,
+                             self.__is_draft)
+
+        proxy, proxy_key = self.__proxy, self.__proxy_key
+        if proxy is None or proxy.size != size:
+            proxy, proxy_key = None, next(_revisions)
+
+        ref_width, ref_height = self.__get_reference_size()
+        scale = (size[0] / ref_width, size[1] / ref_height)
+        return RenderJob(fingerprint, self.__reference,
+                         self.__lazy_reference, self.__reference_key,
+                         scale_properties(self.__props, scale),
+                         self.__pipeline, self.__is_draft,
+                         get_output_size(self.__props), size, proxy,
+                         proxy_key)
+
+    def __keep_sources(self, job: RenderJob) -> None:
+        """
+        Keeps the proxy a job built and the reference it decoded, which
+        the job did with the image as it was when the job was taken
+        """
+        proxy = job.get_built_proxy()
+
+        if proxy is not None:
+            self.__proxy = proxy
+            self.__proxy_key = job.proxy_key
+
+        is_decoded = job.proxy_size is None and job.reference is None
+        if is_decoded and self.__reference_key == job.reference_key:
+            self.__reference = job.get_source()[0]
+
     def __convert(self, mode: str) -> None:
         if self.__mode == mode:
             return
 
         self.__mode = mode
-        self.__reference = self.__reference.convert(mode).convert("RGBA")
+        self.__set_reference(map_bands(_convert(mode), self.__get_reference()))
         self.__apply_all_properties()
 
     def __apply_all_properties(self) -> None:
-        props = self.__props
-        image = self.__reference.copy()
-        enhancers = _Enchancers(
-            ImageEnhance.Brightness(image),
-            ImageEnhance.Contrast(image),
-            ImageEnhance.Sharpness(image),
-            ImageEnhance.Color(image),
-        )
-
-        if props.brightness != 1.0:
-            image.paste(enhancers.brightness.enhance(props.brightness))
-        if props.contrast != 1.0:
-            image.paste(enhancers.contrast.enhance(props.contrast))
-        if props.sharpness != 1.0:
-            image.paste(enhancers.sharpness.enhance(props.sharpness))
-        if props.saturation != 1.0:
-            image.paste(enhancers.saturation.enhance(props.saturation))
-
-        if props.flip_horizontal:
-            image = image.transpose(PILImage.Transpose.FLIP_LEFT_RIGHT)
-        if props.flip_vertical:
-            image = image.transpose(PILImage.Transpose.FLIP_TOP_BOTTOM)
-
-        if props.resize != self.__reference.size:
-            resample = PILImage.Resampling.BICUBIC
-            image = image.resize(props.resize, resample, reducing_gap=True)
-
-        if props.crop != (0, 0, 0, 0):
-            x, y, xx, yy = 0, 0, *props.resize
-            crop_x, crop_y, crop_xx, crop_yy = props.crop
-            crop = (x + crop_x, y + crop_y, xx - crop_xx, yy - crop_yy)
-            image = image.crop(crop)
-
-        if props.rotation != 0:
-            resample = PILImage.Resampling.BICUBIC
-            image = image.rotate(props.rotation, resample, expand=True)
-
-        self.__image = image
+        """
+        Only marks the image as changed. It is rendered once its pixels are
+        needed, so a series of changes is rendered once
+        """
+        self.__is_pending = True
+        self.__touch()
+
+    def __ensure_rendered(self) -> None:
+        if self.__is_pending and not self.__is_deferred:
+            self.__render()
+
+    def __render(self) -> None:
+        job = self.__make_render_job(self.get_fingerprint())
+        self.__image = job.run()
+        self.__keep_sources(job)
+        self.__full_size = job.full_size
+        self.__owns_image = False
+        self.__is_draft_rendered = self.__is_draft
+        self.__is_pending = False
+        self.__submitted = None
+        self.__touch()
@@ -0,0 +1,86 @@
+"""
+Decoding of image files. When only a smaller version of an image is
+needed, JPEG files are decoded at a reduced scale right away (1/2, 1/4 or
+1/8 of their size) and other files are reduced right after decoding, so
+the full resolution is never converted or kept around.
+
+The full resolution reference of an opened file is only decoded once it
+is needed, which is usually not before the image is exported. Until then
+the encoded bytes of the file are kept, so a file that is deleted or
+replaced after it was opened does not change the image
+"""
+
+import io
+import typing
+import threading
+
+from PIL import Image as PILImage  # type: ignore
+
+# Like PIL's thumbnails, a reduced decode keeps at least twice the pixels
+# that are asked for, so that the final resample still has room to smooth
+DRAFT_GAP = 2
+
+
+def decode_image(path: str | typing.BinaryIO,
+                 size: tuple[int, int] | None = None) -> PILImage.Image:
+    """
+    Decodes an image file, given by its path or as a file object, as
+    RGBA. With a size, the image may be decoded at a lower resolution,
+    which is still at least twice that size
+    """
+    with PILImage.open(path) as file:
+        if size is not None:
+            file.draft(file.mode, (size[0] * DRAFT_GAP, size[1] * DRAFT_GAP))
+
+        image = file.convert("RGBA")
+
+    if size is None:
+        return image
+
+    factor = min(image.width // size[0], image.height // size[1]) // DRAFT_GAP
+
+    if factor >= 2:
+        image = image.convert("RGBa").reduce(factor).convert("RGBA")
+
+    return image
+
+
+class LazyReference():
+    def __init__(self, path: str) -> None:
+        """
+        The file is read here, but only its header is decoded. Copies and
+        snapshots of an image share its lazy reference, so the file is
+        decoded once
+        """
+        with open(path, "rb") as file:
+            self.__data: bytes | None = file.read()
+
+        with PILImage.open(io.BytesIO(self.__data)) as file:
+            self.size: tuple[int, int] = file.size
+
+        self.__image: PILImage.Image | None = None
+        self.__lock = threading.Lock()
+
+    def is_loaded(self) -> bool:
+        return self.__image is not None
+
+    def load(self) -> PILImage.Image:
+        with self.__lock:
+            if self.__image is None:
+                self.__image = decode_image(io.BytesIO(self.__data))
+                self.__data = None
+
+            return self.__image
+
+    def decode_reduced(self, size: tuple[int, int]) -> PILImage.Image:
+        """
+        Decodes a new version of the image that is at least twice the
+        size, unless the full resolution is already loaded
+        """
+        with self.__lock:
+            image, data = self.__image, self.__data
+
+        if image is not None:
+            return image.copy()
+
+        return decode_image(io.BytesIO(data), size)
@@ -0,0 +1,41 @@
+"""
+Mipmap levels. Level 0 is the full resolution and every following level
+halves the width and the height of the one before it
+"""
+
+import math
+
+from PIL import Image as PILImage  # type: ignore
+
+MAX_LEVEL = 8
+
+
+def get_level(zoom: float) -> int:
+    """
+    The smallest level that still has at least as many pixels as are shown
+    at the zoom, so a level is only ever scaled down
+    """
+    if zoom >= 1:
+        return 0
+
+    return min(math.floor(math.log2(1 / zoom)), MAX_LEVEL)
+
+
+def get_scale(level: int) -> float:
+    return 1 / (1 << level)
+
+
+def get_level_size(size: tuple[int, int], level: int) -> tuple[int, int]:
+    factor = 1 << level
+    return (-(-size[0] // factor), -(-size[1] // factor))
+
+
+def reduce_image(image: PILImage.Image) -> PILImage.Image:
+    """
+    Halves an image. Transparent images are averaged with their colours
+    premultiplied, so transparent pixels do not bleed into their neighbours
+    """
+    if image.mode == "RGBA":
+        return image.convert("RGBa").reduce(2).convert("RGBA")
+
+    return image.reduce(2)
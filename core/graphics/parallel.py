@@ -0,0 +1,102 @@
+"""
+Splits the work on a large image into bands of rows, which are processed
+on a pool of threads and stitched back together. Pillow releases the GIL
+while it works on the pixels, so the bands are processed on all the cores.
+
+Pointwise operations are split as they are. Operations that look at the
+neighbours of a pixel are given a halo of rows around every band, which
+is cut away again, so the result is the same as that of processing the
+whole image at once
+"""
+
+import os
+import typing
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from PIL import Image as PILImage  # type: ignore
+
+Filter = typing.Callable[[PILImage.Image], PILImage.Image]
+Apply = typing.Callable[[PILImage.Image, tuple], PILImage.Image]
+
+# Images are split into bands of about this many pixels. Smaller images
+# are processed at once, splitting them costs more than it saves
+BAND_PIXELS = 1 << 20
+
+_executor: Executor | None = None
+_lock = threading.Lock()
+
+
+def set_executor(executor: Executor | None) -> None:
+    """
+    Replaces the pool the bands are processed on. It must not be the pool
+    the renders themselves run on, since they wait for their bands
+    """
+    global _executor
+
+    with _lock:
+        _executor = executor
+
+
+def get_executor() -> Executor:
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(os.cpu_count(), "ImageBand")
+
+        return _executor
+
+
+def split_rows(height: int, count: int) -> list[tuple[int, int]]:
+    """
+    Splits the rows into at most a number of bands of nearly equal height
+    """
+    count = max(1, min(count, height))
+    edges = [height * index // count for index in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def map_bands(function: Filter, image: PILImage.Image,
+              halo: int = 0) -> PILImage.Image:
+    """
+    Applies a function, which must keep the size of the image, to the
+    bands of the image. The function sees a halo of rows around every band
+    """
+    width, height = image.size
+    count = -(-width * height // BAND_PIXELS)
+    bands = split_rows(height, count)
+
+    if len(bands) == 1:
+        return function(image)
+
+    def process(top: int, bottom: int) -> PILImage.Image:
+        box = (0, max(top - halo, 0), width, min(bottom + halo, height))
+        band = function(image.crop(box))
+        top = top - box[1]
+        return band.crop((0, top, width, top + bottom - box[1]))
+
+    executor = get_executor()
+    futures = [executor.submit(process, top, bottom)
+               for (top, bottom) in bands]
+
+    result: PILImage.Image | None = None
+    for (top, _), future in zip(bands, futures):
+        band = future.result()
+
+        if result is None:
+            result = PILImage.new(band.mode, (width, height))
+
+        result.paste(band, (0, top))
+
+    return result
+
+
+def banded(apply: Apply, halo: int = 0) -> Apply:
+    """
+    Turns the apply of a pipeline stage into one that works in bands
+    """
+    def apply_bands(image: PILImage.Image, params: tuple) -> PILImage.Image:
+        return map_bands(lambda band: apply(band, params), image, halo)
+
+    return apply_bands
@@ -0,0 +1,532 @@
+"""
+The property pipeline turns the reference of an image and its properties
+into the rendered image. It is modelled as an ordered chain of stages and
+every stage caches its last output, keyed on its own parameters and on the
+key of the stage before it. Changing a single property therefore only
+re-runs the stages from that property onwards.
+
+The order of the stages is chosen by a planner. Cropping always happens
+first and when the image is being shrunk the tone adjustments run after
+the downscale, so they only pay for the pixels that are actually shown.
+Sharpening is always done at the output resolution.
+
+A render can be a draft. The stages that resample then use cheaper
+filters, which is good enough while a slider is being dragged. An image
+also renders its drafts from a smaller proxy, so every stage, the tone
+included, only pays for a fraction of the pixels.
+
+The properties are always given at full resolution. A preview or a draft
+renders from a smaller proxy of the reference, with the properties scaled
+to it by `scale_properties`, and `get_output_size` tells how large the
+same render would have been at full resolution.
+
+The tone and the sharpness of large images are processed in bands on all
+the cores, see `core.graphics.parallel`.
+"""
+
+import math
+import typing
+import threading
+import dataclasses
+from dataclasses import dataclass
+
+from PIL import Image as PILImage       # type: ignore
+from PIL import ImageEnhance            # type: ignore
+from PIL import ImageStat               # type: ignore
+
+from core.graphics.parallel import banded
+from core.instrumentation import measure, Span
+
+if typing.TYPE_CHECKING:
+    from core.graphics.image import _Properties
+
+StageKey = typing.Hashable
+Parameters = tuple | None
+GetParameters = typing.Callable[["_Properties", "Source"], Parameters]
+Apply = typing.Callable[[PILImage.Image, tuple], PILImage.Image]
+Box = tuple[float, float, float, float]
+
+# Pixels kept around a crop so that bicubic resampling still sees its
+# whole support when the crop is taken before the resample
+_RESAMPLE_HALO = 3
+
+# Sharpening smooths every pixel with its direct neighbours
+_SHARPNESS_HALO = 1
+
+
+class Source():
+    """
+    The image a render starts from, together with the statistics of it
+    that stages need. The statistics are computed once per source
+    """
+    def __init__(self, image: PILImage.Image, key: StageKey) -> None:
+        self.image = image
+        self.key = key
+        self.size = image.size
+        self.__luminance_mean: float | None = None
+
+    def get_luminance_mean(self) -> float:
+        if self.__luminance_mean is None:
+            stat = ImageStat.Stat(self.image.convert("L"))
+            self.__luminance_mean = stat.mean[0]
+
+        return self.__luminance_mean
+
+
+@dataclass
+class Stage:
+    """
+    A single step of the pipeline. `get_parameters` returns None when the
+    stage has nothing to do for the given properties and source. Stages
+    with a `draft` apply it instead of `apply` in draft renders
+    """
+    name: str
+    get_parameters: GetParameters
+    apply: Apply
+    draft: Apply | None = None
+
+
+Planner = typing.Callable[["_Properties", Source], list[Stage]]
+
+
+class Pipeline():
+    def __init__(self, planner: Planner | None = None) -> None:
+        self.__planner = planner if planner is not None else plan_stages
+        self.__cache: dict[str, tuple[StageKey, PILImage.Image]] = {}
+        self.__source: Source | None = None
+        self.__lock = threading.Lock()
+
+    def render(self, source: PILImage.Image, source_key: StageKey,
+               props: "_Properties", draft: bool = False) -> PILImage.Image:
+        """
+        The returned image may be shared with the cache and with `source`,
+        so it must not be modified in place
+        """
+        with self.__lock, measure("image.render") as span:
+            return self.__render(source, source_key, props, draft, span)
+
+    def __render(self, source: PILImage.Image, source_key: StageKey,
+                 props: "_Properties", draft: bool,
+                 span: Span) -> PILImage.Image:
+        """
+        Only the stages that actually run add their output to the bytes
+        the render allocated
+        """
+        if self.__source is None or self.__source.key != source_key:
+            self.__source = Source(source, source_key)
+
+        image = source
+        key = source_key
+        active: set[str] = set()
+
+        for stage in self.__planner(props, self.__source):
+            params = stage.get_parameters(props, self.__source)
+
+            if params is None:
+                continue
+
+            apply = stage.apply
+            if draft and stage.draft is not None:
+                apply = stage.draft
+                params = (*params, "draft")
+
+            key = (key, stage.name, params)
+            active.add(stage.name)
+            cached = self.__cache.get(stage.name)
+
+            if cached is not None and cached[0] == key:
+                image = cached[1]
+                continue
+
+            with measure("image.stage." + stage.name) as stage_span:
+                image = apply(image, params)
+                stage_span.add_image(image)
+
+            span.add_bytes(stage_span.bytes)
+            self.__cache[stage.name] = (key, image)
+
+        for name in list(self.__cache):
+            if name not in active:
+                del self.__cache[name]
+
+        return image
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__cache.clear()
+            self.__source = None
+
+    def evict(self) -> bool:
+        """
+        Clears the cache unless a render is using it right now, in which
+        case nothing is evicted and False is returned
+        """
+        if not self.__lock.acquire(blocking=False):
+            return False
+
+        try:
+            self.__cache.clear()
+            self.__source = None
+        finally:
+            self.__lock.release()
+
+        return True
+
+    def get_buffers(self) -> list[PILImage.Image]:
+        return [image for (_, image) in list(self.__cache.values())]
+
+
+def get_rotated_size(size: tuple[int, int], angle: float) -> tuple[int, int]:
+    """
+    The size of an image of the given size once it is rotated with its
+    canvas expanded, computed the same way Pillow computes it
+    """
+    width, height = size
+    angle = angle % 360.0
+
+    if angle in (0, 180):
+        return size
+    if angle in (90, 270):
+        return (height, width)
+
+    radians = -math.radians(angle)
+    cos, sin = round(math.cos(radians), 15), round(math.sin(radians), 15)
+    center_x, center_y = width / 2.0, height / 2.0
+
+    offset_x = cos * -center_x + sin * -center_y + center_x
+    offset_y = -sin * -center_x + cos * -center_y + center_y
+
+    xs, ys = [], []
+    for (x, y) in ((0, 0), (width, 0), (width, height), (0, height)):
+        xs.append(cos * x + sin * y + offset_x)
+        ys.append(-sin * x + cos * y + offset_y)
+
+    return (math.ceil(max(xs)) - math.floor(min(xs)),
+            math.ceil(max(ys)) - math.floor(min(ys)))
+
+
+def get_output_size(props: "_Properties") -> tuple[int, int]:
+    """
+    The size the properties render to at full resolution
+    """
+    width, height = props.resize
+    crop_x, crop_y, crop_xx, crop_yy = props.crop
+    size = (width - crop_x - crop_xx, height - crop_y - crop_yy)
+    return get_rotated_size(size, props.rotation)
+
+
+def scale_properties(props: "_Properties",
+                     scale: tuple[float, float]) -> "_Properties":
+    """
+    The properties of a render from a proxy of the reference that is
+    scaled by the given factors. The resize and the crop are scaled, so
+    the render is as much smaller as the proxy is
+    """
+    scale_x, scale_y = scale
+    width, height = props.resize
+    crop_x, crop_y, crop_xx, crop_yy = props.crop
+
+    width = max(1, round(width * scale_x))
+    height = max(1, round(height * scale_y))
+
+    crop_x = min(round(crop_x * scale_x), width - 1)
+    crop_y = min(round(crop_y * scale_y), height - 1)
+    crop_xx = min(round(crop_xx * scale_x), width - crop_x - 1)
+    crop_yy = min(round(crop_yy * scale_y), height - crop_y - 1)
+
+    return dataclasses.replace(props, resize=(width, height),
+                               crop=(crop_x, crop_y, crop_xx, crop_yy))
+
+
+#    Stages    #
+def _clip(value: float) -> int:
+    return min(255, max(0, round(value)))
+
+
+def _tone_parameters(props: "_Properties", source: Source) -> Parameters:
+    brightness = props.brightness
+    contrast = props.contrast
+    saturation = props.saturation
+
+    if (brightness, contrast, saturation) == (1.0, 1.0, 1.0):
+        return None
+
+    mean = source.get_luminance_mean() if contrast != 1.0 else 0.0
+    return (brightness, contrast, saturation, mean)
+
+
+def _tone(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    """
+    Brightness, contrast and saturation are all affine colour transforms,
+    so they are fused into a single pass over the pixels. Contrast pivots
+    around the mean luminance of the source after brightness is applied
+    """
+    brightness, contrast, saturation, mean = params
+
+    gain = brightness * contrast
+    offset = (1 - contrast) * brightness * mean
+
+    if saturation == 1.0 or image.mode not in ("RGB", "RGBA"):
+        curve = [_clip(gain * value + offset) for value in range(256)]
+        identity = list(range(256))
+
+        lut: list[int] = []
+        for band in image.getbands():
+            lut += identity if band == "A" else curve
+
+        image = image.point(lut)
+
+        if saturation != 1.0:
+            image = ImageEnhance.Color(image).enhance(saturation)
+
+        return image
+
+    # Rec. 601 luma, the same weights Pillow uses when converting to "L"
+    weights = (0.299, 0.587, 0.114)
+
+    matrix: list[float] = []
+    for channel in range(3):
+        for band, weight in enumerate(weights):
+            identity = 1.0 if band == channel else 0.0
+            mix = saturation * identity + (1 - saturation) * weight
+            matrix.append(gain * mix)
+
+        matrix.append(offset)
+
+    toned = image.convert("RGB").convert("RGB", tuple(matrix))
+
+    if image.mode == "RGBA":
+        toned.putalpha(image.getchannel("A"))
+
+    return toned
+
+
+def _coefficient(name: str) -> GetParameters:
+    def get_parameters(props: "_Properties", _) -> Parameters:
+        coefficient = getattr(props, name)
+        return (coefficient,) if coefficient != 1.0 else None
+
+    return get_parameters
+
+
+def _flag(name: str) -> GetParameters:
+    def get_parameters(props: "_Properties", _) -> Parameters:
+        return () if getattr(props, name) else None
+
+    return get_parameters
+
+
+def _enhance(enhancer: type) -> Apply:
+    def apply(image: PILImage.Image, params: tuple) -> PILImage.Image:
+        coefficient, = params
+        return enhancer(image).enhance(coefficient)
+
+    return apply
+
+
+def _transpose(method: PILImage.Transpose) -> Apply:
+    def apply(image: PILImage.Image, _) -> PILImage.Image:
+        return image.transpose(method)
+
+    return apply
+
+
+def _resize_parameters(props: "_Properties", source: Source) -> Parameters:
+    return (props.resize,) if props.resize != source.size else None
+
+
+def _resize(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    size, = params
+    resample = PILImage.Resampling.BICUBIC
+    return image.resize(size, resample, reducing_gap=True)
+
+
+def _crop_parameters(props: "_Properties", _) -> Parameters:
+    if props.crop == (0, 0, 0, 0):
+        return None
+
+    x, y, xx, yy = 0, 0, *props.resize
+    crop_x, crop_y, crop_xx, crop_yy = props.crop
+    return ((x + crop_x, y + crop_y, xx - crop_xx, yy - crop_yy),)
+
+
+def _crop(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    box, = params
+    return image.crop(box)
+
+
+def _get_geometry(props: "_Properties",
+                  source: Source) -> tuple[tuple[int, int], Box] | None:
+    """
+    Returns the output size together with the box of the source that ends
+    up in it after flipping, resizing and cropping
+    """
+    if props.resize == source.size and props.crop == (0, 0, 0, 0):
+        return None
+
+    width, height = source.size
+    resize_width, resize_height = props.resize
+    crop_x, crop_y, crop_xx, crop_yy = props.crop
+
+    size = (resize_width - crop_x - crop_xx, resize_height - crop_y - crop_yy)
+
+    scale_x = width / resize_width
+    scale_y = height / resize_height
+
+    left, right = crop_x * scale_x, (resize_width - crop_xx) * scale_x
+    top, bottom = crop_y * scale_y, (resize_height - crop_yy) * scale_y
+
+    # The crop is given on the flipped image while the flips are applied
+    # after the resample, so the box is mirrored back onto the source
+    if props.flip_horizontal:
+        left, right = width - right, width - left
+    if props.flip_vertical:
+        top, bottom = height - bottom, height - top
+
+    # Mirroring can leave the box a rounding error outside of the source,
+    # which Pillow refuses to resample
+    left, right = max(0.0, left), min(float(width), right)
+    top, bottom = max(0.0, top), min(float(height), bottom)
+
+    return (size, (left, top, right, bottom))
+
+
+def _is_reducing(props: "_Properties", source: Source) -> bool:
+    geometry = _get_geometry(props, source)
+
+    if geometry is None:
+        return True
+
+    (width, height), (left, top, right, bottom) = geometry
+    return width * height <= (right - left) * (bottom - top)
+
+
+def _get_precrop(props: "_Properties", source: Source) -> Box | None:
+    geometry = _get_geometry(props, source)
+
+    if geometry is None:
+        return None
+
+    _, (left, top, right, bottom) = geometry
+    width, height = source.size
+
+    precrop = (max(0, math.floor(left) - _RESAMPLE_HALO),
+               max(0, math.floor(top) - _RESAMPLE_HALO),
+               min(width, math.ceil(right) + _RESAMPLE_HALO),
+               min(height, math.ceil(bottom) + _RESAMPLE_HALO))
+
+    if precrop == (0, 0, width, height):
+        return None
+
+    return precrop
+
+
+def _precrop_parameters(props: "_Properties", source: Source) -> Parameters:
+    precrop = _get_precrop(props, source)
+    return (precrop,) if precrop is not None else None
+
+
+def _resample_parameters(props: "_Properties", source: Source) -> Parameters:
+    return _get_geometry(props, source)
+
+
+def _precropped_resample_parameters(props: "_Properties",
+                                    source: Source) -> Parameters:
+    geometry = _get_geometry(props, source)
+    precrop = _get_precrop(props, source)
+
+    if geometry is None or precrop is None:
+        return geometry
+
+    size, (left, top, right, bottom) = geometry
+    x, y, _, _ = precrop
+    return (size, (left - x, top - y, right - x, bottom - y))
+
+
+def _resample(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    size, box = params[:2]
+    left, top, right, bottom = box
+
+    if size == (right - left, bottom - top):
+        return image.crop(tuple(round(value) for value in box))
+
+    resample = PILImage.Resampling.BICUBIC
+    return image.resize(size, resample, box, reducing_gap=True)
+
+
+def _draft_resample(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    size, box = params[:2]
+    left, top, right, bottom = box
+
+    if size == (right - left, bottom - top):
+        return image.crop(tuple(round(value) for value in box))
+
+    resample = PILImage.Resampling.BILINEAR
+    return image.resize(size, resample, box, reducing_gap=2.0)
+
+
+def _rotation_parameters(props: "_Properties", _) -> Parameters:
+    return (props.rotation,) if props.rotation != 0 else None
+
+
+def _rotate(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    angle = params[0]
+    resample = PILImage.Resampling.BICUBIC
+    return image.rotate(angle, resample, expand=True)
+
+
+def _draft_rotate(image: PILImage.Image, params: tuple) -> PILImage.Image:
+    angle = params[0]
+    resample = PILImage.Resampling.NEAREST
+    return image.rotate(angle, resample, expand=True)
+
+
+_TONE = Stage("tone", _tone_parameters, banded(_tone))
+_SHARPNESS = Stage("sharpness", _coefficient("sharpness"),
+                   banded(_enhance(ImageEnhance.Sharpness), _SHARPNESS_HALO))
+_FLIP_HORIZONTAL = Stage("flip_horizontal", _flag("flip_horizontal"),
+                         _transpose(PILImage.Transpose.FLIP_LEFT_RIGHT))
+_FLIP_VERTICAL = Stage("flip_vertical", _flag("flip_vertical"),
+                       _transpose(PILImage.Transpose.FLIP_TOP_BOTTOM))
+_ROTATION = Stage("rotation", _rotation_parameters, _rotate, _draft_rotate)
+
+# The straightforward order of the operations, which the planned orders
+# are checked against
+CANONICAL_STAGES = [
+    _TONE,
+    _FLIP_HORIZONTAL,
+    _FLIP_VERTICAL,
+    Stage("resize", _resize_parameters, _resize),
+    Stage("crop", _crop_parameters, _crop),
+    _SHARPNESS,
+    _ROTATION,
+]
+
+# Shrinking: crop and downscale first, then adjust only what is left
+REDUCING_STAGES = [
+    Stage("resample", _resample_parameters, _resample, _draft_resample),
+    _FLIP_HORIZONTAL,
+    _FLIP_VERTICAL,
+    _TONE,
+    _SHARPNESS,
+    _ROTATION,
+]
+
+# Enlarging: crop first, adjust the tone on the smaller image, then upscale
+ENLARGING_STAGES = [
+    Stage("precrop", _precrop_parameters, _crop),
+    _TONE,
+    Stage("resample", _precropped_resample_parameters, _resample,
+          _draft_resample),
+    _FLIP_HORIZONTAL,
+    _FLIP_VERTICAL,
+    _SHARPNESS,
+    _ROTATION,
+]
+
+
+def plan_stages(props: "_Properties", source: Source) -> list[Stage]:
+    if _is_reducing(props, source):
+        return REDUCING_STAGES
+
+    return ENLARGING_STAGES
@@ -0,0 +1,125 @@
+"""
+A surface of an arbitrary size split into fixed size tiles. A tile is only
+allocated when it is first read, by asking the fill function for its
+pixels, so a large surface only costs the memory of the tiles in use
+"""
+
+import typing
+
+from PIL import Image as PILImage  # type: ignore
+
+TILE_SIZE = 256
+
+Box = tuple[int, int, int, int]
+TileIndex = tuple[int, int]
+Fill = typing.Callable[[Box], PILImage.Image]
+
+
+def intersect_boxes(first: Box, second: Box) -> Box | None:
+    box = (max(first[0], second[0]), max(first[1], second[1]),
+           min(first[2], second[2]), min(first[3], second[3]))
+
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+
+    return box
+
+
+def _translate(box: Box, origin: Box) -> Box:
+    """
+    Moves the box into the coordinates of the box it lies in
+    """
+    x, y = origin[:2]
+    return (box[0] - x, box[1] - y, box[2] - x, box[3] - y)
+
+
+class TiledSurface():
+    def __init__(self, size: tuple[int, int], mode: str, fill: Fill,
+                 tile_size: int = TILE_SIZE) -> None:
+        self.__size = size
+        self.__mode = mode
+        self.__fill = fill
+        self.__tile_size = tile_size
+        self.__tiles: dict[TileIndex, PILImage.Image] = {}
+
+    def get_size(self) -> tuple[int, int]:
+        return self.__size
+
+    def get_mode(self) -> str:
+        return self.__mode
+
+    def get_allocated_count(self) -> int:
+        return len(self.__tiles)
+
+    def is_allocated(self, index: TileIndex) -> bool:
+        return index in self.__tiles
+
+    def get_tiles(self, box: Box) -> list[tuple[TileIndex, Box, Box]]:
+        """
+        The indices and the boxes of the tiles that overlap the box,
+        together with the part of the box each of them covers
+        """
+        clipped = intersect_boxes(box, (0, 0, *self.__size))
+        if clipped is None:
+            return []
+
+        size = self.__tile_size
+        width, height = self.__size
+        left, top, right, bottom = clipped
+        tiles = []
+
+        for row in range(top // size, (bottom - 1) // size + 1):
+            for column in range(left // size, (right - 1) // size + 1):
+                x, y = column * size, row * size
+                tile_box = (x, y, min(x + size, width), min(y + size, height))
+                area = (max(x, left), max(y, top),
+                        min(tile_box[2], right), min(tile_box[3], bottom))
+                tiles.append(((column, row), tile_box, area))
+
+        return tiles
+
+    def crop(self, box: Box) -> PILImage.Image:
+        """
+        Returns a copy of the pixels in the box, which has to lie within
+        the surface. Tiles that are not allocated yet are filled first
+        """
+        tiles = self.get_tiles(box)
+
+        if len(tiles) == 1:
+            index, tile_box, area = tiles[0]
+            tile = self.__get_tile(index, tile_box)
+            return tile.crop(_translate(area, tile_box))
+
+        width, height = box[2] - box[0], box[3] - box[1]
+        image = PILImage.new(self.__mode, (width, height))
+
+        for index, tile_box, area in tiles:
+            tile = self.__get_tile(index, tile_box)
+            part = tile.crop(_translate(area, tile_box))
+            image.paste(part, _translate(area, box)[:2])
+
+        return image
+
+    def update(self, box: Box, image: PILImage.Image) -> None:
+        """
+        Writes the image into the box. Only the allocated tiles are written,
+        the others will get the new pixels from the fill function
+        """
+        for index, tile_box, area in self.get_tiles(box):
+            if index not in self.__tiles:
+                continue
+
+            part = image.crop(_translate(area, box))
+            self.__tiles[index].paste(part, _translate(area, tile_box)[:2])
+
+    def discard(self, index: TileIndex) -> None:
+        self.__tiles.pop(index, None)
+
+    def clear(self) -> None:
+        self.__tiles.clear()
+
+    def __get_tile(self, index: TileIndex, box: Box) -> PILImage.Image:
+        if index not in self.__tiles:
+            self.__tiles[index] = self.__fill(box)
+
+        return self.__tiles[index]
@@ -0,0 +1,216 @@
+"""
+The part of the canvas that is shown in the viewer. The viewport can be
+zoomed and panned, and only the pixels of the canvas that are visible in
+it are ever asked for.
+
+A zoomed out view is drawn from the mipmap level nearest to the zoom, so
+the boxes the viewport works with are in the coordinates of that level
+"""
+
+import math
+import typing
+
+from PIL import Image as PILImage  # type: ignore
+
+from core.graphics.mipmap import get_level, get_level_size, get_scale
+from core.graphics.tiled_surface import intersect_boxes
+
+Box = tuple[int, int, int, int]
+Region = typing.Callable[[Box, int], PILImage.Image]
+
+MIN_ZOOM = 1 / 64
+MAX_ZOOM = 32.0
+ZOOM_STEP = 1.25
+
+BACKDROP_COLOR = "#3c3c3c"
+
+
+class Viewport():
+    def __init__(self, view_size: tuple[int, int],
+                 canvas_size: tuple[int, int]) -> None:
+        self.__view_size = view_size
+        self.__canvas_size = canvas_size
+        self.__zoom = 1.0
+        self.__origin = (0.0, 0.0)
+
+        self.__image = PILImage.new("RGB", view_size, BACKDROP_COLOR)
+        self.__rendered_state: tuple | None = None
+
+        self.fit()
+
+    def get_view_size(self) -> tuple[int, int]:
+        return self.__view_size
+
+    def get_canvas_size(self) -> tuple[int, int]:
+        return self.__canvas_size
+
+    def set_canvas_size(self, canvas_size: tuple[int, int]) -> None:
+        self.__canvas_size = canvas_size
+        self.__rendered_state = None
+        self.fit()
+
+    def get_zoom(self) -> float:
+        return self.__zoom
+
+    def get_level(self) -> int:
+        return get_level(self.__zoom)
+
+    def get_state(self) -> tuple[float, float, float]:
+        """
+        Changes whenever the view shows a different part of the canvas
+        """
+        return (self.__zoom, *self.__origin)
+
+    def get_image(self) -> PILImage.Image:
+        return self.__image
+
+    def set_zoom(self, zoom: float,
+                 anchor: tuple[int, int] | None = None) -> None:
+        """
+        Zooms the view, keeping the canvas point under the anchor, a point
+        of the view, in place. The center of the view is used by default
+        """
+        if anchor is None:
+            anchor = (self.__view_size[0] // 2, self.__view_size[1] // 2)
+
+        x, y = self.to_canvas_point(anchor)
+        self.__zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+        self.__origin = (x - anchor[0] / self.__zoom,
+                         y - anchor[1] / self.__zoom)
+        self.__clamp()
+
+    def zoom_in(self, anchor: tuple[int, int] | None = None) -> None:
+        self.set_zoom(self.__zoom * ZOOM_STEP, anchor)
+
+    def zoom_out(self, anchor: tuple[int, int] | None = None) -> None:
+        self.set_zoom(self.__zoom / ZOOM_STEP, anchor)
+
+    def fit(self) -> None:
+        """
+        Zooms so the whole canvas is shown, but never above actual size
+        """
+        view_width, view_height = self.__view_size
+        width, height = self.__canvas_size
+
+        self.__zoom = max(min(view_width / width, view_height / height,
+                              1.0), MIN_ZOOM)
+        self.__origin = ((width - view_width / self.__zoom) / 2,
+                         (height - view_height / self.__zoom) / 2)
+
+    def pan(self, delta: tuple[int, int]) -> None:
+        """
+        Moves the canvas by a number of pixels of the view
+        """
+        x, y = self.__origin
+        self.__origin = (x - delta[0] / self.__zoom,
+                         y - delta[1] / self.__zoom)
+        self.__clamp()
+
+    def to_canvas_point(self, point: tuple[int, int]) -> tuple[float, float]:
+        x, y = self.__origin
+        return (x + point[0] / self.__zoom, y + point[1] / self.__zoom)
+
+    def get_visible_box(self) -> Box:
+        """
+        The pixels of the level that are at least partly visible
+        """
+        left, top = self.__to_level_point((0, 0))
+        right, bottom = self.__to_level_point(self.__view_size)
+        box = (math.floor(left), math.floor(top),
+               math.ceil(right), math.ceil(bottom))
+
+        visible = intersect_boxes(box, self.__get_level_bounds())
+        return visible if visible is not None else (0, 0, 0, 0)
+
+    def to_view_box(self, box: Box) -> Box:
+        """
+        The pixels of the view that show any part of a box of the level
+        """
+        scale = get_scale(self.get_level())
+        x, y = self.__origin[0] * scale, self.__origin[1] * scale
+        zoom = self.__zoom / scale
+
+        return (math.floor((box[0] - x) * zoom),
+                math.floor((box[1] - y) * zoom),
+                math.ceil((box[2] - x) * zoom),
+                math.ceil((box[3] - y) * zoom))
+
+    def render(self, region: Region,
+               boxes: list[Box] | None = None) -> list[Box]:
+        """
+        Draws the damaged boxes of the canvas into the view and returns the
+        boxes of the view that changed. The whole view is drawn when it
+        shows a different part of the canvas than the last time
+        """
+        view_bounds = (0, 0, *self.__view_size)
+
+        if boxes is None or self.__rendered_state != self.get_state():
+            view_boxes = [view_bounds]
+        else:
+            clipped = [intersect_boxes(self.to_view_box(box), view_bounds)
+                       for box in boxes]
+            view_boxes = [box for box in clipped if box is not None]
+
+        for view_box in view_boxes:
+            self.__draw(region, view_box)
+
+        self.__rendered_state = self.get_state()
+        return view_boxes
+
+    def __draw(self, region: Region, view_box: Box) -> None:
+        self.__image.paste(BACKDROP_COLOR, view_box)
+
+        level = self.get_level()
+        level_bounds = self.__get_level_bounds()
+        box = intersect_boxes(view_box, self.to_view_box(level_bounds))
+
+        if box is None:
+            return
+
+        # The exact part of the level shown in the box, and the whole
+        # pixels around it with a margin for the resampling filter
+        width, height = level_bounds[2:]
+        left, top = self.__to_level_point(box[:2])
+        right, bottom = self.__to_level_point(box[2:])
+        left, top = max(left, 0.0), max(top, 0.0)
+        right, bottom = min(right, width), min(bottom, height)
+        margin = math.ceil(get_scale(level) / self.__zoom) + 1
+
+        source_box = (max(math.floor(left) - margin, 0),
+                      max(math.floor(top) - margin, 0),
+                      min(math.ceil(right) + margin, width),
+                      min(math.ceil(bottom) + margin, height))
+        source = region(source_box, level)
+
+        size = (box[2] - box[0], box[3] - box[1])
+        exact_box = (left - source_box[0], top - source_box[1],
+                     right - source_box[0], bottom - source_box[1])
+
+        if self.__zoom >= 1:
+            resample = PILImage.Resampling.NEAREST
+        else:
+            resample = PILImage.Resampling.BOX
+
+        self.__image.paste(source.resize(size, resample, exact_box), box[:2])
+
+    def __to_level_point(self,
+                         point: tuple[int, int]) -> tuple[float, float]:
+        scale = get_scale(self.get_level())
+        x, y = self.to_canvas_point(point)
+        return (x * scale, y * scale)
+
+    def __get_level_bounds(self) -> Box:
+        size = get_level_size(self.__canvas_size, self.get_level())
+        return (0, 0, *size)
+
+    def __clamp(self) -> None:
+        """
+        Keeps the center of the canvas within the view
+        """
+        view_width, view_height = self.__view_size
+        width, height = self.__canvas_size
+        x, y = self.__origin
+
+        x = min(max(x, width / 2 - view_width / self.__zoom), width / 2)
+        y = min(max(y, height / 2 - view_height / self.__zoom), height / 2)
+        self.__origin = (x, y)
@@ -0,0 +1,211 @@
+"""
+Opt-in timing of the rendering hot paths. It is off unless the
+IMAGE_EDITOR_STATS environment variable is set to something other than 0,
+or `enable()` is called, and while it is off a measurement costs a single
+check.
+
+Every measurement records its wall time and the bytes of the buffers it
+allocated under a name. The names are aggregated into a histogram of
+power of two buckets, so the percentiles are only as precise as a bucket
+"""
+
+import os
+import json
+import time
+import typing
+import threading
+import contextlib
+from dataclasses import dataclass, field
+
+from PIL import Image as PILImage  # type: ignore
+
+ENVIRONMENT_VARIABLE = "IMAGE_EDITOR_STATS"
+
+# The upper bound of the first bucket, every next bucket is twice as wide.
+# The last bucket takes everything slower than about 4 seconds
+BUCKET_START = 0.000125
+BUCKET_COUNT = 16
+
+
+def get_bucket_bounds() -> list[float]:
+    return [BUCKET_START * 2 ** index for index in range(BUCKET_COUNT - 1)]
+
+
+_BOUNDS = get_bucket_bounds()
+
+
+def _get_bucket(seconds: float) -> int:
+    for (index, bound) in enumerate(_BOUNDS):
+        if seconds <= bound:
+            return index
+
+    return BUCKET_COUNT - 1
+
+
+def get_byte_size(image: PILImage.Image | None) -> int:
+    if image is None:
+        return 0
+
+    return image.width * image.height * len(image.getbands())
+
+
+@dataclass
+class Stat:
+    name: str
+    count: int = 0
+    total: float = 0.0
+    fastest: float = float("inf")
+    slowest: float = 0.0
+    bytes: int = 0
+    buckets: list[int] = field(default_factory=lambda: [0] * BUCKET_COUNT)
+
+    def record(self, seconds: float, size: int) -> None:
+        self.count += 1
+        self.total += seconds
+        self.fastest = min(self.fastest, seconds)
+        self.slowest = max(self.slowest, seconds)
+        self.bytes += size
+        self.buckets[_get_bucket(seconds)] += 1
+
+    def get_mean(self) -> float:
+        return self.total / self.count if self.count != 0 else 0.0
+
+    def get_percentile(self, fraction: float) -> float:
+        """
+        The upper bound of the bucket the percentile falls in, never more
+        than the slowest measurement
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = fraction * self.count
+        seen = 0
+
+        for (index, count) in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count != 0:
+                if index == BUCKET_COUNT - 1:
+                    return self.slowest
+                return min(_BOUNDS[index], self.slowest)
+
+        return self.slowest
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.get_mean(),
+            "fastest": self.fastest if self.count != 0 else 0.0,
+            "slowest": self.slowest,
+            "p50": self.get_percentile(0.5),
+            "p95": self.get_percentile(0.95),
+            "bytes": self.bytes,
+            "buckets": list(self.buckets),
+        }
+
+
+class Span():
+    """
+    Handed out by `measure`. The bytes of the buffers made inside the
+    measured block are added to it
+    """
+    def __init__(self) -> None:
+        self.bytes = 0
+
+    def add_bytes(self, size: int) -> None:
+        self.bytes += size
+
+    def add_image(self, image: PILImage.Image | None) -> None:
+        self.bytes += get_byte_size(image)
+
+
+class Recorder():
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__stats: dict[str, Stat] = {}
+
+    def record(self, name: str, seconds: float, size: int = 0) -> None:
+        with self.__lock:
+            stat = self.__stats.get(name)
+            if stat is None:
+                stat = self.__stats[name] = Stat(name)
+            stat.record(seconds, size)
+
+    def get_stat(self, name: str) -> Stat | None:
+        with self.__lock:
+            return self.__stats.get(name)
+
+    def get_stats(self) -> list[Stat]:
+        with self.__lock:
+            return [self.__stats[name] for name in sorted(self.__stats)]
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__stats.clear()
+
+    def to_dict(self) -> dict:
+        return {
+            "bucket_bounds": _BOUNDS,
+            "stats": {stat.name: stat.to_dict() for stat in self.get_stats()},
+        }
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    def get_summary(self) -> str:
+        """
+        One line for every name, meant for the stats overlay
+        """
+        lines = [f"{'':<24}{'count':>7}{'mean':>9}{'p95':>9}{'max':>9}"
+                 f"{'MB':>9}"]
+
+        for stat in self.get_stats():
+            lines.append(f"{stat.name:<24}{stat.count:>7}"
+                         f"{stat.get_mean() * 1000:>9.1f}"
+                         f"{stat.get_percentile(0.95) * 1000:>9.1f}"
+                         f"{stat.slowest * 1000:>9.1f}"
+                         f"{stat.bytes / 2**20:>9.1f}")
+
+        return "\n".join(lines)
+
+
+def is_enabled_by_environment() -> bool:
+    return os.environ.get(ENVIRONMENT_VARIABLE, "0") not in ("", "0")
+
+
+_recorder = Recorder()
+_is_enabled = is_enabled_by_environment()
+
+
+def is_enabled() -> bool:
+    return _is_enabled
+
+
+def enable() -> None:
+    global _is_enabled
+    _is_enabled = True
+
+
+def disable() -> None:
+    global _is_enabled
+    _is_enabled = False
+
+
+def get_recorder() -> Recorder:
+    return _recorder
+
+
+@contextlib.contextmanager
+def measure(name: str) -> typing.Iterator[Span]:
+    span = Span()
+
+    if not _is_enabled:
+        yield span
+        return
+
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        _recorder.record(name, time.perf_counter() - start, span.bytes)
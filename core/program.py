@@ -4,21 +4,47 @@ classes used on the project together
 """
 
 import os
+import time
 import typing
 import PySimpleGUI as sg  # type: ignore
+from PIL import Image as PILImage  # type: ignore
+from concurrent.futures import Executor
 
 from core.graphics.image import Image
 from core.graphics.image import ImageNotRecognizedError
+from core.graphics.viewport import Viewport
+from core.graphics.compositor import Compositor
 from core.graphics.checkered_background import CheckeredBackground
+from core.graphics.checkered_background import create_checkered_region
 
 from core.user_interface import UserInterface
+from core.instrumentation import measure, enable, get_recorder
+from core.instrumentation import disable, is_enabled_by_environment
 
 from core.workflow.workspace import Workspace
+from core.workflow.render_worker import RenderWorker
 from core.workflow.undo_redo_stack import UndoRedoStack
+from core.workflow.render_scheduler import RenderScheduler
 
 
 Event = typing.Any
 
+VIEWER_SIZE = (500, 500)
+DEFAULT_CANVAS_SIZE = (500, 500)
+THUMBNAIL_SIZE = 100
+
+RENDER_EVENT = "-RENDERED-"
+
+# How long a slider has to rest before its draft is rendered at full quality
+DEFAULT_DRAFT_IDLE = 0.3
+
+# Above this many bytes held by the layers and the history, the caches
+# of the layers are evicted
+MEMORY_SOFT_LIMIT = 1024 * 1024 * 1024
+
+# How often the stats overlay is refreshed while it is shown
+STATS_INTERVAL = 1.0
+
 
 def _require_image(func: typing.Callable):
     def inner(*args, **kwargs):
@@ -29,66 +55,235 @@ def _require_image(func: typing.Callable):
 
 
 class Program():
-    def __init__(self, window_name: str) -> None:
-        self.ui = UserInterface(window_name)
-        self.ws = Workspace()
-        self.action_stack = UndoRedoStack()
+    def __init__(self, window_name: str,
+                 canvas_size: tuple[int, int] = DEFAULT_CANVAS_SIZE,
+                 draft_idle: float = DEFAULT_DRAFT_IDLE,
+                 executor: Executor | None = None) -> None:
+        self.ui = UserInterface(window_name, VIEWER_SIZE)
+        self.ws = Workspace(MEMORY_SOFT_LIMIT)
+        self.action_stack = UndoRedoStack(
+            get_live_images=self.__get_live_images)
+        self.scheduler = RenderScheduler()
+        self.worker = RenderWorker(self.__post_render, executor)
+
+        self.draft_idle = draft_idle
+        self.drafts: list[Image] = []
+        self.last_draft_time = 0.0
         self.curr_event = Event
 
         self.is_active = True
+        self.is_ui_enabled: bool | None = None
         self.set_undo = False
 
-        self.canvas = CheckeredBackground((500, 500))
-        self.thumbnail = CheckeredBackground((500, 500))
+        self.canvas_size = canvas_size
+        self.compositor = Compositor(canvas_size, create_checkered_region)
+        self.viewport = Viewport(VIEWER_SIZE, canvas_size)
+        self.pointer: tuple[int, int] | None = None
 
         self.save_location = None
 
+        self.show_stats = False
+        self.last_stats_time = 0.0
+
         self.curr_image: Image | None = None
         self.prev_image: Image | None = None
 
     def run(self) -> None:
         while self.is_active:
-            self.canvas.reset()
-            self.thumbnail.reset()
+            if self.scheduler.should_render_view(self.ws, self.viewport):
+                self.__render_view()
 
-            self.__render_view()
-            self.__render_thumbnail()
+            if self.scheduler.should_render_thumbnail(self.curr_image):
+                self.__render_thumbnail()
 
-            if self.curr_image is None:
-                self.ui.disable()
-            else:
-                self.ui.enable()
+            self.__update_ui_state()
+            self.__update_stats()
 
-            self.curr_event = self.ui.get_input(timeout=250)
+            self.curr_event = self.ui.get_input(timeout=self.__get_timeout())
 
             self.__handle_events()
+            self.__finish_drafts()
+            self.__submit_renders()
 
+        self.worker.stop()
         self.ui.destroy()
 
+    def __get_timeout(self) -> int:
+        """
+        Wakes the loop up in time to finish the drafts
+        """
+        if len(self.drafts) == 0:
+            return 250
+
+        idle = time.monotonic() - self.last_draft_time
+        return max(0, min(250, round((self.draft_idle - idle) * 1000)))
+
+    def __start_draft(self) -> None:
+        """
+        Slider changes are rendered as drafts while the slider moves
+        """
+        if self.curr_image is None:
+            return
+
+        self.curr_image.set_draft(True)
+        self.last_draft_time = time.monotonic()
+
+        if not any(image is self.curr_image for image in self.drafts):
+            self.drafts.append(self.curr_image)
+
+    def __finish_drafts(self) -> None:
+        idle = time.monotonic() - self.last_draft_time
+
+        if len(self.drafts) == 0 or idle < self.draft_idle:
+            return
+
+        for image in self.drafts:
+            image.set_draft(False)
+
+        self.drafts.clear()
+
+    def __get_live_images(self) -> list[Image]:
+        images = [image for (_, image) in self.ws.get_layers()]
+
+        if self.prev_image is not None:
+            images.append(self.prev_image)
+
+        return images
+
+    def __post_render(self, *result) -> None:
+        self.ui.post_event(RENDER_EVENT, result)
+
+    def __submit_renders(self) -> None:
+        """
+        The layers are rendered by the worker. Until a render is installed
+        the layer keeps showing its previous pixels
+        """
+        for (_, image) in self.ws.get_layers():
+            image.set_deferred(True)
+            job = image.take_render_job()
+
+            if job is not None:
+                self.worker.submit(image, job)
+
+    def __update_ui_state(self) -> None:
+        should_enable = self.curr_image is not None
+
+        if should_enable == self.is_ui_enabled:
+            return
+
+        if should_enable:
+            self.ui.enable()
+        else:
+            self.ui.disable()
+
+        self.is_ui_enabled = should_enable
+
+    def __update_stats(self) -> None:
+        if not self.show_stats:
+            return
+
+        now = time.monotonic()
+        if now - self.last_stats_time < STATS_INTERVAL:
+            return
+
+        self.last_stats_time = now
+        memory = self.ws.get_memory_report(self.action_stack)
+        self.ui.update_stats(get_recorder().get_summary() + "\n\n" +
+                             memory.get_summary())
+
+    def __toggle_stats(self) -> None:
+        self.show_stats = not self.show_stats
+        self.last_stats_time = 0.0
+
+        if self.show_stats:
+            enable()
+        else:
+            self.ui.update_stats(None)
+
+            # Stats asked for by the environment keep being recorded
+            if not is_enabled_by_environment():
+                disable()
+
+    def __dump_stats(self) -> None:
+        file_types = (("JSON", "*.json"),)
+        path = self.ui.save_popup("Choose location", file_types)
+
+        if path is None or path == "":
+            return
+
+        try:
+            get_recorder().dump(path)
+        except OSError as error:
+            self.ui.show_popup("Could not write the stats:", str(error),
+                               title="Error")
+
     def __render_view(self):
-        for (_, image) in reversed(self.ws.get_layers()):
-            offset = image.get_properties().offset
-            self.canvas.cropped_paste(image, offset)
+        with measure("view.render"):
+            layers = self.ws.get_layers()
+            active = next((name for (name, image) in layers
+                           if image is self.curr_image), None)
+
+            visible = self.viewport.get_visible_box()
+            level = self.viewport.get_level()
+
+            with measure("view.composite"):
+                damaged = self.compositor.render(layers, active, visible,
+                                                 level)
 
-        self.ui.update_image(self.canvas)
+            with measure("view.resample") as span:
+                regions = self.viewport.render(self.compositor.get_region,
+                                               damaged)
+                view = self.viewport.get_image()
+                for (left, top, right, bottom) in regions:
+                    span.add_bytes((right - left) * (bottom - top) *
+                                   len(view.getbands()))
+
+            self.ui.update_image_regions(view, regions)
 
     def __render_thumbnail(self):
+        with measure("view.thumbnail"):
+            self.__draw_thumbnail()
+
+    def __draw_thumbnail(self):
         if self.curr_image is None:
             self.ui.update_thumbnail(None)
             return
 
+        # The canvas is drawn scaled down, so that a large canvas is never
+        # allocated at its full size
+        width, height = self.canvas_size
+        scale = min(THUMBNAIL_SIZE / width, THUMBNAIL_SIZE / height)
+
+        def scaled(value: int) -> int:
+            return max(round(value * scale), 1)
+
+        tile_size = scaled(10)
+        thumbnail = CheckeredBackground((scaled(width), scaled(height)),
+                                        tile_size=tile_size)
+
         offset = self.curr_image.get_properties().offset
-        self.thumbnail.cropped_paste(self.curr_image, offset)
-        self.ui.update_thumbnail(self.thumbnail.get_thumbnail((100, 100)))
+        x, y, right, bottom = self.curr_image.get_paste_box(offset)
+        size = (scaled(right - x), scaled(bottom - y))
+
+        layer = self.curr_image.get_thumbnail(size)
+        thumbnail.paste(layer, (round(x * scale), round(y * scale)))
+        self.ui.update_thumbnail(thumbnail)
 
     def __handle_events(self):
-        event, _ = self.curr_event
+        event, values = self.curr_event
 
         if event in (sg.WINDOW_CLOSED, "Cancel"):
             self.is_active = False
             return
 
+        if event == RENDER_EVENT:
+            image, job, rendered = values[RENDER_EVENT]
+            image.install_render(job, rendered)
+            return
+
         if event == "__TIMEOUT__":
+            self.ws.trim_memory(self.action_stack)
+
             if self.set_undo:
                 self.set_undo = False
 
@@ -103,7 +298,9 @@ class Program():
                 self.prev_image = self.curr_image.copy()
             return
 
-        if event.startswith("-WS_"):
+        if event.startswith("-WS_IMAGE-"):
+            self.__handle_view()
+        elif event.startswith("-WS_"):
             self.__handle_workspace()
         elif event.startswith("-POS_"):
             self.__handle_postion()
@@ -122,6 +319,21 @@ class Program():
         else:
             self.__hande_menu()
 
+    def __handle_view(self) -> None:
+        event, _ = self.curr_event
+
+        if event == "-WS_IMAGE-GRAB":
+            self.pointer = self.ui.get_pointer()
+        elif event == "-WS_IMAGE-DRAG" and self.pointer is not None:
+            x, y = self.ui.get_pointer()
+            self.viewport.pan((x - self.pointer[0], y - self.pointer[1]))
+            self.pointer = (x, y)
+        elif event == "-WS_IMAGE-WHEEL":
+            if self.ui.get_wheel_direction() > 0:
+                self.viewport.zoom_in(self.ui.get_pointer())
+            else:
+                self.viewport.zoom_out(self.ui.get_pointer())
+
     def __handle_workspace(self):
         event, _ = self.curr_event
 
@@ -231,6 +443,7 @@ class Program():
             return
 
         if event == "-TR_ROTATION-":
+            self.__start_draft()
             self.curr_image.rotate(-values[event])
         elif event == "-TR_FLIP_VERTICAL-":
             self.curr_image.flip_vertical()
@@ -248,6 +461,9 @@ class Program():
         if self.curr_image is None:
             return
 
+        if event.startswith("-S_"):
+            self.__start_draft()
+
         if event == "-S_BRIGHTNESS-":
             self.curr_image.apply_brightness(values[event] / 100 + 1)
         elif event == "-S_SATURATION-":
@@ -288,17 +504,24 @@ class Program():
         if self.curr_image is None:
             return
 
-        if event == "-F_GRAYSCALE-":
-            self.curr_image.convert_to_grayscale()
-        elif event == "-F_NEGATIVE-":
-            self.curr_image.apply_negative()
-        elif event == "-F_R_MONOCHROME-":
-            self.curr_image.apply_red_monochrome()
-        elif event == "-F_G_MONOCHROME-":
-            self.curr_image.apply_green_monochrome()
-        elif event == "-F_B_MONOCHROME-":
-            self.curr_image.apply_blue_monochrome()
-        else:
+        # The filters are applied to the full resolution reference, which
+        # is decoded here if it was not yet
+        try:
+            if event == "-F_GRAYSCALE-":
+                self.curr_image.convert_to_grayscale()
+            elif event == "-F_NEGATIVE-":
+                self.curr_image.apply_negative()
+            elif event == "-F_R_MONOCHROME-":
+                self.curr_image.apply_red_monochrome()
+            elif event == "-F_G_MONOCHROME-":
+                self.curr_image.apply_green_monochrome()
+            elif event == "-F_B_MONOCHROME-":
+                self.curr_image.apply_blue_monochrome()
+            else:
+                return
+        except OSError as error:
+            error_message = "An error occured while reading the image:"
+            self.ui.show_popup(error_message, str(error), title="Error")
             return
 
         self.set_undo = True
@@ -310,11 +533,16 @@ class Program():
         if self.curr_image is None:
             return
 
-        if event == "-A_CENTER-":
-            self.curr_image.center(self.canvas.get_size())
-        elif event == "-A_SHRINK_TO_FIT-":
-            self.curr_image.shrink_to_fit(self.canvas.get_size())
-        else:
+        try:
+            if event == "-A_CENTER-":
+                self.curr_image.center(self.canvas_size)
+            elif event == "-A_SHRINK_TO_FIT-":
+                self.curr_image.shrink_to_fit(self.canvas_size)
+            else:
+                return
+        except OSError as error:
+            error_message = "An error occured while reading the image:"
+            self.ui.show_popup(error_message, str(error), title="Error")
             return
 
         self.set_undo = True
@@ -323,7 +551,7 @@ class Program():
         event, _ = self.curr_event
 
         if event == "Undo":
-            undo_action = self.action_stack.undo()
+            undo_action = self.action_stack.undo(self.ws.get_layer)
             if undo_action is not None:
                 curr_layer_name = self.ui.get_current_layer()
 
@@ -335,16 +563,19 @@ class Program():
 
                 layer_name, image = undo_action
                 self.ui.select_layer(layer_name)
-                self.ws.update_layer(layer_name, image.copy())
+                self.ws.update_layer(layer_name, image)
                 self.curr_image = self.ws.get_layer(layer_name)
 
                 if self.curr_image is not None:
-                    self.prev_image = self.curr_image.copy()
+                    snapshot = self.curr_image.get_snapshot()
+                    self.prev_image = Image.from_snapshot(snapshot,
+                                                          self.curr_image)
 
                 self.__update_slider_values()
 
         if event == "Redo":
-            redo_action = self.action_stack.redo()  # type: ignore
+            redo_action = self.action_stack.redo(  # type: ignore
+                self.ws.get_layer)
             if redo_action is not None:
                 curr_layer_name = self.ui.get_current_layer()
 
@@ -356,11 +587,13 @@ class Program():
 
                 layer_name, image = redo_action
                 self.ui.select_layer(layer_name)
-                self.ws.update_layer(layer_name, image.copy())
+                self.ws.update_layer(layer_name, image)
                 self.curr_image = self.ws.get_layer(layer_name)
 
                 if self.curr_image is not None:
-                    self.prev_image = self.curr_image.copy()
+                    snapshot = self.curr_image.get_snapshot()
+                    self.prev_image = Image.from_snapshot(snapshot,
+                                                          self.curr_image)
 
                 self.__update_slider_values()
 
@@ -372,6 +605,20 @@ class Program():
             self.__save_image_as()
         elif event == "About":
             UserInterface.show_about_info()
+        elif event == "Zoom In":
+            self.viewport.zoom_in()
+        elif event == "Zoom Out":
+            self.viewport.zoom_out()
+        elif event == "Fit to Window":
+            self.viewport.fit()
+        elif event == "Actual Size":
+            self.viewport.set_zoom(1.0)
+        elif event == "Canvas Size...":
+            self.__resize_canvas()
+        elif event == "Show Stats":
+            self.__toggle_stats()
+        elif event == "Dump Stats...":
+            self.__dump_stats()
 
         if self.curr_image is None:
             return
@@ -414,7 +661,8 @@ class Program():
         image: Image | None = None
 
         try:
-            image = Image(image_path)
+            image = Image(image_path,
+                          preview_size=self.viewport.get_view_size())
         except FileNotFoundError:
             error_message = "The following image does not exist:"
             self.ui.show_popup(error_message, image_path, title="Error")
@@ -423,10 +671,38 @@ class Program():
             error_message = "This image's format is not supported:"
             self.ui.show_popup(error_message, image_path, title="Error")
             return
+        except OSError as error:
+            error_message = "An error occured while reading the image:"
+            self.ui.show_popup(error_message, str(error), title="Error")
+            return
 
         self.ws.add_layer(image)
         self.ui.update_layers(self.ws)
 
+    def __resize_canvas(self) -> None:
+        size = self.ui.input_popup("Canvas size (width x height)")
+
+        if size is None:
+            return
+
+        try:
+            width, height = (int(value) for value in size.lower().split("x"))
+        except ValueError:
+            error_message = "The size has to be written as width x height:"
+            self.ui.show_popup(error_message, size, title="Error")
+            return
+
+        if width <= 0 or height <= 0:
+            error_message = "The canvas has to be at least 1x1 pixels:"
+            self.ui.show_popup(error_message, size, title="Error")
+            return
+
+        self.canvas_size = (width, height)
+        self.compositor = Compositor(self.canvas_size,
+                                     create_checkered_region)
+        self.viewport.set_canvas_size(self.canvas_size)
+        self.scheduler.invalidate()
+
     def __save_image(self) -> None:
         if self.save_location is None:
             self.__save_image_as()
@@ -446,12 +722,22 @@ class Program():
             self.ui.show_popup(error_message, image_path, title="Error")
             return
 
-        to_save = Image(image=self.canvas.get_base_image())
-        to_save.clear()
+        to_save = Image(image=PILImage.new("RGBA", self.canvas_size))
 
-        for (_, image) in reversed(self.ws.get_layers()):
-            offset = image.get_properties().offset
-            to_save.cropped_paste(image, offset)
+        # The layers are rendered at full resolution concurrently, and the
+        # save waits for all of them before compositing
+        try:
+            layers = [(image.get_properties().offset,
+                       image.get_full_resolution(is_rendered=False))
+                      for (_, image) in reversed(self.ws.get_layers())]
+            self.worker.render_all([image for (_, image) in layers])
+
+            for (offset, image) in layers:
+                to_save.cropped_paste(image, offset)
+        except OSError as error:
+            error_message = "An error occured while reading the image:"
+            self.ui.show_popup(error_message, str(error), title="Error")
+            return
 
         try:
             to_save.save(image_path)
@@ -4,16 +4,19 @@ This module builds the User Interface of the program
 
 import typing
 import PySimpleGUI as sg  # type: ignore
+from PIL import Image as PILImage, ImageTk  # type: ignore
 
 from core.graphics.image import Image
 from core.workflow.workspace import Workspace
+from core.instrumentation import measure, get_byte_size
 
 
 class UserInterface():
-    def __init__(self, title: str) -> None:
+    def __init__(self, title: str,
+                 viewer_size: tuple[int, int] = (500, 500)) -> None:
         menu_layout = UserInterface.__create_menu()
         tabs_layout = UserInterface.__create_tabs()
-        workspace_layout = UserInterface.__create_workspace((500, 500))
+        workspace_layout = UserInterface.__create_workspace(viewer_size)
 
         layout = [menu_layout, tabs_layout, workspace_layout]
         self.__window = sg.Window(title, layout=layout, finalize=True)
@@ -21,9 +24,18 @@ class UserInterface():
         self.__window.bind("<Control-Z>", "Undo")
         self.__window.bind("<Control-Y>", "Redo")
 
+        viewer = self.__window["-WS_IMAGE-"]
+        viewer.bind("<ButtonPress-1>", "GRAB")
+        viewer.bind("<B1-Motion>", "DRAG")
+        viewer.bind("<MouseWheel>", "WHEEL")
+        viewer.bind("<Button-4>", "WHEEL")
+        viewer.bind("<Button-5>", "WHEEL")
+
         self.__event = ""
         self.__values: list[str] = []
 
+        self.__view_photo: ImageTk.PhotoImage | None = None
+
     def get_input(self, timeout: int) -> tuple[str, typing.Any]:
         event, values = self.__window.read(timeout)
 
@@ -46,9 +58,11 @@ class UserInterface():
         file_types = ("Image Files", image_formats)
         return sg.popup_get_file(message, file_types=(file_types,))
 
-    def save_popup(self, message: str) -> str:
-        file_types = (("PNG", "*.png"), ("GIF", "*.gif"),
-                      ("JPEG", "*.jpg *.jpeg"),)
+    def save_popup(self, message: str,
+                   file_types: tuple | None = None) -> str:
+        if file_types is None:
+            file_types = (("PNG", "*.png"), ("GIF", "*.gif"),
+                          ("JPEG", "*.jpg *.jpeg"),)
         return sg.popup_get_file(message, file_types=file_types, save_as=True)
 
     def show_popup(self, *args, title: str) -> None:
@@ -57,21 +71,78 @@ class UserInterface():
     def input_popup(self, message: str) -> str:
         return sg.popup_get_text(message)
 
+    def post_event(self, key: str, value: typing.Any) -> None:
+        """
+        Queues an event for the event loop. Safe to call from any thread
+        """
+        self.__window.write_event_value(key, value)
+
     def update_value(self, key: str, *args, **kwargs) -> None:
         self.__window[key].update(*args, **kwargs)
 
     def update_thumbnail(self, image: Image | None) -> None:
-        thumbnail_data = None
-
-        if image is not None:
-            thumbnail = image.get_thumbnail((100, 100))
-            thumbnail_data = thumbnail.get_tkinter_data()
-
-        self.__window["-WS_THUMBNAIL-"].update(data=thumbnail_data)
-
-    def update_image(self, image: Image | None) -> None:
-        image_data = image.get_tkinter_data() if image is not None else None
-        self.__window["-WS_IMAGE-"].update(data=image_data)
+        with measure("ui.update_thumbnail") as span:
+            thumbnail_data = None
+
+            if image is not None:
+                thumbnail = image.get_thumbnail((100, 100))
+                thumbnail_data = thumbnail.get_tkinter_data()
+                span.add_image(thumbnail.get_base_image())
+
+            self.__window["-WS_THUMBNAIL-"].update(data=thumbnail_data)
+
+    def update_stats(self, summary: str | None) -> None:
+        """
+        Shows the summary in the stats overlay, or hides it when None
+        """
+        overlay = self.__window["-WS_STATS-"]
+
+        if summary is None:
+            overlay.update(visible=False)
+        else:
+            overlay.update(value=summary, visible=True)
+
+    def update_image_regions(self, image: PILImage.Image,
+                             boxes: list[tuple[int, int, int, int]]) -> None:
+        """
+        Updates only the given regions of the viewer. The photo shown in the
+        viewer is kept and the regions are copied into it in place
+        """
+        with measure("ui.update_image") as span:
+            photo = self.__view_photo
+
+            if photo is None or (photo.width(), photo.height()) != image.size: # noqa
+                self.__view_photo = ImageTk.PhotoImage(image)
+                self.__window["-WS_IMAGE-"].update(data=self.__view_photo)
+                span.add_image(image)
+                return
+
+            for box in boxes:
+                region = image.crop(box)
+                span.add_bytes(2 * get_byte_size(region))
+
+                photo_region = ImageTk.PhotoImage(region)
+                photo.tk.call(str(photo), "copy", str(photo_region),
+                              "-to", box[0], box[1],
+                              "-compositingrule", "set")
+
+    def get_pointer(self) -> tuple[int, int]:
+        """
+        Where the last mouse event happened in the viewer
+        """
+        event = self.__window["-WS_IMAGE-"].user_bind_event
+        return (event.x, event.y)
+
+    def get_wheel_direction(self) -> int:
+        """
+        1 when the mouse wheel was scrolled up, -1 when it was scrolled down
+        """
+        event = self.__window["-WS_IMAGE-"].user_bind_event
+
+        if event.num == 4 or event.delta > 0:
+            return 1
+
+        return -1
 
     def update_layers(self, layers: Workspace) -> None:
         layers_names = layers.get_layers_names()
@@ -135,6 +206,19 @@ class UserInterface():
                     "Clear Effects"
                 ]
             ],
+            [
+                "View",
+                [
+                    "Zoom In",
+                    "Zoom Out",
+                    "Fit to Window",
+                    "Actual Size",
+                    "Canvas Size...",
+                    "---",
+                    "Show Stats",
+                    "Dump Stats..."
+                ]
+            ],
             [
                 "Help",
                 [
@@ -170,6 +254,10 @@ class UserInterface():
                 sg.Push(),
                 sg.Image(size=viewer_size, key="-WS_IMAGE-"),
                 sg.Push()
+            ],
+            [
+                sg.Text("", key="-WS_STATS-", font=("Courier", 8),
+                        visible=False)
             ]
         ]
 
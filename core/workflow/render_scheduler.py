@@ -0,0 +1,59 @@
+"""
+Keeps track of what the view and the thumbnail were last rendered from,
+so that the main loop only redraws them when something they depend on
+has actually changed
+"""
+
+import typing
+
+from core.graphics.image import Image
+from core.graphics.viewport import Viewport
+from core.workflow.workspace import Workspace
+
+RenderKey = typing.Hashable
+
+
+class RenderScheduler():
+    def __init__(self) -> None:
+        self.__view_key: RenderKey = None
+        self.__thumbnail_key: RenderKey = None
+
+    def should_render_view(self, workspace: Workspace,
+                           viewport: Viewport | None = None) -> bool:
+        key = RenderScheduler.__get_view_key(workspace, viewport)
+
+        if key == self.__view_key:
+            return False
+
+        self.__view_key = key
+        return True
+
+    def should_render_thumbnail(self, selection: Image | None) -> bool:
+        key = RenderScheduler.__get_thumbnail_key(selection)
+
+        if key == self.__thumbnail_key:
+            return False
+
+        self.__thumbnail_key = key
+        return True
+
+    def invalidate(self) -> None:
+        self.__view_key = None
+        self.__thumbnail_key = None
+
+    @staticmethod
+    def __get_view_key(workspace: Workspace,
+                       viewport: Viewport | None) -> RenderKey:
+        layers = workspace.get_layers()
+        revisions = tuple(image.get_revision() for (_, image) in layers)
+        view_state = viewport.get_state() if viewport is not None else None
+        return (workspace.get_revision(), revisions, view_state)
+
+    @staticmethod
+    def __get_thumbnail_key(selection: Image | None) -> RenderKey:
+        # Image revisions are unique across all images, so a different
+        # selection always results in a different key
+        if selection is None:
+            return (None,)
+
+        return (selection.get_revision(),)
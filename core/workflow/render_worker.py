@@ -0,0 +1,157 @@
+"""
+Renders the images away from the event loop, so it never waits on pixel
+work. Only the latest job of every image is kept, so a burst of changes is
+rendered once and renders that are already stale are dropped.
+
+The jobs run on an executor. Different images render concurrently, since
+Pillow releases the GIL for most of its work, while the jobs of a single
+image run one after another because they share its pipeline. A process
+pool can be used as well, the jobs then render without the stage cache.
+Their sources are still decoded and reduced in this process, on a thread
+of the worker, since only plain pixels can be sent to another process
+"""
+
+import typing
+import threading
+from concurrent.futures import Executor, Future
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image as PILImage  # type: ignore
+
+from core.graphics.image import Image, RenderJob, render_detached
+
+Post = typing.Callable[[Image, RenderJob, PILImage.Image | None], None]
+
+
+def create_executor(kind: str = "threads",
+                    max_workers: int | None = None) -> Executor:
+    if kind == "threads":
+        return ThreadPoolExecutor(max_workers, "RenderWorker")
+    if kind == "processes":
+        return ProcessPoolExecutor(max_workers)
+
+    raise ValueError(f"Unknown executor kind: {kind}")
+
+
+class RenderWorker():
+    def __init__(self, post: Post, executor: Executor | None = None) -> None:
+        """
+        The post function is called on a worker thread with every finished
+        render. A render that failed is posted as None. An executor that is
+        not given is created and shut down by the worker
+        """
+        self.__post = post
+        self.__owns_executor = executor is None
+        self.__executor = executor if executor is not None \
+            else create_executor()
+        self.__is_detached = isinstance(self.__executor, ProcessPoolExecutor)
+        self.__sources: ThreadPoolExecutor | None = None
+
+        if self.__is_detached:
+            self.__sources = ThreadPoolExecutor(None, "RenderSource")
+
+        self.__condition = threading.Condition()
+        self.__running: set[int] = set()
+        self.__waiting: dict[int, tuple[Image, RenderJob]] = {}
+        self.__is_running = True
+
+    def submit(self, image: Image, job: RenderJob) -> None:
+        """
+        Queues a job. While a job of the same image is being rendered, the
+        new job waits and replaces the job that was waiting before it
+        """
+        with self.__condition:
+            if not self.__is_running:
+                return
+
+            if id(image) in self.__running:
+                self.__waiting[id(image)] = (image, job)
+            else:
+                self.__start(image, job)
+
+    def render_all(self, images: list[Image]) -> None:
+        """
+        Renders the pending images concurrently and waits for all of them.
+        The renders are installed on the calling thread. The images must
+        not have jobs queued on the worker
+        """
+        started = []
+
+        for image in images:
+            job = image.take_render_job()
+
+            if job is not None:
+                started.append((image, job, self.__run(job)))
+
+        for (image, job, future) in started:
+            try:
+                rendered = future.result()
+            except Exception:
+                rendered = None
+
+            image.install_render(job, rendered)
+
+    def get_pending_count(self) -> int:
+        with self.__condition:
+            return len(self.__running) + len(self.__waiting)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Waits until every queued job is rendered
+        """
+        with self.__condition:
+            return self.__condition.wait_for(self.__is_idle, timeout)
+
+    def stop(self) -> None:
+        with self.__condition:
+            self.__is_running = False
+            self.__waiting.clear()
+
+        if self.__owns_executor:
+            self.__executor.shutdown(wait=True, cancel_futures=True)
+
+        if self.__sources is not None:
+            self.__sources.shutdown(wait=True, cancel_futures=True)
+
+    def __is_idle(self) -> bool:
+        return len(self.__running) == 0 and len(self.__waiting) == 0
+
+    def __run(self, job: RenderJob) -> Future:
+        if self.__sources is not None:
+            return self.__sources.submit(self.__run_detached, job)
+
+        return self.__executor.submit(job.run)
+
+    def __run_detached(self, job: RenderJob) -> PILImage.Image:
+        source, source_key = job.get_source()
+        future = self.__executor.submit(render_detached, source, source_key,
+                                        job.properties, job.is_draft)
+        return future.result()
+
+    def __start(self, image: Image, job: RenderJob) -> None:
+        self.__running.add(id(image))
+        future = self.__run(job)
+
+        def finish(future: Future) -> None:
+            self.__finish(image, job, future)
+
+        future.add_done_callback(finish)
+
+    def __finish(self, image: Image, job: RenderJob, future: Future) -> None:
+        try:
+            rendered = future.result()
+        except Exception:
+            rendered = None
+
+        with self.__condition:
+            self.__running.discard(id(image))
+            waiting = self.__waiting.pop(id(image), None)
+
+            # A newer job of the same image makes this render stale
+            if waiting is None and self.__is_running:
+                self.__post(image, job, rendered)
+
+            if waiting is not None and self.__is_running:
+                self.__start(*waiting)
+
+            self.__condition.notify_all()
@@ -1,74 +1,366 @@
 """
 The undo-redo stack handles the undo and redo operations of the program.
-A more tight method can be used by storing only the properties of an image,
-however this has some limitations on what effects a user can do undo on.
+Instead of copies of the images it stores snapshots of them, which record
+only the properties that were changed and share the pixel buffers with the
+image. Pixel memory is therefore only spent on the edits done by the
+destructive filters and on the rendered pixels, which let an image be
+restored without rendering it again.
+
+The history is bounded by a byte budget instead of a number of actions.
+Only the buffers the history alone holds count towards it, a buffer still
+used by a live image would not be freed by spilling it. Once the snapshots
+held in memory go over it, the rendered pixels of the oldest ones are
+dropped first, since they can be rendered again. Then the oldest ones are
+spilled to compressed temporary files and loaded back when they are
+needed. The files are written on a background thread, so an edit that
+goes over the budget does not wait for the encoder.
 """
 
-from collections import deque
+import typing
+import itertools
+import tempfile
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image as PILImage  # type: ignore
 
-from core.graphics.image import Image
+from core.graphics.image import Image, ImageSnapshot
 
 Action = tuple[str, Image]
+GetPlaceholder = typing.Callable[[str], Image | None]
+GetLiveImages = typing.Callable[[], typing.Iterable[Image]]
 
+DEFAULT_BYTE_BUDGET = 256 * 1024 * 1024
+DEFAULT_MAX_ACTIONS = 500
 
-class UndoRedoStack():
+
+def _get_byte_size(image: PILImage.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+def _write_spill(image: PILImage.Image) -> typing.IO[bytes]:
+    file = tempfile.TemporaryFile()
+    image.save(file, "PNG", compress_level=1)
+    return file
+
+
+def _close_spill(future: Future) -> None:
+    future.result().close()
+
+
+class _SpillStore():
+    """
+    Keeps the references of spilled snapshots in temporary PNG files,
+    which are written by a background thread. The reference stays in
+    memory until its file is written. A reference shared by several
+    snapshots is only written once
+    """
     def __init__(self) -> None:
-        self.__redo_stack: deque[Action] = deque()
-        self.__undo_stack: deque[Action] = deque()
+        self.__writer = ThreadPoolExecutor(1, "HistorySpill")
+        self.__files: dict[int, Future] = {}
+        self.__users: Counter[int] = Counter()
+
+    def store(self, key: int, image: PILImage.Image) -> None:
+        if key not in self.__files:
+            self.__files[key] = self.__writer.submit(_write_spill, image)
+
+        self.__users[key] += 1
+
+    def load(self, key: int) -> PILImage.Image:
+        file = self.__files[key].result()
+        file.seek(0)
+
+        with PILImage.open(file) as image:
+            return image.copy()
+
+    def release(self, key: int) -> None:
+        self.__users[key] -= 1
+
+        if self.__users[key] == 0:
+            del self.__users[key]
+            self.__files.pop(key).add_done_callback(_close_spill)
+
+    def get_byte_size(self) -> int:
+        """
+        Waits for the files that are still being written
+        """
+        return sum(future.result().seek(0, 2)
+                   for future in self.__files.values())
+
+
+class _Entry():
+    def __init__(self, layer_name: str, snapshot: ImageSnapshot) -> None:
+        self.layer_name = layer_name
+        self.fingerprint = snapshot.get_fingerprint()
+        self.__snapshot: ImageSnapshot | None = snapshot
+        self.__preview_size = snapshot.preview_size
+
+        # A reference that was never decoded is already kept encoded by
+        # its lazy reference, so it is not written again when spilled
+        self.__lazy_reference = snapshot.lazy_reference
+        self.__is_stored = False
+
+    def is_spilled(self) -> bool:
+        return self.__snapshot is None
+
+    def get_buffers(self) -> list[PILImage.Image]:
+        if self.__snapshot is None:
+            return []
+
+        snapshot = self.__snapshot
+        buffers = (snapshot.reference, snapshot.rendered, snapshot.proxy)
+        return [buffer for buffer in buffers if buffer is not None]
+
+    def get_rendered(self) -> PILImage.Image | None:
+        if self.__snapshot is None:
+            return None
+
+        return self.__snapshot.rendered
+
+    def drop_rendered(self) -> None:
+        if self.__snapshot is not None:
+            self.__snapshot = self.__snapshot.without_rendered()
+
+    def get_reference(self) -> PILImage.Image | None:
+        if self.__snapshot is None:
+            return None
+
+        return self.__snapshot.reference
+
+    def get_byte_size(self) -> int:
+        return sum(_get_byte_size(buffer) for buffer in self.get_buffers())
+
+    def get_snapshot(self, store: _SpillStore) -> ImageSnapshot:
+        if self.__snapshot is not None:
+            return self.__snapshot
+
+        mode, properties, reference_key = self.fingerprint
+        reference = store.load(reference_key) if self.__is_stored else None
+
+        return ImageSnapshot(mode, properties, reference, reference_key,
+                             None, self.__preview_size, None, 0,
+                             self.__lazy_reference)
+
+    def spill(self, store: _SpillStore) -> None:
+        if self.__snapshot is None:
+            return
+
+        if self.__snapshot.reference is not None:
+            store.store(self.__snapshot.reference_key,
+                        self.__snapshot.reference)
+            self.__lazy_reference = None
+            self.__is_stored = True
+
+        self.__snapshot = None
+
+    def discard(self, store: _SpillStore) -> None:
+        if self.__is_stored:
+            _, _, reference_key = self.fingerprint
+            store.release(reference_key)
+
+
+class UndoRedoStack():
+    def __init__(self, byte_budget: int = DEFAULT_BYTE_BUDGET,
+                 max_actions: int = DEFAULT_MAX_ACTIONS,
+                 get_live_images: GetLiveImages | None = None) -> None:
+        """
+        `get_live_images` gives the images in use outside of the history,
+        their buffers are not counted towards the byte budget
+        """
+        self.__byte_budget = byte_budget
+        self.__max_actions = max_actions
+        self.__get_live_images = get_live_images
+
+        self.__spill_store = _SpillStore()
+        self.__redo_stack: deque[_Entry] = deque()
+        self.__undo_stack: deque[_Entry] = deque()
 
     def __repr__(self) -> str:
-        return f"Undo: {self.__undo_stack}, Redo: {self.__redo_stack}"
+        def names(stack: deque[_Entry]) -> list[str]:
+            return [entry.layer_name for entry in stack]
+
+        undo_names = names(self.__undo_stack)
+        redo_names = names(self.__redo_stack)
+        return f"Undo: {undo_names}, Redo: {redo_names}"
 
     def peek_undo_stack(self) -> Action | None:
         if len(self.__undo_stack) == 0:
             return None
 
-        return self.__undo_stack[-1]
+        return self.__restore(self.__undo_stack[-1])
 
     def add_undo_action(self, action: tuple[str, Image]) -> None:
-        last_undo = self.peek_undo_stack()
+        layer_name, image = action
 
-        if last_undo is not None and last_undo[1] == action[1]:
-            return
+        if len(self.__undo_stack) != 0:
+            last_undo = self.__undo_stack[-1]
 
-        if len(self.__undo_stack) > 20:
-            self.__undo_stack.popleft()
+            if last_undo.fingerprint == image.get_fingerprint():
+                return
 
-        layer_name, image = action
-        self.__undo_stack.append((layer_name, image.copy()))
+        entry = _Entry(layer_name, image.get_snapshot())
+        self.__push(self.__undo_stack, entry)
 
     def add_redo_action(self, action: tuple[str, Image]):
-        if len(self.__undo_stack) > 20:
-            self.__redo_stack.popleft()
-
         layer_name, image = action
-        self.__redo_stack.append((layer_name, image.copy()))
+        entry = _Entry(layer_name, image.get_snapshot())
+        self.__push(self.__redo_stack, entry)
 
     def refresh_layer_name(self, old_name: str, new_name: str) -> None:
-        for idx, layer in enumerate(self.__undo_stack):
-            if layer[0] == old_name:
-                _, image = self.__undo_stack[idx]
-                self.__undo_stack[idx] = (new_name, image)
+        for entry in self.__undo_stack:
+            if entry.layer_name == old_name:
+                entry.layer_name = new_name
 
     def clear_references(self, layer_name: str) -> None:
         def is_not_layer(x):
-            return x[0] != layer_name
+            return x.layer_name != layer_name
+
+        for entry in self.__undo_stack:
+            if not is_not_layer(entry):
+                entry.discard(self.__spill_store)
 
         self.__undo_stack = deque(filter(is_not_layer, self.__undo_stack))
 
     def clear_redo_stack(self) -> None:
+        for entry in self.__redo_stack:
+            entry.discard(self.__spill_store)
+
         self.__redo_stack.clear()
 
-    def undo(self) -> Action | None:
+    def undo(self, get_placeholder: GetPlaceholder | None = None
+             ) -> Action | None:
+        """
+        `get_placeholder` gives the image a layer shows now, it is shown
+        until the restored image is rendered
+        """
         if len(self.__undo_stack) == 0:
             return None
 
-        action = self.__undo_stack.pop()
-        return action
+        return self.__take(self.__undo_stack.pop(), get_placeholder)
 
-    def redo(self) -> Action | None:
+    def redo(self, get_placeholder: GetPlaceholder | None = None
+             ) -> Action | None:
         if len(self.__redo_stack) == 0:
             return None
 
-        action = self.__redo_stack.pop()
+        return self.__take(self.__redo_stack.pop(), get_placeholder)
+
+    def get_memory_usage(self) -> int:
+        """
+        The bytes held in memory by the history alone. Buffers shared
+        between snapshots are only counted once, the ones shared with live
+        images are not counted
+        """
+        live = self.__get_live_buffers()
+        buffers = {}
+
+        for entry in itertools.chain(self.__undo_stack, self.__redo_stack):
+            for buffer in entry.get_buffers():
+                if id(buffer) not in live:
+                    buffers[id(buffer)] = _get_byte_size(buffer)
+
+        return sum(buffers.values())
+
+    def get_layer_buffers(self) -> list[tuple[str, PILImage.Image]]:
+        """
+        The buffers held in memory by the history, with the name of the
+        layer each one was taken from
+        """
+        return [(entry.layer_name, buffer)
+                for entry in itertools.chain(self.__undo_stack,
+                                             self.__redo_stack)
+                for buffer in entry.get_buffers()]
+
+    def get_disk_usage(self) -> int:
+        return self.__spill_store.get_byte_size()
+
+    def get_spilled_count(self) -> int:
+        entries = itertools.chain(self.__undo_stack, self.__redo_stack)
+        return sum(1 for entry in entries if entry.is_spilled())
+
+    def set_byte_budget(self, byte_budget: int) -> None:
+        self.__byte_budget = byte_budget
+        self.__enforce_byte_budget()
+
+    def __push(self, stack: deque[_Entry], entry: _Entry) -> None:
+        stack.append(entry)
+
+        while len(stack) > self.__max_actions:
+            stack.popleft().discard(self.__spill_store)
+
+        self.__enforce_byte_budget()
+
+    def __get_live_buffers(self) -> set[int]:
+        if self.__get_live_images is None:
+            return set()
+
+        return {id(buffer)
+                for image in self.__get_live_images()
+                for buffers in image.get_buffers().values()
+                for buffer in buffers}
+
+    def __enforce_byte_budget(self) -> None:
+        # The oldest undo actions go first, then the redo actions that are
+        # the furthest away. Their rendered pixels are dropped before any
+        # reference is spilled. An entry whose reference is still used by
+        # a live image is not spilled, that would free nothing
+        live = self.__get_live_buffers()
+        entries = list(itertools.chain(self.__undo_stack, self.__redo_stack))
+        users: Counter[int] = Counter()
+        sizes: dict[int, int] = {}
+
+        for entry in entries:
+            for buffer in entry.get_buffers():
+                if id(buffer) not in live:
+                    users[id(buffer)] += 1
+                    sizes[id(buffer)] = _get_byte_size(buffer)
+
+        usage = sum(sizes.values())
+
+        def release(buffers: list[PILImage.Image]) -> None:
+            nonlocal usage
+
+            for buffer in buffers:
+                if id(buffer) in live:
+                    continue
+
+                users[id(buffer)] -= 1
+                if users[id(buffer)] == 0:
+                    usage -= sizes[id(buffer)]
+
+        for entry in entries:
+            if usage <= self.__byte_budget:
+                return
+
+            rendered = entry.get_rendered()
+            if rendered is not None:
+                entry.drop_rendered()
+                release([rendered])
+
+        for entry in entries:
+            if usage <= self.__byte_budget:
+                return
+
+            reference = entry.get_reference()
+            if reference is not None and id(reference) in live:
+                continue
+
+            buffers = entry.get_buffers()
+            entry.spill(self.__spill_store)
+            release(buffers)
+
+    def __restore(self, entry: _Entry,
+                  get_placeholder: GetPlaceholder | None = None) -> Action:
+        snapshot = entry.get_snapshot(self.__spill_store)
+        placeholder = None
+
+        if get_placeholder is not None:
+            placeholder = get_placeholder(entry.layer_name)
+
+        return (entry.layer_name, Image.from_snapshot(snapshot, placeholder))
+
+    def __take(self, entry: _Entry,
+               get_placeholder: GetPlaceholder | None = None) -> Action:
+        action = self.__restore(entry, get_placeholder)
+        entry.discard(self.__spill_store)
         return action
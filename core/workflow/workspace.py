@@ -1,16 +1,76 @@
 """
-The workspace handles the logic behind the layers and keeps track of them
+The workspace handles the logic behind the layers and keeps track of them.
+
+It also accounts for the memory the layers hold. A buffer that is shared,
+between copies of a layer or with the history, is only counted once, for
+the first layer and purpose it is found for. Once the total goes over the
+soft limit the caches of the layers are evicted, the largest first
 """
 
+from dataclasses import dataclass, field
+
 from core.graphics.image import Image
+from core.workflow.undo_redo_stack import UndoRedoStack
+from core.instrumentation import get_byte_size
+
+
+@dataclass
+class LayerMemory:
+    name: str
+    reference: int = 0
+    rendered: int = 0
+    cache: int = 0
+    history: int = 0
+
+    def get_total(self) -> int:
+        return self.reference + self.rendered + self.cache + self.history
+
+
+@dataclass
+class MemoryReport:
+    """
+    `unattributed` is the history of layers that are no longer in the
+    workspace
+    """
+    layers: list[LayerMemory] = field(default_factory=list)
+    unattributed: int = 0
+    high_water_mark: int = 0
+    soft_limit: int | None = None
+
+    def get_total(self) -> int:
+        return (sum(layer.get_total() for layer in self.layers) +
+                self.unattributed)
+
+    def get_layer(self, name: str) -> LayerMemory | None:
+        return next((layer for layer in self.layers if layer.name == name),
+                    None)
+
+    def get_summary(self) -> str:
+        megabyte = 2**20
+        lines = [f"{'':<24}{'ref':>9}{'render':>9}{'cache':>9}{'history':>9}"] # noqa
+
+        for layer in self.layers:
+            lines.append(f"{layer.name:<24}"
+                         f"{layer.reference / megabyte:>9.1f}"
+                         f"{layer.rendered / megabyte:>9.1f}"
+                         f"{layer.cache / megabyte:>9.1f}"
+                         f"{layer.history / megabyte:>9.1f}")
+
+        lines.append(f"Total {self.get_total() / megabyte:.1f} MB, "
+                     f"peak {self.high_water_mark / megabyte:.1f} MB")
+        return "\n".join(lines)
 
 
 class Workspace:
     """
     The heart of the layer manipulation
     """
-    def __init__(self) -> None:
+    def __init__(self, soft_limit: int | None = None) -> None:
         self.__layers: list[tuple[str, Image]] = []
+        self.__revision = 0
+
+        self.__soft_limit = soft_limit
+        self.__high_water_mark = 0
 
     def __len__(self) -> int:
         return len(self.__layers)
@@ -24,8 +84,12 @@ class Workspace:
     def get_layers_names(self) -> list[str]:
         return [name for (name, _) in self.__layers]
 
+    def get_revision(self) -> int:
+        return self.__revision
+
     def delete_layer(self, name: str) -> None:
         self.__layers = list(filter(lambda x: x[0] != name, self.__layers))
+        self.__revision += 1
 
     def add_layer(self, image: Image, layer_name: str | None = None) -> None:
         if layer_name is None:
@@ -37,6 +101,7 @@ class Workspace:
             layer_name = layer_name + f" ({name_count})"
 
         self.__layers.append((layer_name, image))
+        self.__revision += 1
 
     def rename_layer(self, old_name: str, new_name: str) -> str:
         layer_index = None
@@ -54,6 +119,7 @@ class Workspace:
 
         _, image = self.__layers[layer_index]
         self.__layers[layer_index] = (new_name, image)
+        self.__revision += 1
         return new_name
 
     def update_layer(self, layer_name: str, image: Image) -> None:
@@ -61,6 +127,7 @@ class Workspace:
             name, _ = self.__layers[i]
             if name == layer_name:
                 self.__layers[i] = (name, image)
+                self.__revision += 1
                 return
 
     def move_layer_up(self, name: str) -> None:
@@ -106,6 +173,73 @@ class Workspace:
         temp_layer = self.__layers[first_index]
         self.__layers[first_index] = self.__layers[second_index]
         self.__layers[second_index] = temp_layer
+        self.__revision += 1
+
+    def get_soft_limit(self) -> int | None:
+        return self.__soft_limit
+
+    def set_soft_limit(self, soft_limit: int | None) -> None:
+        self.__soft_limit = soft_limit
+
+    def get_memory_report(self, history: UndoRedoStack | None = None) -> MemoryReport: # noqa
+        counted: set[int] = set()
+
+        def count(buffers) -> int:
+            size = 0
+
+            for buffer in buffers:
+                if id(buffer) not in counted:
+                    counted.add(id(buffer))
+                    size += get_byte_size(buffer)
+
+            return size
+
+        report = MemoryReport(soft_limit=self.__soft_limit)
+
+        for (name, image) in self.__layers:
+            buffers = image.get_buffers()
+            report.layers.append(LayerMemory(name,
+                                             count(buffers["reference"]),
+                                             count(buffers["rendered"]),
+                                             count(buffers["cache"])))
+
+        if history is not None:
+            for (name, buffer) in history.get_layer_buffers():
+                size = count((buffer,))
+                layer = report.get_layer(name)
+
+                if layer is None:
+                    report.unattributed += size
+                else:
+                    layer.history += size
+
+        self.__high_water_mark = max(self.__high_water_mark,
+                                     report.get_total())
+        report.high_water_mark = self.__high_water_mark
+        return report
+
+    def trim_memory(self, history: UndoRedoStack | None = None) -> MemoryReport: # noqa
+        """
+        Evicts the caches of the layers, the largest first, until the total
+        is within the soft limit. Returns the report after the eviction
+        """
+        report = self.get_memory_report(history)
+
+        if self.__soft_limit is None:
+            return report
+
+        excess = report.get_total() - self.__soft_limit
+        layers = sorted(zip(report.layers, self.__layers),
+                        key=lambda pair: pair[0].cache, reverse=True)
+
+        for (memory, (_, image)) in layers:
+            if excess <= 0 or memory.cache == 0:
+                break
+
+            if image.evict_cache():
+                excess -= memory.cache
+
+        return self.get_memory_report(history)
 
     def __count_layer_namings(self, layer_name: str):
         name_count = 0
@@ -0,0 +1,190 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core.batch.__main__ import main
+from core.batch.recipe import Recipe, RecipeError
+from core.batch.runner import run_batch, get_output_path
+
+
+class Test_Batch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = self.directory.name
+
+        self.inputs = []
+        for index in range(3):
+            path = os.path.join(self.root, f"image{index}.png")
+            noise = PILImage.effect_noise((40 + index, 30), 50)
+            noise.convert("RGBA").save(path)
+            self.inputs.append(path)
+
+        self.recipe = Recipe({"rotation": 20.0, "contrast": 1.4,
+                              "crop": [2, 3, 4, 5]}, ["negative"])
+        self.output = os.path.join(self.root, "output")
+
+        return super().setUp()
+
+    def test_recipe_round_trip(self):
+        path = os.path.join(self.root, "recipe.json")
+        self.recipe.save(path)
+
+        loaded = Recipe.load(path)
+        self.assertEqual(loaded, self.recipe)
+        self.assertEqual(loaded.properties["crop"], (2, 3, 4, 5))
+
+    def test_unknown_names_are_rejected(self):
+        with self.assertRaises(RecipeError):
+            Recipe({"blur": 2.0})
+
+        with self.assertRaises(RecipeError):
+            Recipe({}, ["sepia"])
+
+    def test_recipe_from_image(self):
+        image = Image(self.inputs[0])
+        image.apply_brightness(1.5)
+        image.set_offset((10, 10))
+
+        recipe = Recipe.from_image(image, ["grayscale"])
+        self.assertEqual(recipe.properties["brightness"], 1.5)
+        self.assertNotIn("offset", recipe.properties)
+        self.assertEqual(recipe.filters, ["grayscale"])
+
+    def test_recipe_keeps_size_of_every_input(self):
+        image = Image(self.inputs[0])
+        image.apply_contrast(1.4)
+        recipe = Recipe.from_image(image)
+        self.assertNotIn("resize", recipe.properties)
+
+        for (index, path) in enumerate(self.inputs):
+            image = Image(path)
+            recipe.apply(image)
+            self.assertEqual(image.get_size(), (40 + index, 30))
+
+    def test_recipe_scales_every_input(self):
+        image = Image(self.inputs[0])
+        image.resize((20, 15))
+        recipe = Recipe.from_image(image)
+        self.assertEqual(recipe.properties["scale"], (0.5, 0.5))
+
+        path = os.path.join(self.root, "large.png")
+        PILImage.new("RGBA", (400, 300)).save(path)
+
+        for (path, size) in ((self.inputs[2], (21, 15)),
+                             (path, (200, 150))):
+            image = Image(path)
+            recipe.apply(image)
+            self.assertEqual(image.get_size(), size)
+
+    def test_recipe_resize_and_scale_are_rejected(self):
+        with self.assertRaises(RecipeError):
+            Recipe({"resize": [10, 10], "scale": [0.5, 0.5]})
+
+    def test_recipe_matches_editor(self):
+        image = Image(self.inputs[1])
+        self.recipe.apply(image)
+
+        edited = Image(self.inputs[1])
+        edited.apply_negative()
+        edited.crop((2, 3, 4, 5))
+        edited.apply_contrast(1.4)
+        edited.rotate(20.0)
+
+        self.assertEqual(image.get_base_image().tobytes(),
+                         edited.get_base_image().tobytes())
+
+    def test_run_batch(self):
+        finished = []
+
+        with ThreadPoolExecutor(2) as executor:
+            report = run_batch(self.recipe, self.inputs, self.output,
+                               executor, "jpg", finished.append)
+
+        self.assertEqual(len(finished), 3)
+        self.assertEqual(report.get_failed(), [])
+        self.assertGreater(report.get_files_per_second(), 0)
+
+        output = get_output_path(self.inputs[0], self.output, "jpg")
+        self.assertTrue(output.endswith("image0.jpg"))
+
+        with PILImage.open(output) as written:
+            self.assertEqual(written.format, "JPEG")
+            self.assertEqual(written.mode, "RGB")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            get_output_path(self.inputs[0], self.output, "xyz")
+
+    def test_failed_file_is_reported(self):
+        broken = os.path.join(self.root, "broken.png")
+        with open(broken, "w") as file:
+            file.write("not an image")
+
+        with ThreadPoolExecutor(2) as executor:
+            report = run_batch(self.recipe, [broken, *self.inputs],
+                               self.output, executor)
+
+        [failed] = report.get_failed()
+        self.assertEqual(failed.input_path, broken)
+        self.assertEqual(len(os.listdir(self.output)), 3)
+
+    def test_main(self):
+        recipe = os.path.join(self.root, "recipe.json")
+        self.recipe.save(recipe)
+        pattern = os.path.join(self.root, "*.png")
+
+        code = main([recipe, pattern, "-o", self.output, "-j", "2",
+                     "--threads", "-q"])
+
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(os.listdir(self.output)),
+                         ["image0.png", "image1.png", "image2.png"])
+
+    def test_main_keeps_nested_paths(self):
+        recipe = os.path.join(self.root, "recipe.json")
+        self.recipe.save(recipe)
+
+        nested = os.path.join(self.root, "sub", "image0.png")
+        os.makedirs(os.path.dirname(nested))
+        PILImage.effect_noise((30, 20), 50).save(nested)
+        pattern = os.path.join(self.root, "**", "image0.png")
+
+        code = main([recipe, pattern, "-o", self.output, "--threads", "-q"])
+
+        self.assertEqual(code, 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.output,
+                                                    "image0.png")))
+        self.assertTrue(os.path.isfile(os.path.join(self.output, "sub",
+                                                    "image0.png")))
+
+    def test_same_output_is_reported(self):
+        other = os.path.join(self.root, "image0.gif")
+        PILImage.effect_noise((30, 20), 50).save(other)
+
+        with ThreadPoolExecutor(2) as executor:
+            report = run_batch(self.recipe, [self.inputs[0], other],
+                               self.output, executor, "png")
+
+        [failed] = report.get_failed()
+        self.assertEqual(failed.input_path, other)
+        self.assertEqual(len(report.results), 2)
+        self.assertEqual(os.listdir(self.output), ["image0.png"])
+
+    def test_tkinter_is_not_imported(self):
+        code = ("import sys, core.batch.__main__; "
+                "print(any(name in sys.modules "
+                "for name in ('tkinter', 'PySimpleGUI')))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=root, text=True)
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
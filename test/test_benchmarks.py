@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.__main__ import main
+from benchmarks.suite import CASES, create_image, get_size
+from benchmarks.harness import Result, Comparison, run_suite
+from benchmarks.harness import save_results, load_results
+from benchmarks.harness import compare, get_regressions
+
+
+class Test_Benchmarks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "results.json")
+
+        return super().setUp()
+
+    def test_synthetic_image(self):
+        width, height = get_size(12.0)
+        self.assertAlmostEqual(width * height / 1e6, 12.0, places=2)
+
+        first, second = create_image(0.01), create_image(0.01)
+        self.assertEqual(first.mode, "RGBA")
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_every_case_runs(self):
+        results = run_suite(CASES, [0.01], repeat=1)
+
+        self.assertEqual([result.name for result in results],
+                         [case.name for case in CASES])
+        self.assertTrue(all(result.fastest >= 0 for result in results))
+
+    def test_results_round_trip(self):
+        results = [Result("rotate", 2.0, 0.5, 0.6, 3)]
+        save_results(self.path, results)
+        self.assertEqual(load_results(self.path), results)
+
+    def test_regressions(self):
+        baseline = [Result("rotate", 2.0, 0.100, 0.1, 3),
+                    Result("copy", 2.0, 0.0001, 0.0001, 3),
+                    Result("crop", 2.0, 0.100, 0.1, 3)]
+        results = [Result("rotate", 2.0, 0.150, 0.15, 3),
+                   Result("copy", 2.0, 0.0003, 0.0003, 3),
+                   Result("crop", 2.0, 0.105, 0.105, 3),
+                   Result("flip_vertical", 2.0, 0.1, 0.1, 3)]
+
+        comparisons = compare(results, baseline)
+        self.assertEqual(len(comparisons), 3)
+
+        [regression] = get_regressions(comparisons, 0.1)
+        self.assertEqual(regression.name, "rotate")
+        self.assertAlmostEqual(regression.get_change(), 0.5)
+
+    def test_unchanged_is_no_regression(self):
+        comparison = Comparison("copy", 2.0, 0.0, 0.0)
+        self.assertEqual(comparison.get_change(), 0.0)
+
+    def test_main_compares_with_baseline(self):
+        arguments = ["-s", "0.01", "-r", "1", "-k", "flip_*"]
+
+        self.assertEqual(main([*arguments, "-o", self.path]), 0)
+        self.assertEqual(len(load_results(self.path)), 2)
+
+        # Every case is far slower than this baseline
+        save_results(self.path, [Result("flip_vertical", 0.01, 1e-9, 0, 1)])
+        self.assertEqual(main([*arguments, "-b", self.path, "-n", "0"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core.graphics.checkered_background import CheckeredBackground
+from core.graphics.checkered_background import _create_pattern
+
+
+class Test_CheckeredBackground(unittest.TestCase):
+    def setUp(self) -> None:
+        _create_pattern.cache_clear()
+        return super().setUp()
+
+    def test_pattern(self):
+        size = (35, 21)
+        background = CheckeredBackground(size, "white", "black", 10)
+        image = background.get_base_image()
+
+        self.assertEqual(image.size, size)
+
+        for x in range(size[0]):
+            for y in range(size[1]):
+                is_secondary = (x // 10) % 2 == (y // 10) % 2
+                expected = (0, 0, 0) if is_secondary else (255, 255, 255)
+                self.assertEqual(image.getpixel((x, y)), expected, (x, y))
+
+    def test_patterns_are_cached(self):
+        CheckeredBackground((500, 500))
+        CheckeredBackground((500, 500))
+        CheckeredBackground((300, 500))
+
+        info = _create_pattern.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+    def test_paste_keeps_cached_pattern(self):
+        background = CheckeredBackground((40, 40))
+        pattern = _create_pattern((40, 40), "white", "grey", 10).copy()
+
+        red = Image(image=PILImage.new("RGBA", (40, 40), "Red"))
+        background.paste(red)
+        background.reset()
+        background.rotate(0.0)
+        background.paste(red)
+        background.reset()
+
+        self.assertEqual(_create_pattern((40, 40), "white", "grey", 10),
+                         pattern)
+        self.assertEqual(background.get_base_image(), pattern)
+
+
+if __name__ == "__main__":
+    unittest.main()
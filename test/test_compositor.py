@@ -0,0 +1,230 @@
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from PIL import ImageChops  # type: ignore
+from core.graphics.image import Image
+from core.graphics.compositor import Compositor
+from core.graphics.tiled_surface import TILE_SIZE
+
+BOX = (0, 0, 120, 120)
+
+
+class Test_Compositor(unittest.TestCase):
+    def setUp(self) -> None:
+        self.background = PILImage.new("RGB", (200, 200), "White")
+        self.compositor = Compositor((200, 200), self.background.crop)
+
+        red = Image(image=PILImage.new("RGBA", (60, 40), (255, 0, 0, 128)))
+        blue = Image(image=PILImage.new("RGBA", (50, 50), (0, 0, 255, 255)))
+        red.set_offset((10, 10))
+        blue.set_offset((-30, 20))
+
+        self.layers = [("Red", red), ("Blue", blue)]
+
+        return super().setUp()
+
+    def composite(self) -> PILImage.Image:
+        canvas = Image(image=self.background)
+
+        for (_, image) in reversed(self.layers):
+            canvas.cropped_paste(image, image.get_properties().offset)
+
+        return canvas.get_base_image()
+
+    def assertUpToDate(self):
+        self.compositor.render(self.layers)
+        self.assertEqual(self.compositor.get_region((0, 0, 200, 200)),
+                         self.composite())
+
+    def test_first_render_damages_everything(self):
+        damaged = self.compositor.render(self.layers)
+
+        self.assertEqual(damaged, [(0, 0, 200, 200)])
+        self.assertEqual(self.compositor.get_region((0, 0, 200, 200)),
+                         self.composite())
+
+    def test_nothing_changed(self):
+        self.compositor.render(self.layers)
+        self.assertEqual(self.compositor.render(self.layers), [])
+
+    def test_move_damages_old_and_new_box(self):
+        self.compositor.render(self.layers)
+
+        _, red = self.layers[0]
+        red.set_offset((2, 0))
+        damaged = self.compositor.render(self.layers)
+
+        self.assertEqual(damaged, [(10, 10, 72, 50)])
+        self.assertEqual(self.compositor.get_region((0, 0, 200, 200)),
+                         self.composite())
+
+    def test_edit(self):
+        self.compositor.render(self.layers)
+
+        _, blue = self.layers[1]
+        blue.apply_negative()
+
+        self.assertUpToDate()
+
+    def test_reorder(self):
+        self.compositor.render(self.layers)
+        self.layers.reverse()
+
+        self.assertUpToDate()
+
+    def test_add_and_delete(self):
+        self.compositor.render(self.layers)
+
+        green = PILImage.new("RGBA", (20, 20), (0, 255, 0, 200))
+        self.layers.insert(1, ("Green", Image(image=green)))
+        self.assertUpToDate()
+
+        self.layers.pop(0)
+        self.assertUpToDate()
+
+    def test_previewed_layer(self):
+        _, red = self.layers[0]
+        red.set_preview((30, 30))
+        red.apply_brightness(1.5)
+
+        self.assertEqual(red.get_base_image().size, (30, 20))
+        self.assertUpToDate()
+
+    def test_unrelated_layers_keep_their_order(self):
+        self.compositor.render(self.layers)
+
+        green = PILImage.new("RGBA", (20, 20), (0, 255, 0, 200))
+        self.layers.insert(0, ("Green", Image(image=green)))
+        damaged = self.compositor.render(self.layers)
+
+        self.assertEqual(damaged, [(0, 0, 20, 20)])
+
+    def test_invalidate(self):
+        self.compositor.render(self.layers)
+        self.compositor.invalidate()
+
+        self.assertEqual(self.compositor.render(self.layers),
+                         [(0, 0, 200, 200)])
+
+
+class Test_Compositor_Large_Canvas(unittest.TestCase):
+    def setUp(self) -> None:
+        self.size = (20000, 20000)
+        self.compositor = Compositor(self.size, self.background)
+        self.visible = (0, 0, 500, 500)
+
+        self.image = Image(image=PILImage.new("RGBA", (100, 100), "Red"))
+        self.image.set_offset((450, 450))
+        self.layers = [("Red", self.image)]
+
+        return super().setUp()
+
+    @staticmethod
+    def background(box) -> PILImage.Image:
+        size = (box[2] - box[0], box[3] - box[1])
+        return PILImage.new("RGB", size, "White")
+
+    def test_only_visible_tiles_are_allocated(self):
+        self.compositor.render(self.layers, visible=self.visible)
+        self.compositor.get_region(self.visible)
+
+        self.assertEqual(self.compositor.get_allocated_count(), 4)
+
+    def test_damage_outside_of_view(self):
+        self.compositor.render(self.layers, visible=self.visible)
+        self.compositor.get_region(self.visible)
+
+        self.image.set_offset((TILE_SIZE * 4, 0))
+        damaged = self.compositor.render(self.layers, visible=self.visible)
+
+        self.assertEqual(damaged, [(450, 450, 500, 500)])
+        self.assertEqual(self.compositor.get_allocated_count(), 4)
+
+        uncovered = self.compositor.get_region((450, 450, 500, 500))
+        self.assertEqual(uncovered.getcolors(), [(50 * 50, (255, 255, 255))])
+
+        region = self.compositor.get_region((1474, 450, 1574, 550))
+        self.assertEqual(region.getcolors(), [(100 * 100, (255, 0, 0))])
+
+    def test_offscreen_tiles_are_dropped(self):
+        self.compositor.render(self.layers, visible=self.visible)
+        self.compositor.get_region((0, 0, 600, 600))
+        self.assertEqual(self.compositor.get_allocated_count(), 9)
+
+        self.image.set_offset((10, 0))
+        self.compositor.render(self.layers, visible=(0, 0, 200, 200))
+        self.assertEqual(self.compositor.get_allocated_count(), 5)
+
+        region = self.compositor.get_region((460, 450, 560, 550))
+        self.assertEqual(region.getcolors(), [(100 * 100, (255, 0, 0))])
+
+
+class Test_Compositor_Active_Layer(unittest.TestCase):
+    """
+    The flattened stacks are blended with a different rounding than the
+    layers pasted one by one, so the colours may be off by a unit or two
+    """
+    MAX_ERROR = 2
+
+    def setUp(self) -> None:
+        self.background = PILImage.new("RGB", (120, 120), "White")
+        self.compositor = Compositor((120, 120), self.background.crop)
+
+        self.layers = []
+        for index in range(6):
+            colour = (40 * index, 255 - 40 * index, 128, 100 + 25 * index)
+            image = Image(image=PILImage.new("RGBA", (50, 50), colour))
+            image.set_offset((10 * index - 30, 8 * index - 20))
+            self.layers.append((f"Layer {index}", image))
+
+        return super().setUp()
+
+    def assertUpToDate(self):
+        canvas = Compositor((120, 120), self.background.crop)
+        canvas.render(self.layers)
+
+        difference = ImageChops.difference(self.compositor.get_region(BOX),
+                                           canvas.get_region(BOX))
+
+        for (_, band_max) in difference.getextrema():
+            self.assertLessEqual(band_max, self.MAX_ERROR)
+
+    def test_edit_active_layer(self):
+        self.compositor.render(self.layers, "Layer 3")
+
+        for factor in (1.5, 0.5, 2.0):
+            _, image = self.layers[3]
+            image.apply_brightness(factor)
+            image.set_offset((1, 2))
+
+            self.compositor.render(self.layers, "Layer 3")
+            self.assertUpToDate()
+
+    def test_edit_other_layer(self):
+        self.compositor.render(self.layers, "Layer 3")
+
+        _, above = self.layers[1]
+        above.apply_negative()
+        self.compositor.render(self.layers, "Layer 3")
+        self.assertUpToDate()
+
+        _, below = self.layers[5]
+        below.set_offset((5, 5))
+        self.compositor.render(self.layers, "Layer 3")
+        self.assertUpToDate()
+
+    def test_top_and_bottom_layers(self):
+        for name in ("Layer 0", "Layer 5"):
+            _, image = self.layers[int(name[-1])]
+            image.set_offset((3, 0))
+
+            self.compositor.render(self.layers, name)
+            self.assertUpToDate()
+
+    def test_missing_active_layer(self):
+        self.compositor.render(self.layers, "Layer 9")
+        self.assertUpToDate()
+
+
+if __name__ == "__main__":
+    unittest.main()
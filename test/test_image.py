@@ -0,0 +1,259 @@
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core import instrumentation
+
+
+class Test_Image(unittest.TestCase):
+    def setUp(self) -> None:
+        noise = PILImage.effect_noise((400, 300), 40).convert("RGBA")
+        self.source = noise
+        self.image = Image(image=noise)
+
+        return super().setUp()
+
+    def test_preview_renders_from_proxy(self):
+        self.image.set_preview((100, 100))
+        self.image.apply_contrast(1.5)
+
+        self.assertTrue(self.image.is_previewed())
+        self.assertEqual(self.image.get_base_image().size, (100, 75))
+        self.assertEqual(self.image.get_size(), (400, 300))
+
+    def test_preview_region_is_scaled_to_level(self):
+        self.image.set_preview((100, 100))
+        self.image.rotate(30)
+
+        width, height = self.image.get_size()
+        level_size = self.image.get_level_size(2)
+        self.assertEqual(level_size, (-(-width // 4), -(-height // 4)))
+
+        region = self.image.get_region((10, 10, 60, 40), 2)
+        self.assertEqual(region.size, (50, 30))
+        self.assertEqual(self.image.get_mipmap(2).size, level_size)
+
+    def test_preview_mipmaps_are_cached(self):
+        self.image.set_preview((100, 100))
+        self.image.apply_contrast(1.5)
+
+        mipmap = self.image.get_mipmap(3)
+        self.assertEqual(mipmap.size, (50, 38))
+        self.assertIs(self.image.get_mipmap(3), mipmap)
+        self.assertIs(self.image.get_mipmap(2), self.image.get_mipmap(2))
+        self.assertEqual(self.image.get_region((0, 0, 20, 20), 3).tobytes(),
+                         mipmap.crop((0, 0, 20, 20)).tobytes())
+
+        self.image.apply_contrast(2.0)
+        self.assertIsNot(self.image.get_mipmap(3), mipmap)
+
+    def test_cropped_preview_renders_larger_proxy(self):
+        self.image.set_preview((100, 100))
+        self.image.crop((0, 0, 300, 225))
+
+        self.assertEqual(self.image.get_size(), (100, 75))
+        self.assertEqual(self.image.get_base_image().size, (100, 75))
+
+    def test_preview_keeps_geometry(self):
+        self.image.set_preview((100, 100))
+        self.image.resize((200, 150))
+        self.image.crop((10, 0, 0, 20))
+
+        self.assertEqual(self.image.get_size(), (190, 130))
+
+    def test_full_resolution(self):
+        self.image.set_preview((100, 100))
+        self.image.flip_horizontal()
+
+        full_resolution = self.image.get_full_resolution()
+        expected = self.source.transpose(PILImage.Transpose.FLIP_LEFT_RIGHT)
+
+        self.assertFalse(full_resolution.is_previewed())
+        self.assertEqual(full_resolution.get_properties(),
+                         self.image.get_properties())
+        self.assertEqual(full_resolution.get_base_image(), expected)
+
+    def test_full_resolution_without_preview(self):
+        self.assertIs(self.image.get_full_resolution(), self.image)
+
+    def test_small_image_preview(self):
+        self.image.set_preview((1000, 1000))
+        self.assertEqual(self.image.get_base_image(), self.source)
+
+    def test_snapshot_records_changed_properties(self):
+        self.image.apply_brightness(1.5)
+        self.image.set_offset((3, 4))
+
+        snapshot = self.image.get_snapshot()
+        expected = (("resize", (400, 300)), ("offset", (3, 4)),
+                    ("brightness", 1.5))
+
+        self.assertEqual(snapshot.properties, expected)
+
+    def test_from_snapshot(self):
+        self.image.apply_negative()
+        self.image.get_base_image()
+        snapshot = self.image.get_snapshot()
+        self.image.apply_negative()
+
+        restored = Image.from_snapshot(snapshot)
+
+        self.assertEqual(restored.get_snapshot(), snapshot)
+        self.assertIs(restored.get_base_image(), snapshot.get_rendered())
+        self.assertNotEqual(self.image.get_snapshot(), snapshot)
+
+    def test_from_snapshot_renders_dropped_pixels(self):
+        self.image.apply_brightness(1.5)
+        expected = self.image.get_base_image().tobytes()
+        snapshot = self.image.get_snapshot().without_rendered()
+
+        self.assertIsNone(snapshot.get_rendered())
+        restored = Image.from_snapshot(snapshot)
+        self.assertEqual(restored.get_base_image().tobytes(), expected)
+
+    def test_deferred_restore_shows_placeholder(self):
+        self.image.apply_brightness(1.5)
+        snapshot = self.image.get_snapshot()
+        self.assertIsNone(snapshot.get_rendered())
+
+        placeholder = self.image.copy()
+        placeholder.apply_brightness(0.5)
+        shown = placeholder.get_base_image()
+
+        restored = Image.from_snapshot(snapshot, placeholder)
+        restored.set_deferred(True)
+        self.assertTrue(restored.is_render_pending())
+        self.assertIs(restored.get_base_image(), shown)
+
+    def test_deferred_restore_without_placeholder(self):
+        self.image.apply_brightness(1.5)
+        snapshot = self.image.get_snapshot()
+
+        restored = Image.from_snapshot(snapshot)
+        restored.set_deferred(True)
+        self.assertFalse(restored.is_render_pending())
+        self.assertEqual(restored.get_base_image().tobytes(),
+                         self.image.get_base_image().tobytes())
+
+    def test_equality(self):
+        other = self.image.copy()
+        self.assertEqual(self.image, other)
+
+        other.apply_saturation(0.5)
+        self.assertNotEqual(self.image, other)
+
+        other.apply_saturation(1.0)
+        self.assertEqual(self.image, other)
+
+        other.apply_negative()
+        self.assertNotEqual(self.image, other)
+
+    def test_copy_shares_reference(self):
+        copy = self.image.copy()
+
+        self.assertIs(copy.get_snapshot().reference,
+                      self.image.get_snapshot().reference)
+
+    def test_filter_on_copy_keeps_original(self):
+        copy = self.image.copy()
+        copy.apply_negative()
+
+        self.assertIsNot(copy.get_snapshot().reference,
+                         self.image.get_snapshot().reference)
+        self.assertEqual(self.image.get_base_image().tobytes(),
+                         self.source.tobytes())
+
+    def test_paste_keeps_shared_reference(self):
+        copy = self.image.copy()
+        self.image.paste(Image(image=PILImage.new("RGBA", (10, 10), "Red")))
+
+        self.assertEqual(copy.get_base_image().tobytes(),
+                         self.source.tobytes())
+        self.assertEqual(copy.get_snapshot().reference.tobytes(),
+                         self.source.tobytes())
+
+    def test_changes_render_once(self):
+        self.addCleanup(instrumentation.enable if instrumentation.is_enabled()
+                        else instrumentation.disable)
+        self.addCleanup(instrumentation.get_recorder().clear)
+        instrumentation.enable()
+
+        self.image.rotate(10)
+        self.image.apply_contrast(1.5)
+        self.image.flip_vertical()
+        self.assertTrue(self.image.is_render_pending())
+
+        self.image.get_size()
+        self.image.get_base_image()
+        self.assertFalse(self.image.is_render_pending())
+
+        stat = instrumentation.get_recorder().get_stat("image.render")
+        self.assertEqual(stat.count, 1)
+
+    def test_draft_renders_reduced(self):
+        self.addCleanup(instrumentation.enable if instrumentation.is_enabled()
+                        else instrumentation.disable)
+        self.addCleanup(instrumentation.get_recorder().clear)
+        instrumentation.enable()
+
+        self.image.set_draft(True)
+        self.image.apply_brightness(1.5)
+        draft = self.image.get_base_image()
+        draft_bytes = instrumentation.get_recorder().get_stat(
+            "image.stage.tone").bytes
+
+        self.image.set_draft(False)
+        final = self.image.get_base_image()
+        final_bytes = instrumentation.get_recorder().get_stat(
+            "image.stage.tone").bytes - draft_bytes
+
+        self.assertEqual(draft.size, (200, 150))
+        self.assertEqual(final.size, (400, 300))
+        self.assertEqual(self.image.get_size(), (400, 300))
+        self.assertEqual(draft_bytes * 4, final_bytes)
+
+    def test_previewed_draft_renders_from_proxy(self):
+        self.image.set_preview((100, 100))
+        self.image.set_draft(True)
+        self.image.apply_saturation(1.5)
+
+        self.assertEqual(self.image.get_base_image().size, (100, 75))
+
+    def test_deferred_image_keeps_pixels(self):
+        self.image.set_deferred(True)
+        self.image.resize((200, 150))
+
+        self.assertEqual(self.image.get_size(), (400, 300))
+        self.assertTrue(self.image.is_render_pending())
+
+        self.image.set_deferred(False)
+        self.assertEqual(self.image.get_size(), (200, 150))
+
+    def test_fingerprint_follows_revision(self):
+        fingerprint = self.image.get_fingerprint()
+        self.assertIs(self.image.get_fingerprint(), fingerprint)
+
+        self.image.rotate(45)
+        self.assertNotEqual(self.image.get_fingerprint(), fingerprint)
+
+    def test_mipmap_levels(self):
+        level_one = self.image.get_mipmap(1)
+        level_three = self.image.get_mipmap(3)
+
+        self.assertIs(self.image.get_mipmap(0), self.image.get_base_image())
+        self.assertEqual(level_one.size, (200, 150))
+        self.assertEqual(level_three.size, (50, 38))
+        self.assertIs(self.image.get_mipmap(1), level_one)
+
+    def test_mipmap_follows_rendered_image(self):
+        level_one = self.image.get_mipmap(1)
+
+        self.image.set_offset((5, 5))
+        self.assertIs(self.image.get_mipmap(1), level_one)
+
+        self.image.apply_brightness(1.5)
+        self.assertIsNot(self.image.get_mipmap(1), level_one)
+
+
+if __name__ == "__main__":
+    unittest.main()
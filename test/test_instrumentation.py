@@ -0,0 +1,110 @@
+import os
+import json
+import tempfile
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core import instrumentation
+from core.instrumentation import Stat, Recorder, measure
+
+
+class Test_Instrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        was_enabled = instrumentation.is_enabled()
+        self.addCleanup(instrumentation.enable if was_enabled
+                        else instrumentation.disable)
+
+        self.recorder = instrumentation.get_recorder()
+        self.recorder.clear()
+        self.addCleanup(self.recorder.clear)
+
+        return super().setUp()
+
+    def test_disabled_records_nothing(self):
+        instrumentation.disable()
+
+        with measure("disabled") as span:
+            span.add_bytes(10)
+
+        self.assertIsNone(self.recorder.get_stat("disabled"))
+
+    def test_enabled_by_environment(self):
+        name = instrumentation.ENVIRONMENT_VARIABLE
+        previous = os.environ.pop(name, None)
+        if previous is not None:
+            self.addCleanup(os.environ.__setitem__, name, previous)
+
+        self.assertFalse(instrumentation.is_enabled_by_environment())
+
+        for (value, expected) in (("0", False), ("", False), ("1", True)):
+            os.environ[name] = value
+            self.assertEqual(instrumentation.is_enabled_by_environment(),
+                             expected)
+
+        del os.environ[name]
+
+    def test_measure_records_time_and_bytes(self):
+        instrumentation.enable()
+
+        for _ in range(3):
+            with measure("block") as span:
+                span.add_image(PILImage.new("RGBA", (10, 10)))
+
+        stat = self.recorder.get_stat("block")
+        self.assertEqual(stat.count, 3)
+        self.assertEqual(stat.bytes, 3 * 400)
+        self.assertEqual(sum(stat.buckets), 3)
+        self.assertLessEqual(stat.fastest, stat.slowest)
+
+    def test_render_records_every_stage_that_runs(self):
+        instrumentation.enable()
+
+        image = Image(image=PILImage.new("RGBA", (40, 30)))
+        for _ in range(2):
+            image.apply_brightness(1.5)
+            image.get_base_image()
+
+        render = self.recorder.get_stat("image.render")
+        tone = self.recorder.get_stat("image.stage.tone")
+        self.assertEqual(render.count, 2)
+        self.assertEqual(tone.count, 1)
+        self.assertEqual(render.bytes, tone.bytes)
+
+    def test_percentiles(self):
+        stat = Stat("stat")
+        for seconds in (0.0001, 0.0001, 0.0001, 0.5):
+            stat.record(seconds, 0)
+
+        self.assertEqual(stat.get_percentile(0.5),
+                         instrumentation.BUCKET_START)
+        self.assertEqual(stat.get_percentile(1.0), 0.5)
+        self.assertAlmostEqual(stat.get_mean(), 0.500300 / 4)
+
+    def test_slow_measurements_go_to_last_bucket(self):
+        stat = Stat("stat")
+        stat.record(60.0, 0)
+
+        self.assertEqual(stat.buckets[-1], 1)
+        self.assertEqual(stat.get_percentile(0.95), 60.0)
+
+    def test_dump(self):
+        recorder = Recorder()
+        recorder.record("view.render", 0.01, 100)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stats.json")
+            recorder.dump(path)
+
+            with open(path) as file:
+                data = json.load(file)
+
+        stat = data["stats"]["view.render"]
+        self.assertEqual(stat["count"], 1)
+        self.assertEqual(stat["bytes"], 100)
+        self.assertEqual(len(stat["buckets"]), len(data["bucket_bounds"]) + 1)
+        self.assertIn("view.render", recorder.get_summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
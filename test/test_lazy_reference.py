@@ -0,0 +1,151 @@
+import os
+import tempfile
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core.graphics.lazy_reference import LazyReference, decode_image
+from core.workflow.undo_redo_stack import UndoRedoStack
+
+
+class Test_LazyReference(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+        noise = PILImage.effect_noise((800, 600), 40).convert("RGB")
+        self.jpeg = os.path.join(self.directory.name, "image.jpg")
+        self.png = os.path.join(self.directory.name, "image.png")
+        noise.save(self.jpeg)
+        noise.save(self.png, compress_level=1)
+
+        return super().setUp()
+
+    def test_jpeg_is_decoded_reduced(self):
+        image = decode_image(self.jpeg, (100, 100))
+
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.size, (400, 300))
+
+    def test_other_formats_are_reduced(self):
+        image = decode_image(self.png, (50, 50))
+
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.size, (134, 100))
+
+    def test_reduced_decode_is_never_smaller_than_twice_the_size(self):
+        for path in (self.jpeg, self.png):
+            width, height = decode_image(path, (250, 250)).size
+            self.assertGreaterEqual(max(width, height), 500)
+
+    def test_only_header_is_read(self):
+        reference = LazyReference(self.jpeg)
+
+        self.assertEqual(reference.size, (800, 600))
+        self.assertFalse(reference.is_loaded())
+        self.assertIs(reference.load(), reference.load())
+        self.assertTrue(reference.is_loaded())
+
+    def test_preview_open_keeps_reference_undecoded(self):
+        image = Image(self.jpeg, preview_size=(100, 100))
+        snapshot = image.get_snapshot()
+
+        self.assertTrue(image.is_previewed())
+        self.assertEqual(image.get_size(), (800, 600))
+        self.assertIsNone(snapshot.reference)
+        self.assertFalse(snapshot.lazy_reference.is_loaded())
+
+    def test_preview_open_renders_lazily(self):
+        image = Image(self.jpeg, preview_size=(100, 100))
+        self.assertTrue(image.is_render_pending())
+
+        image.set_deferred(True)
+        self.assertEqual(image.get_size(), (800, 600))
+        self.assertTrue(image.is_render_pending())
+
+        image.set_deferred(False)
+        self.assertEqual(image.get_base_image().size, (100, 75))
+        self.assertFalse(image.is_render_pending())
+
+    def test_render_job_decodes_when_run(self):
+        image = Image(self.png, preview_size=(100, 100))
+        image.set_deferred(True)
+
+        job = image.take_render_job()
+        self.assertIsNone(job.get_built_proxy())
+
+        rendered = job.run()
+        proxy = job.get_built_proxy()
+        self.assertEqual(proxy.size, (100, 75))
+        self.assertTrue(image.install_render(job, rendered))
+        self.assertIs(image.get_snapshot().proxy, proxy)
+
+        full_resolution = image.get_full_resolution(is_rendered=False)
+        job = full_resolution.take_render_job()
+        self.assertFalse(job.lazy_reference.is_loaded())
+
+        full_resolution.install_render(job, job.run())
+        self.assertTrue(job.lazy_reference.is_loaded())
+        self.assertEqual(full_resolution.get_size(), (800, 600))
+
+    def test_export_decodes_full_resolution(self):
+        image = Image(self.jpeg, preview_size=(100, 100))
+        image.resize((400, 300))
+        image.apply_brightness(1.2)
+
+        expected = Image(self.jpeg)
+        expected.resize((400, 300))
+        expected.apply_brightness(1.2)
+
+        full_resolution = image.get_full_resolution()
+        self.assertEqual(full_resolution.get_base_image().tobytes(),
+                         expected.get_base_image().tobytes())
+
+    def test_export_after_file_is_deleted(self):
+        image = Image(self.jpeg, preview_size=(100, 100))
+        expected = Image(self.jpeg).get_base_image().tobytes()
+        os.remove(self.jpeg)
+
+        full_resolution = image.get_full_resolution()
+        self.assertEqual(full_resolution.get_base_image().tobytes(),
+                         expected)
+
+    def test_export_after_file_is_replaced(self):
+        image = Image(self.png, preview_size=(100, 100))
+        expected = Image(self.png).get_base_image().tobytes()
+        PILImage.new("RGB", (800, 600), "Red").save(self.png)
+
+        full_resolution = image.get_full_resolution()
+        self.assertEqual(full_resolution.get_base_image().tobytes(),
+                         expected)
+
+    def test_copies_share_the_decode(self):
+        image = Image(self.jpeg, preview_size=(100, 100))
+        copy = image.copy()
+
+        copy.get_full_resolution()
+        snapshot = image.get_snapshot()
+        self.assertTrue(snapshot.lazy_reference.is_loaded())
+
+    def test_filter_decodes_full_resolution(self):
+        image = Image(self.png, preview_size=(100, 100))
+        image.apply_negative()
+
+        self.assertIsNotNone(image.get_snapshot().reference)
+        self.assertIsNone(image.get_snapshot().lazy_reference)
+
+    def test_spilled_snapshot_keeps_lazy_reference(self):
+        stack = UndoRedoStack(byte_budget=0)
+        image = Image(self.jpeg, preview_size=(100, 100))
+
+        stack.add_undo_action(("Layer", image))
+        self.assertEqual(stack.get_disk_usage(), 0)
+
+        _, restored = stack.undo()
+        self.assertEqual(restored, image)
+        self.assertEqual(restored.get_full_resolution().get_size(),
+                         (800, 600))
+
+
+if __name__ == "__main__":
+    unittest.main()
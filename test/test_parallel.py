@@ -0,0 +1,95 @@
+import unittest
+from unittest import mock
+
+from PIL import Image as PILImage  # type: ignore
+from PIL import ImageEnhance  # type: ignore
+from core.graphics import parallel
+from core.graphics.image import Image, _Properties
+from core.graphics.pipeline import Pipeline
+from core.graphics.parallel import map_bands, split_rows
+
+
+class Test_Parallel(unittest.TestCase):
+    def setUp(self) -> None:
+        self.image = PILImage.effect_noise((120, 97), 60).convert("RGBA")
+
+        # Small bands, so that the test images are split into several
+        patcher = mock.patch.object(parallel, "BAND_PIXELS", 1000)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return super().setUp()
+
+    def test_split_rows(self):
+        self.assertEqual(split_rows(10, 3), [(0, 3), (3, 6), (6, 10)])
+        self.assertEqual(split_rows(2, 5), [(0, 1), (1, 2)])
+        self.assertEqual(split_rows(7, 1), [(0, 7)])
+
+    def test_small_image_is_not_split(self):
+        bands = []
+
+        def record(image):
+            bands.append(image.size)
+            return image
+
+        map_bands(record, PILImage.new("RGBA", (10, 10)))
+        self.assertEqual(bands, [(10, 10)])
+
+    def test_bands_are_stitched(self):
+        bands = []
+
+        def record(image):
+            bands.append(image.size)
+            return image.point(lambda x: 255 - x)
+
+        result = map_bands(record, self.image)
+        expected = self.image.point(lambda x: 255 - x)
+
+        self.assertGreater(len(bands), 1)
+        self.assertEqual(result.tobytes(), expected.tobytes())
+
+    def test_halo_keeps_neighbourhood(self):
+        def sharpen(image):
+            return ImageEnhance.Sharpness(image).enhance(3.0)
+
+        expected = sharpen(self.image).tobytes()
+
+        self.assertEqual(map_bands(sharpen, self.image, 1).tobytes(),
+                         expected)
+        self.assertNotEqual(map_bands(sharpen, self.image).tobytes(),
+                            expected)
+
+    def test_pipeline_matches_serial(self):
+        props = _Properties()
+        props.resize = self.image.size
+        props.brightness = 1.3
+        props.contrast = 0.7
+        props.saturation = 1.6
+        props.sharpness = 2.5
+
+        banded = Pipeline().render(self.image, 1, props)
+
+        with mock.patch.object(parallel, "BAND_PIXELS", 1 << 30):
+            serial = Pipeline().render(self.image, 1, props)
+
+        self.assertEqual(banded.tobytes(), serial.tobytes())
+
+    def test_filters_match_serial(self):
+        filters = [Image.apply_negative, Image.apply_red_monochrome,
+                   Image.apply_green_monochrome, Image.apply_blue_monochrome,
+                   Image.convert_to_grayscale]
+
+        for apply in filters:
+            banded = Image(image=self.image)
+            apply(banded)
+
+            with mock.patch.object(parallel, "BAND_PIXELS", 1 << 30):
+                serial = Image(image=self.image)
+                apply(serial)
+
+            self.assertEqual(banded.get_base_image().tobytes(),
+                             serial.get_base_image().tobytes())
+
+
+if __name__ == "__main__":
+    unittest.main()
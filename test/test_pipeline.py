@@ -0,0 +1,262 @@
+import unittest
+from collections import Counter
+
+from PIL import Image as PILImage  # type: ignore
+from PIL import ImageChops, ImageEnhance, ImageStat  # type: ignore
+from core.graphics.image import _Properties
+from core.graphics.pipeline import Pipeline, Stage
+from core.graphics.pipeline import plan_stages, CANONICAL_STAGES
+
+
+class Test_Pipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls: Counter[str] = Counter()
+
+        def counted(stage: Stage) -> Stage:
+            def apply(image, params):
+                self.calls[stage.name] += 1
+                return stage.apply(image, params)
+
+            def draft(image, params):
+                self.calls[stage.name + " draft"] += 1
+                return stage.draft(image, params)
+
+            if stage.draft is None:
+                return Stage(stage.name, stage.get_parameters, apply)
+
+            return Stage(stage.name, stage.get_parameters, apply, draft)
+
+        def planner(props, source):
+            return [counted(stage) for stage in plan_stages(props, source)]
+
+        self.pipeline = Pipeline(planner)
+        self.source = PILImage.new("RGBA", (40, 30), "Red")
+
+        self.props = _Properties()
+        self.props.resize = (20, 15)
+        self.props.crop = (2, 2, 2, 2)
+        self.props.brightness = 1.5
+        self.props.rotation = 10.0
+
+        return super().setUp()
+
+    def test_inactive_stages_are_skipped(self):
+        props = _Properties()
+        props.resize = self.source.size
+
+        image = self.pipeline.render(self.source, 1, props)
+
+        self.assertIs(image, self.source)
+        self.assertEqual(sum(self.calls.values()), 0)
+
+    def test_render_all_stages(self):
+        image = self.pipeline.render(self.source, 1, self.props)
+
+        expected = {"resample": 1, "tone": 1, "rotation": 1}
+        self.assertEqual(self.calls, expected)
+        self.assertEqual(image.mode, "RGBA")
+
+    def test_rotation_reuses_upstream_stages(self):
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.props.rotation = 20.0
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["resample"], 1)
+        self.assertEqual(self.calls["tone"], 1)
+        self.assertEqual(self.calls["rotation"], 2)
+
+    def test_upstream_change_invalidates_downstream(self):
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.props.brightness = 0.5
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["tone"], 2)
+        self.assertEqual(self.calls["rotation"], 2)
+
+    def test_source_key_invalidates_everything(self):
+        self.pipeline.render(self.source, 1, self.props)
+        self.pipeline.render(self.source, 2, self.props)
+
+        self.assertEqual(self.calls["tone"], 2)
+        self.assertEqual(self.calls["rotation"], 2)
+
+    def test_clear(self):
+        self.pipeline.render(self.source, 1, self.props)
+        self.pipeline.clear()
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["resample"], 2)
+
+    def test_draft_render(self):
+        draft = self.pipeline.render(self.source, 1, self.props, draft=True)
+        final = self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["resample draft"], 1)
+        self.assertEqual(self.calls["rotation draft"], 1)
+        self.assertEqual(self.calls["resample"], 1)
+        self.assertEqual(self.calls["rotation"], 1)
+        self.assertEqual(draft.size, final.size)
+
+    def test_enlarging_draft_keeps_tone(self):
+        self.props.resize = (80, 60)
+        self.props.crop = (10, 10, 30, 20)
+
+        self.pipeline.render(self.source, 1, self.props, draft=True)
+        self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["tone"], 1)
+        self.assertEqual(self.calls["resample draft"], 1)
+        self.assertEqual(self.calls["resample"], 1)
+
+    def test_enlarging_crops_before_tone(self):
+        self.props.resize = (80, 60)
+        self.props.crop = (10, 10, 30, 20)
+
+        image = self.pipeline.render(self.source, 1, self.props)
+
+        self.assertEqual(self.calls["precrop"], 1)
+        self.assertEqual(self.calls["tone"], 1)
+        self.assertEqual(self.calls["resample"], 1)
+        self.assertEqual(image.mode, "RGBA")
+
+    def test_flipped_crop_stays_within_source(self):
+        source = PILImage.new("RGBA", (1024, 768), "Red")
+        props = _Properties()
+        props.crop = (0, 10, 0, 0)
+        props.flip_vertical = True
+
+        for resize in ((828, 691), (414, 339)):
+            for flip_horizontal in (False, True):
+                props.resize = resize
+                props.flip_horizontal = flip_horizontal
+
+                image = Pipeline().render(source, 1, props)
+                self.assertEqual(image.size, (resize[0], resize[1] - 10))
+
+
+class Test_Tone(unittest.TestCase):
+    def setUp(self) -> None:
+        noise = PILImage.effect_noise((64, 48), 40).convert("RGB")
+        self.source = noise.convert("RGBA")
+        self.source.putalpha(noise.getchannel("G"))
+
+        return super().setUp()
+
+    def render(self, brightness: float, contrast: float,
+               saturation: float) -> PILImage.Image:
+        props = _Properties()
+        props.resize = self.source.size
+        props.brightness = brightness
+        props.contrast = contrast
+        props.saturation = saturation
+
+        return Pipeline().render(self.source, 1, props)
+
+    def enhance(self, brightness: float, contrast: float,
+                saturation: float) -> PILImage.Image:
+        image = ImageEnhance.Brightness(self.source).enhance(brightness)
+        image = ImageEnhance.Contrast(image).enhance(contrast)
+        return ImageEnhance.Color(image).enhance(saturation)
+
+    def assertClose(self, first: PILImage.Image, second: PILImage.Image):
+        difference = ImageChops.difference(first, second)
+        for band_mean in ImageStat.Stat(difference).mean:
+            self.assertLess(band_mean, 1.0)
+
+    def test_matches_enhancers(self):
+        cases = [(1.4, 1.0, 1.0), (1.0, 0.6, 1.0), (1.0, 1.0, 1.8),
+                 (0.8, 1.3, 0.4), (1.2, 1.2, 1.2)]
+
+        for case in cases:
+            self.assertClose(self.render(*case), self.enhance(*case))
+
+    def test_keeps_alpha(self):
+        image = self.render(1.5, 1.5, 1.5)
+
+        self.assertEqual(image.mode, "RGBA")
+        self.assertEqual(image.getchannel("A").tobytes(),
+                         self.source.getchannel("A").tobytes())
+
+
+class Test_Planner(unittest.TestCase):
+    """
+    The planned stage orders have to stay within a small error of the
+    canonical order. Colours are compared premultiplied by alpha, since
+    the colour of a transparent pixel is never visible
+    """
+    MAX_MEAN_ERROR = 1.0
+    MAX_ERROR = 16
+
+    def setUp(self) -> None:
+        noise = PILImage.effect_noise((120, 90), 30).convert("RGB")
+        gradient = PILImage.linear_gradient("L").resize((120, 90))
+
+        self.source = PILImage.merge("RGBA", (noise.getchannel("R"),
+                                              gradient,
+                                              noise.getchannel("B"),
+                                              gradient.rotate(90)))
+
+        return super().setUp()
+
+    def assertEquivalent(self, props: _Properties):
+        planned = Pipeline().render(self.source, 1, props)
+        canonical = Pipeline(lambda *_: CANONICAL_STAGES)
+        expected = canonical.render(self.source, 1, props)
+
+        self.assertEqual(planned.size, expected.size)
+
+        difference = ImageChops.difference(planned.convert("RGBa"),
+                                           expected.convert("RGBa"))
+        stat = ImageStat.Stat(difference)
+
+        for band_mean, (_, band_max) in zip(stat.mean, stat.extrema):
+            self.assertLess(band_mean, self.MAX_MEAN_ERROR, props)
+            self.assertLessEqual(band_max, self.MAX_ERROR, props)
+
+    def make_properties(self, **kwargs) -> _Properties:
+        props = _Properties()
+        props.resize = self.source.size
+
+        for name, value in kwargs.items():
+            setattr(props, name, value)
+
+        return props
+
+    def test_downscale(self):
+        self.assertEquivalent(self.make_properties(
+            resize=(50, 40), brightness=1.3, contrast=0.7, saturation=1.6))
+
+    def test_downscale_and_crop(self):
+        self.assertEquivalent(self.make_properties(
+            resize=(60, 45), crop=(5, 3, 10, 4), contrast=1.4))
+
+    def test_crop_only(self):
+        self.assertEquivalent(self.make_properties(
+            crop=(10, 5, 20, 15), brightness=0.6, saturation=0.5))
+
+    def test_upscale_and_crop(self):
+        self.assertEquivalent(self.make_properties(
+            resize=(240, 200), crop=(30, 20, 100, 60), brightness=1.2))
+
+    def test_flips_and_crop(self):
+        self.assertEquivalent(self.make_properties(
+            resize=(100, 70), crop=(7, 2, 30, 11), saturation=1.3,
+            flip_horizontal=True, flip_vertical=True))
+
+        self.assertEquivalent(self.make_properties(
+            resize=(300, 200), crop=(40, 0, 0, 50), contrast=0.8,
+            flip_horizontal=True))
+
+    def test_sharpness_and_rotation(self):
+        self.assertEquivalent(self.make_properties(
+            resize=(80, 60), sharpness=2.5, rotation=33.0))
+
+        self.assertEquivalent(self.make_properties(
+            resize=(200, 150), sharpness=0.2, rotation=-90.0,
+            brightness=1.1))
+
+
+if __name__ == "__main__":
+    unittest.main()
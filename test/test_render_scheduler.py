@@ -0,0 +1,68 @@
+import unittest
+
+from core.graphics.image import Image
+from core.workflow.workspace import Workspace
+from core.workflow.render_scheduler import RenderScheduler
+
+
+class Test_RenderScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = RenderScheduler()
+        self.ws = Workspace()
+
+        self.image = Image()
+        self.ws.add_layer(self.image, "Im")
+
+        return super().setUp()
+
+    def test_first_render(self):
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+        self.assertTrue(self.scheduler.should_render_thumbnail(None))
+
+    def test_idle_does_not_render(self):
+        self.scheduler.should_render_view(self.ws)
+        self.scheduler.should_render_thumbnail(self.image)
+
+        self.assertFalse(self.scheduler.should_render_view(self.ws))
+        self.assertFalse(self.scheduler.should_render_thumbnail(self.image))
+
+    def test_image_change(self):
+        self.scheduler.should_render_view(self.ws)
+        self.scheduler.should_render_thumbnail(self.image)
+
+        self.image.set_offset((5, 0))
+
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+        self.assertTrue(self.scheduler.should_render_thumbnail(self.image))
+
+    def test_workspace_change(self):
+        self.scheduler.should_render_view(self.ws)
+
+        self.ws.add_layer(Image(), "Im2")
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+
+        self.ws.move_layer_up("Im2")
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+
+        self.ws.rename_layer("Im2", "Im3")
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+
+    def test_selection_change(self):
+        other = Image()
+
+        self.scheduler.should_render_thumbnail(self.image)
+        self.assertTrue(self.scheduler.should_render_thumbnail(other))
+        self.assertTrue(self.scheduler.should_render_thumbnail(None))
+
+    def test_invalidate(self):
+        self.scheduler.should_render_view(self.ws)
+        self.scheduler.should_render_thumbnail(self.image)
+
+        self.scheduler.invalidate()
+
+        self.assertTrue(self.scheduler.should_render_view(self.ws))
+        self.assertTrue(self.scheduler.should_render_thumbnail(self.image))
+
+
+if __name__ == "__main__":
+    unittest.main()
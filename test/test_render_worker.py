@@ -0,0 +1,225 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.image import Image
+from core.workflow.render_worker import RenderWorker, create_executor
+
+
+class Test_RenderWorker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.posted: list = []
+        self.worker = RenderWorker(lambda *result: self.posted.append(result))
+
+        noise = PILImage.effect_noise((64, 64), 40).convert("RGBA")
+        self.image = Image(image=noise)
+        self.image.set_deferred(True)
+
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.worker.stop()
+        return super().tearDown()
+
+    def test_deferred_image_is_not_rendered(self):
+        before = self.image.get_base_image()
+        self.image.apply_brightness(1.5)
+
+        self.assertTrue(self.image.is_render_pending())
+        self.assertIs(self.image.get_base_image(), before)
+
+    def test_render_is_installed(self):
+        self.image.resize((32, 32))
+        self.worker.submit(self.image, self.image.take_render_job())
+        self.assertTrue(self.worker.wait(5))
+
+        [(image, job, rendered)] = self.posted
+        self.assertTrue(image.install_render(job, rendered))
+        self.assertFalse(self.image.is_render_pending())
+        self.assertEqual(self.image.get_size(), (32, 32))
+
+    def test_unchanged_image_has_no_job(self):
+        self.assertIsNone(self.image.take_render_job())
+
+        self.image.rotate(10.0)
+        self.assertIsNotNone(self.image.take_render_job())
+        self.assertIsNone(self.image.take_render_job())
+
+    def test_stale_render_is_rejected(self):
+        self.image.apply_contrast(1.5)
+        job = self.image.take_render_job()
+        self.image.apply_contrast(0.5)
+
+        self.assertFalse(self.image.install_render(job, job.run()))
+        self.assertTrue(self.image.is_render_pending())
+
+    def test_jobs_are_coalesced(self):
+        # A single thread keeps the jobs of the image behind the blocker
+        self.worker.stop()
+        executor = ThreadPoolExecutor(1)
+        self.worker = RenderWorker(lambda *result: self.posted.append(result),
+                                   executor)
+        self.addCleanup(executor.shutdown)
+
+        release = threading.Event()
+        blocker = Image(image=PILImage.new("RGBA", (8, 8)))
+        blocker.set_deferred(True)
+        blocker.rotate(45.0)
+        blocking_job = blocker.take_render_job()
+
+        class Blocking():
+            fingerprint = blocking_job.fingerprint
+
+            def run(self):
+                release.wait(5)
+                return blocking_job.run()
+
+        self.worker.submit(blocker, Blocking())  # type: ignore
+
+        for factor in (1.1, 1.2, 1.3, 1.4):
+            self.image.apply_saturation(factor)
+            self.worker.submit(self.image, self.image.take_render_job())
+
+        release.set()
+        self.assertTrue(self.worker.wait(5))
+
+        renders = [job for (image, job, _) in self.posted
+                   if image is self.image]
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(renders[0].fingerprint,
+                         self.image.get_fingerprint())
+
+    def test_layers_render_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        images = [Image(image=PILImage.new("RGBA", (8, 8))) for _ in range(2)]
+
+        class Meeting():
+            def __init__(self, job):
+                self.job = job
+                self.fingerprint = job.fingerprint
+
+            def run(self):
+                # Only passes when both jobs are running at the same time
+                barrier.wait()
+                return self.job.run()
+
+        for image in images:
+            image.set_deferred(True)
+            image.rotate(15.0)
+            self.worker.submit(image, Meeting(image.take_render_job()))  # type: ignore # noqa
+
+        self.assertTrue(self.worker.wait(5))
+        self.assertFalse(barrier.broken)
+        self.assertEqual(len(self.posted), 2)
+
+    def test_render_all_waits_for_every_layer(self):
+        images = [self.image.copy() for _ in range(4)]
+
+        for (index, image) in enumerate(images):
+            image.set_deferred(True)
+            image.rotate(10.0 * index + 5.0)
+
+        self.worker.render_all(images)
+
+        for image in images:
+            self.assertFalse(image.is_render_pending())
+
+        expected = self.image.copy()
+        expected.rotate(35.0)
+        self.assertEqual(images[3].get_base_image().tobytes(),
+                         expected.get_base_image().tobytes())
+
+    def test_render_on_processes(self):
+        executor = create_executor("processes", 2)
+        self.addCleanup(executor.shutdown)
+        worker = RenderWorker(lambda *result: None, executor)
+
+        self.image.resize((20, 30))
+        self.image.apply_sharpness(2.0)
+        full_resolution = self.image.get_full_resolution(is_rendered=False)
+        self.assertTrue(full_resolution.is_render_pending())
+
+        worker.render_all([full_resolution])
+        self.assertEqual(full_resolution.get_size(), (20, 30))
+
+        expected = self.image.copy()
+        expected.set_deferred(False)
+        self.assertEqual(full_resolution.get_base_image().tobytes(),
+                         expected.get_base_image().tobytes())
+
+    def test_processes_render_pending_proxy(self):
+        executor = create_executor("processes", 2)
+        self.addCleanup(executor.shutdown)
+        posted: list = []
+        worker = RenderWorker(lambda *result: posted.append(result), executor)
+        self.addCleanup(worker.stop)
+
+        image = Image(image=PILImage.new("RGBA", (600, 400), "Red"))
+        image.set_draft(True)
+        image.set_deferred(True)
+        image.apply_brightness(1.5)
+
+        worker.submit(image, image.take_render_job())
+        self.assertTrue(worker.wait(30))
+
+        [(_, job, rendered)] = posted
+        self.assertIsNotNone(rendered)
+        self.assertEqual(rendered.size, (300, 200))
+        self.assertTrue(image.install_render(job, rendered))
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            create_executor("fibers")
+
+    def test_draft_is_followed_by_final_render(self):
+        self.image.set_draft(True)
+        self.image.rotate(30.0)
+
+        draft = self.image.take_render_job()
+        self.assertTrue(draft.is_draft)
+        self.image.install_render(draft, draft.run())
+
+        self.assertFalse(self.image.is_render_pending())
+        self.assertIsNone(self.image.get_snapshot().get_rendered())
+
+        self.image.set_draft(False)
+        final = self.image.take_render_job()
+
+        self.assertFalse(final.is_draft)
+        self.assertEqual(final.fingerprint, draft.fingerprint)
+        self.image.install_render(final, final.run())
+
+        self.assertFalse(self.image.is_render_pending())
+        self.assertIs(self.image.get_snapshot().get_rendered(),
+                      self.image.get_base_image())
+
+    def test_late_draft_keeps_final_pending(self):
+        self.image.set_draft(True)
+        self.image.rotate(30.0)
+        draft = self.image.take_render_job()
+
+        self.image.set_draft(False)
+        final = self.image.take_render_job()
+
+        self.image.install_render(draft, draft.run())
+        self.assertTrue(self.image.is_render_pending())
+        self.assertIsNone(self.image.take_render_job())
+
+        self.image.install_render(final, final.run())
+        self.assertFalse(self.image.is_render_pending())
+
+    def test_copy_keeps_render_pending(self):
+        self.image.apply_negative()
+        self.image.flip_vertical()
+        copy = self.image.copy()
+
+        self.assertTrue(copy.is_render_pending())
+        self.assertIsNone(self.image.get_snapshot().get_rendered())
+
+        full_resolution = copy.get_full_resolution()
+        self.assertFalse(full_resolution.is_render_pending())
+
+
+if __name__ == "__main__":
+    unittest.main()
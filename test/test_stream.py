@@ -0,0 +1,156 @@
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.batch.recipe import Recipe
+from core.batch.runner import get_input_root
+from core.batch.stream import StreamPipeline, StreamStage, stream_batch
+
+
+class Test_StreamPipeline(unittest.TestCase):
+    def setUp(self) -> None:
+        self.lock = threading.Lock()
+        self.taken = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        return super().setUp()
+
+    def count_inputs(self, count: int):
+        for index in range(count):
+            with self.lock:
+                self.taken += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+            yield index
+
+    def test_every_item_is_processed(self):
+        pipeline = StreamPipeline([StreamStage("double", lambda x: x * 2, 3),
+                                   StreamStage("add", lambda x: x + 1, 2)])
+
+        results = list(pipeline.run(range(50)))
+        self.assertEqual(sorted(results), [x * 2 + 1 for x in range(50)])
+
+        double, add = pipeline.get_metrics()
+        self.assertEqual((double.processed, add.processed), (50, 50))
+        self.assertEqual(double.workers, 3)
+
+    def test_slow_consumer_bounds_items(self):
+        pipeline = StreamPipeline([StreamStage("same", lambda x: x, 2),
+                                   StreamStage("same", lambda x: x, 2)], 2)
+
+        for _ in pipeline.run(self.count_inputs(200)):
+            time.sleep(0.001)
+
+            with self.lock:
+                self.in_flight -= 1
+
+        self.assertEqual(self.taken, 200)
+        self.assertLessEqual(self.max_in_flight,
+                             pipeline.get_in_flight_limit())
+
+        for stage in pipeline.get_metrics():
+            self.assertLessEqual(stage.max_depth, 2)
+            self.assertGreater(stage.get_mean_depth(), 0)
+
+    def test_slow_stage_holds_back_input(self):
+        pipeline = StreamPipeline([StreamStage("slow", lambda x: x, 1)], 1)
+        stream = pipeline.run(self.count_inputs(1000))
+
+        next(stream)
+        time.sleep(0.1)
+        self.assertLessEqual(self.taken, pipeline.get_in_flight_limit())
+
+        stream.close()
+        self.assertLess(self.taken, 1000)
+
+    def test_error_stops_stream(self):
+        def fail(x):
+            if x == 5:
+                raise RuntimeError("broken")
+            return x
+
+        pipeline = StreamPipeline([StreamStage("fail", fail, 2)])
+
+        with self.assertRaises(RuntimeError):
+            list(pipeline.run(range(100)))
+
+
+class Test_StreamBatch(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = self.directory.name
+
+        self.inputs = []
+        for index in range(6):
+            path = os.path.join(self.root, f"image{index}.png")
+            PILImage.effect_noise((30, 20), 50).save(path)
+            self.inputs.append(path)
+
+        self.output = os.path.join(self.root, "output")
+        self.recipe = Recipe({"resize": [15, 10]}, ["grayscale"])
+
+        return super().setUp()
+
+    def test_stream_batch(self):
+        broken = os.path.join(self.root, "broken.png")
+        with open(broken, "w") as file:
+            file.write("not an image")
+
+        workers = {"decode": 2, "transform": 2, "encode": 2}
+        report = stream_batch(self.recipe, [broken, *self.inputs],
+                              self.output, "jpg", workers, capacity=2)
+
+        [failed] = report.get_failed()
+        self.assertEqual(failed.input_path, broken)
+        self.assertEqual(len(report.results), 7)
+        self.assertEqual(len(os.listdir(self.output)), 6)
+
+        with PILImage.open(os.path.join(self.output, "image3.jpg")) as image:
+            self.assertEqual(image.size, (15, 10))
+
+        names = [stage.name for stage in report.stages]
+        self.assertEqual(names, ["decode", "transform", "encode", "write"])
+        self.assertEqual([stage.processed for stage in report.stages],
+                         [7, 7, 7, 7])
+
+    def test_same_names_in_different_directories(self):
+        nested = os.path.join(self.root, "sub", "image0.png")
+        os.makedirs(os.path.dirname(nested))
+        PILImage.effect_noise((30, 20), 50).save(nested)
+
+        inputs = [self.inputs[0], nested]
+        report = stream_batch(self.recipe, inputs, self.output,
+                              root=get_input_root(inputs))
+
+        self.assertEqual(report.get_failed(), [])
+        self.assertTrue(os.path.isfile(os.path.join(self.output,
+                                                    "image0.png")))
+        self.assertTrue(os.path.isfile(os.path.join(self.output, "sub",
+                                                    "image0.png")))
+
+    def test_same_output_is_reported(self):
+        nested = os.path.join(self.root, "sub", "image0.png")
+        os.makedirs(os.path.dirname(nested))
+        PILImage.effect_noise((30, 20), 50).save(nested)
+
+        report = stream_batch(self.recipe, [self.inputs[0], nested],
+                              self.output)
+
+        [failed] = report.get_failed()
+        self.assertEqual(failed.input_path, nested)
+        self.assertEqual(os.listdir(self.output), ["image0.png"])
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            stream_batch(self.recipe, self.inputs, self.output,
+                         workers={"resize": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
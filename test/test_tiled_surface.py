@@ -0,0 +1,58 @@
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.tiled_surface import TiledSurface
+
+
+class Test_TiledSurface(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source = PILImage.effect_noise((100, 70), 40).convert("RGB")
+        self.filled: list = []
+
+        def fill(box):
+            self.filled.append(box)
+            return self.source.crop(box)
+
+        self.surface = TiledSurface((100, 70), "RGB", fill, tile_size=32)
+
+        return super().setUp()
+
+    def test_tiles(self):
+        tiles = self.surface.get_tiles((30, 0, 40, 70))
+
+        self.assertEqual([index for (index, _, _) in tiles],
+                         [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2)])
+        self.assertEqual(tiles[-1][1:], ((32, 64, 64, 70), (32, 64, 40, 70)))
+
+    def test_tiles_are_filled_lazily(self):
+        self.assertEqual(self.surface.get_allocated_count(), 0)
+
+        self.surface.crop((0, 0, 10, 10))
+        self.surface.crop((5, 5, 20, 20))
+
+        self.assertEqual(self.filled, [(0, 0, 32, 32)])
+        self.assertEqual(self.surface.get_allocated_count(), 1)
+
+    def test_crop(self):
+        for box in ((0, 0, 100, 70), (31, 20, 65, 69), (96, 64, 100, 70)):
+            self.assertEqual(self.surface.crop(box), self.source.crop(box))
+
+    def test_update(self):
+        self.surface.crop((0, 0, 40, 40))
+
+        red = PILImage.new("RGB", (20, 20), "Red")
+        self.surface.update((25, 25, 45, 45), red)
+        self.source.paste(red, (25, 25))
+
+        self.assertEqual(self.surface.crop((0, 0, 100, 70)), self.source)
+
+    def test_discard(self):
+        self.surface.crop((0, 0, 10, 10))
+        self.surface.discard((0, 0))
+        self.surface.crop((0, 0, 10, 10))
+
+        self.assertEqual(len(self.filled), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,18 @@ class Test_UndoRedoStack(unittest.TestCase):
         self.assertEqual(redo_action[0], "green")
         self.assertEqual(redo_action[1], self.green)
 
+    def test_undo_shows_placeholder(self):
+        green = self.green.copy()
+        green.apply_brightness(0.5)
+        self.stack.add_undo_action(("green", green))
+
+        shown = self.green.get_base_image()
+        layers = {"green": self.green}
+        _, image = self.stack.undo(layers.get)
+        image.set_deferred(True)
+
+        self.assertIs(image.get_base_image(), shown)
+
     def test_refresh_layer_name(self):
         green0 = self.green.copy()
         green0.convert_to_grayscale()
@@ -80,6 +92,119 @@ class Test_UndoRedoStack(unittest.TestCase):
         self.stack.clear_redo_stack()
         self.assertIsNone(self.stack.redo())
 
+    def test_undo_shares_pixels(self):
+        green = self.green.copy()
+        green.apply_contrast(2)
+        green.get_base_image()
+        self.stack.add_undo_action(("green", green))
+
+        _, image = self.stack.undo()
+
+        self.assertIsNot(image, green)
+        self.assertIs(image.get_base_image(), green.get_base_image())
+        self.assertEqual(image.get_properties(), green.get_properties())
+
+    def test_add_same_state(self):
+        self.stack.add_undo_action(("blue", self.blue))
+
+        self.stack.undo()
+        name, _ = self.stack.undo()
+        self.assertEqual(name, "green")
+
+    def test_byte_budget_spills_oldest(self):
+        stack = UndoRedoStack(byte_budget=650)
+        images = [self.red, self.green, self.blue]
+
+        for idx, image in enumerate(images):
+            stack.add_undo_action((str(idx), image))
+
+        self.assertEqual(stack.get_spilled_count(), 1)
+        self.assertLessEqual(stack.get_memory_usage(), 650)
+        self.assertGreater(stack.get_disk_usage(), 0)
+
+        for idx in reversed(range(3)):
+            name, image = stack.undo()
+            self.assertEqual(name, str(idx))
+            self.assertEqual(image.get_base_image(),
+                             images[idx].get_base_image())
+
+        self.assertEqual(stack.get_disk_usage(), 0)
+
+    def test_live_buffers_are_not_counted(self):
+        layers = [self.red, self.green]
+        stack = UndoRedoStack(get_live_images=lambda: layers)
+
+        for image in (self.red, self.green, self.blue):
+            stack.add_undo_action(("layer", image))
+
+        self.assertEqual(stack.get_memory_usage(), 300)
+
+    def test_byte_budget_skips_live_references(self):
+        layers = [self.red]
+        stack = UndoRedoStack(byte_budget=0, get_live_images=lambda: layers)
+
+        for image in (self.red, self.green, self.blue):
+            stack.add_undo_action(("layer", image))
+
+        self.assertEqual(stack.get_spilled_count(), 2)
+        self.assertEqual(stack.get_memory_usage(), 0)
+
+        stack.undo()
+        stack.undo()
+        _, red = stack.undo()
+        self.assertEqual(red.get_base_image(), self.red.get_base_image())
+
+    def test_undo_does_not_render(self):
+        image = self.green.copy()
+        image.apply_brightness(1.5)
+        rendered = image.get_base_image()
+        self.stack.add_undo_action(("green", image))
+        image = None
+
+        _, restored = self.stack.undo()
+        self.assertFalse(restored.is_render_pending())
+        self.assertIs(restored.get_base_image(), rendered)
+
+    def test_renders_are_dropped_before_spilling(self):
+        # The references take 40000 bytes, every render another 40000
+        stack = UndoRedoStack(byte_budget=100000)
+        image = Image(image=PILImage.new("RGBA", (100, 100)))
+        stack.add_undo_action(("layer", image))
+
+        for step in range(10):
+            image = image.copy()
+            image.apply_brightness(1 + step / 10)
+            image.get_base_image()
+            stack.add_undo_action(("layer", image))
+
+        self.assertEqual(stack.get_memory_usage(), 80000)
+        self.assertEqual(stack.get_spilled_count(), 0)
+
+        _, restored = stack.undo()
+        self.assertFalse(restored.is_render_pending())
+        self.assertEqual(restored.get_base_image(), image.get_base_image())
+
+    def test_shared_buffers_counted_once(self):
+        stack = UndoRedoStack()
+
+        stack.add_undo_action(("red", self.red))
+        usage = stack.get_memory_usage()
+
+        self.red.set_offset((1, 1))
+        stack.add_undo_action(("red", self.red))
+
+        self.assertEqual(stack.get_memory_usage(), usage)
+
+    def test_max_actions(self):
+        stack = UndoRedoStack(max_actions=2)
+
+        for _ in range(3):
+            stack.add_redo_action(("green", self.green))
+
+        self.assertIsNotNone(stack.redo())
+        self.assertIsNotNone(stack.redo())
+        self.assertIsNone(stack.redo())
+
     def test_peek_undo_stack(self):
         action = self.stack.peek_undo_stack()
         self.assertEqual(action[0], "blue")
@@ -0,0 +1,98 @@
+import unittest
+
+from PIL import Image as PILImage  # type: ignore
+from core.graphics.viewport import Viewport
+
+
+class Test_Viewport(unittest.TestCase):
+    def setUp(self) -> None:
+        self.canvas = PILImage.effect_noise((400, 300), 40).convert("RGB")
+        self.requested: list = []
+
+        def region(box, level):
+            self.requested.append((box, level))
+            return self.canvas.reduce(1 << level).crop(box)
+
+        self.region = region
+        self.viewport = Viewport((200, 200), (400, 300))
+
+        return super().setUp()
+
+    def test_actual_size(self):
+        self.viewport.set_zoom(1.0)
+        self.viewport.render(self.region)
+
+        left, top = self.viewport.to_canvas_point((0, 0))
+        self.assertEqual((left, top), (100.0, 50.0))
+        self.assertEqual(self.viewport.get_image(),
+                         self.canvas.crop((100, 50, 300, 250)))
+
+    def test_fit(self):
+        self.viewport.fit()
+
+        self.assertEqual(self.viewport.get_zoom(), 0.5)
+        self.assertEqual(self.viewport.get_level(), 1)
+        self.assertEqual(self.viewport.get_visible_box(), (0, 0, 200, 150))
+        self.assertEqual(self.viewport.to_view_box((0, 0, 200, 150)),
+                         (0, 25, 200, 175))
+
+    def test_zoomed_out_view_uses_level(self):
+        self.viewport.set_zoom(0.3)
+        self.viewport.render(self.region)
+
+        self.assertEqual(self.viewport.get_level(), 1)
+        for (box, level) in self.requested:
+            self.assertEqual(level, 1)
+            self.assertLessEqual(box[2], 200)
+            self.assertLessEqual(box[3], 150)
+
+        self.viewport.fit()
+        self.viewport.set_zoom(0.1)
+        self.assertEqual(self.viewport.get_level(), 3)
+
+    def test_only_visible_pixels_are_requested(self):
+        self.viewport.set_zoom(4.0)
+        self.viewport.render(self.region)
+
+        for (box, _) in self.requested:
+            self.assertLessEqual(box[2] - box[0], 50 + 6)
+            self.assertLessEqual(box[3] - box[1], 50 + 6)
+
+    def test_zoom_keeps_anchor(self):
+        before = self.viewport.to_canvas_point((30, 40))
+        self.viewport.zoom_in((30, 40))
+        after = self.viewport.to_canvas_point((30, 40))
+
+        self.assertAlmostEqual(before[0], after[0])
+        self.assertAlmostEqual(before[1], after[1])
+
+    def test_pan(self):
+        self.viewport.set_zoom(2.0)
+        before = self.viewport.to_canvas_point((0, 0))
+        self.viewport.pan((10, -20))
+        after = self.viewport.to_canvas_point((0, 0))
+
+        self.assertEqual((before[0] - after[0], before[1] - after[1]),
+                         (5.0, -10.0))
+
+    def test_render_damaged_boxes(self):
+        self.viewport.set_zoom(1.0)
+        self.viewport.render(self.region)
+
+        self.canvas.paste("Red", (150, 100, 160, 120))
+        changed = self.viewport.render(self.region, [(150, 100, 160, 120)])
+
+        self.assertEqual(changed, [(50, 50, 60, 70)])
+        self.assertEqual(self.viewport.get_image(),
+                         self.canvas.crop((100, 50, 300, 250)))
+
+    def test_moved_view_is_fully_rendered(self):
+        self.viewport.render(self.region)
+        self.viewport.pan((5, 5))
+
+        self.assertEqual(self.viewport.render(self.region, []),
+                         [(0, 0, 200, 200)])
+
+
+if __name__ == "__main__":
+    unittest.main()
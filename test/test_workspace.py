@@ -1,7 +1,9 @@
 import unittest
 
+from PIL import Image as PILImage  # type: ignore
 from core.graphics.image import Image
 from core.workflow.workspace import Workspace
+from core.workflow.undo_redo_stack import UndoRedoStack
 
 
 class Test_Workspace(unittest.TestCase):
@@ -119,6 +121,75 @@ class Test_Workspace(unittest.TestCase):
         for idx, layer in enumerate(layer_names):
             self.assertEqual(layer, names[idx])
 
+    def create_edited_image(self) -> Image:
+        image = Image(image=PILImage.new("RGBA", (100, 100)))
+        image.resize((50, 50))
+        image.apply_brightness(1.5)
+        image.get_base_image()
+        return image
+
+    def test_memory_report(self):
+        ws = Workspace()
+        image = self.create_edited_image()
+        ws.add_layer(image, "Layer")
+        ws.add_layer(image.copy(), "Copy")
+
+        report = ws.get_memory_report()
+        layer, copy = report.layers
+
+        self.assertEqual(layer.reference, 100 * 100 * 4)
+        self.assertEqual(layer.rendered, 50 * 50 * 4)
+        self.assertEqual(layer.cache, 50 * 50 * 4)
+
+        # The copy shares the rendered pixels with the layer
+        self.assertEqual(copy.rendered, 0)
+        self.assertEqual(report.get_total(),
+                         layer.get_total() + copy.get_total())
+
+    def test_memory_report_counts_history(self):
+        ws = Workspace()
+        image = self.create_edited_image()
+        ws.add_layer(image, "Layer")
+
+        history = UndoRedoStack()
+        previous = image.copy()
+        image.apply_negative()
+        history.add_undo_action(("Layer", previous))
+        history.add_undo_action(("Deleted", Image()))
+
+        report = ws.get_memory_report(history)
+        self.assertGreater(report.get_layer("Layer").history, 0)
+        self.assertEqual(report.unattributed, 4)
+
+    def test_high_water_mark(self):
+        ws = Workspace()
+        ws.add_layer(self.create_edited_image(), "Layer")
+        peak = ws.get_memory_report().get_total()
+
+        ws.delete_layer("Layer")
+        report = ws.get_memory_report()
+        self.assertEqual(report.get_total(), 0)
+        self.assertEqual(report.high_water_mark, peak)
+
+    def test_soft_limit_evicts_caches(self):
+        ws = Workspace(soft_limit=0)
+        image = self.create_edited_image()
+        ws.add_layer(image, "Layer")
+
+        report = ws.trim_memory()
+        self.assertEqual(report.get_layer("Layer").cache, 0)
+        self.assertEqual(image.get_size(), (50, 50))
+
+        image.apply_brightness(1.2)
+        self.assertEqual(image.get_size(), (50, 50))
+
+    def test_no_soft_limit_keeps_caches(self):
+        ws = Workspace()
+        ws.add_layer(self.create_edited_image(), "Layer")
+
+        report = ws.trim_memory()
+        self.assertGreater(report.get_layer("Layer").cache, 0)
+
 
 if __name__ == "__main__":
     unittest.main()